@@ -1,7 +1,10 @@
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
+from django.conf import settings
 from gcp_services.services import bigquery_client
+from gcp_services.services.query_templates import Query, OBT_APURACAO_CONTRATO
 from decimal import Decimal
+from datetime import date
 
 @login_required
 def apuracao(request):
@@ -17,8 +20,13 @@ def apuracao(request):
     }
 
     try:
-        distinct_contratos_query = "SELECT DISTINCT nomesubcontrato FROM `singular-ray-422121`.gold.obt_tb_apuracao_contrato ORDER BY nomesubcontrato"
-        distinct_contracts_results = bigquery_client.run_query(distinct_contratos_query)
+        distinct_contratos_query = f"SELECT DISTINCT nomesubcontrato FROM {OBT_APURACAO_CONTRATO} ORDER BY nomesubcontrato"
+        distinct_contracts_results = bigquery_client.execute(
+            distinct_contratos_query,
+            cache_ttl=bigquery_client.TTL_DIMENSAO,
+            stale_ttl=bigquery_client.STALE_DIMENSAO,
+            timeout=bigquery_client.TIMEOUT_INTERATIVO,
+        )
         context['contract_names'] = [row['nomesubcontrato'] for row in distinct_contracts_results]
     except Exception as e:
         print(f"Ocorreu um erro ao buscar os nomes dos contratos: {e}")
@@ -30,52 +38,63 @@ def apuracao(request):
         nomesubcontrato = request.GET.get('contract_name_input')
 
         if dtini and dtfim and nomesubcontrato:
-            query = f"""
-                SELECT data_emissao, NomeAssociado, Nome_Produto, Nome_Fornecedor, nro_nota_fiscal, tipo_nota_fiscal, 
-                       CAST(QtdCompra AS NUMERIC) as QtdCompra, CAST(valorbruto_comipi AS NUMERIC) as valorbruto_comipi
-                FROM `singular-ray-422121`.gold.obt_tb_apuracao_contrato
-                WHERE nomesubcontrato = '{nomesubcontrato}' AND data_emissao BETWEEN '{dtini}' AND '{dtfim}'
-            """
             try:
-                results = bigquery_client.run_query(query)
-                if results:
-                    context['has_data'] = True
-                    entradas_data = {}
-                    devolucoes_data = {}
-                    total_entradas = Decimal(0)
-                    total_devolucoes = Decimal(0)
+                query = Query(f"""
+                    SELECT data_emissao, NomeAssociado, Nome_Produto, Nome_Fornecedor, nro_nota_fiscal, tipo_nota_fiscal, 
+                           CAST(QtdCompra AS NUMERIC) as QtdCompra, CAST(valorbruto_comipi AS NUMERIC) as valorbruto_comipi
+                    FROM {OBT_APURACAO_CONTRATO}
+                    WHERE nomesubcontrato = @nomesubcontrato AND data_emissao BETWEEN @dtini AND @dtfim
+                """, {
+                    'nomesubcontrato': nomesubcontrato,
+                    'dtini': date.fromisoformat(dtini),
+                    'dtfim': date.fromisoformat(dtfim),
+                })
+
+                # Lê em streaming (Storage Read API) e agrega à medida que as
+                # linhas chegam, sem materializar o resultado inteiro.
+                entradas_data = {}
+                devolucoes_data = {}
+                total_entradas = Decimal(0)
+                total_devolucoes = Decimal(0)
 
-                    for row in results:
-                        valor_bruto = Decimal(row.get('valorbruto_comipi') or 0)
-                        qtd = Decimal(row.get('QtdCompra') or 0)
-                        associado = row.get('NomeAssociado')
-                        nota = row.get('nro_nota_fiscal')
-                        produto = {
-                            'nome': row.get('Nome_Produto'),
-                            'fornecedor': row.get('Nome_Fornecedor'),
-                            'quantidade': qtd,
-                            'valor': valor_bruto
-                        }
+                rows = bigquery_client.stream_query(
+                    query,
+                    max_bytes=settings.BIGQUERY_MAX_BYTES_INTERATIVO,
+                    timeout=bigquery_client.TIMEOUT_INTERATIVO,
+                )
+                for row in rows:
+                    context['has_data'] = True
+                    valor_bruto = Decimal(row.valorbruto_comipi or 0)
+                    qtd = Decimal(row.QtdCompra or 0)
+                    associado = row.NomeAssociado
+                    nota = row.nro_nota_fiscal
+                    produto = {
+                        'nome': row.Nome_Produto,
+                        'fornecedor': row.Nome_Fornecedor,
+                        'quantidade': qtd,
+                        'valor': valor_bruto
+                    }
 
-                        target_data = entradas_data if row.get('tipo_nota_fiscal') == 'R' else devolucoes_data
-                        if row.get('tipo_nota_fiscal') == 'R':
-                            total_entradas += valor_bruto
-                        else:
-                            total_devolucoes += valor_bruto
+                    target_data = entradas_data if row.tipo_nota_fiscal == 'R' else devolucoes_data
+                    if row.tipo_nota_fiscal == 'R':
+                        total_entradas += valor_bruto
+                    else:
+                        total_devolucoes += valor_bruto
 
-                        # Associado Level
-                        if associado not in target_data:
-                            target_data[associado] = {'total': Decimal(0), 'quantidade': Decimal(0), 'notas': {}}
-                        target_data[associado]['total'] += valor_bruto
-                        target_data[associado]['quantidade'] += qtd
+                    # Associado Level
+                    if associado not in target_data:
+                        target_data[associado] = {'total': Decimal(0), 'quantidade': Decimal(0), 'notas': {}}
+                    target_data[associado]['total'] += valor_bruto
+                    target_data[associado]['quantidade'] += qtd
 
-                        # Nota Level
-                        if nota not in target_data[associado]['notas']:
-                            target_data[associado]['notas'][nota] = {'total': Decimal(0), 'quantidade': Decimal(0), 'produtos': [], 'data_emissao': row.get('data_emissao')}
-                        target_data[associado]['notas'][nota]['total'] += valor_bruto
-                        target_data[associado]['notas'][nota]['quantidade'] += qtd
-                        target_data[associado]['notas'][nota]['produtos'].append(produto)
+                    # Nota Level
+                    if nota not in target_data[associado]['notas']:
+                        target_data[associado]['notas'][nota] = {'total': Decimal(0), 'quantidade': Decimal(0), 'produtos': [], 'data_emissao': row.data_emissao}
+                    target_data[associado]['notas'][nota]['total'] += valor_bruto
+                    target_data[associado]['notas'][nota]['quantidade'] += qtd
+                    target_data[associado]['notas'][nota]['produtos'].append(produto)
 
+                if context['has_data']:
                     context['entradas'] = entradas_data
                     context['devolucoes'] = devolucoes_data
                     valor_liquido = total_entradas - total_devolucoes
@@ -84,6 +103,10 @@ def apuracao(request):
                     context['summary']['devolucoes'] = f"R$ {total_devolucoes:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
                     context['summary']['final'] = f"R$ {valor_liquido:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
 
+            except (bigquery_client.QueryBudgetExceeded, bigquery_client.CircuitOpenError) as e:
+                context['error_message'] = str(e)
+            except TimeoutError:
+                context['error_message'] = "O BigQuery demorou demais para responder. Tente um período menor ou tente novamente em instantes."
             except Exception as e:
                 print(f"Ocorreu um erro ao buscar os contratos: {e}")
                 context['error_message'] = "Ocorreu um erro ao processar sua solicitação."
@@ -0,0 +1,293 @@
+"""
+Motor de apuração da grade (meta x realizado) sobre o BigQuery.
+
+Uma única consulta lê a obt_tb_compra_agg uma vez, já cruzada com a lista
+branca de CNPJs (fornecedores dos grupos da grade), e devolve linhas no grão
+(data_emissao, NomeAssociado, SeqProduto, homologado, cnpj_pirata). As três
+saídas do dashboard (linha do tempo, ofensores e tabela detalhada) são
+derivadas dessas linhas em Python. O cruzamento com as metas da grade
+(ItemGradeDistribuicao) é feito em pandas, em cruzar_metas().
+
+Com o espelho local de fornecedores sincronizado (contratos.fornecedor_service),
+a lista branca e os nomes dos fornecedores saem do índice em memória e a
+consulta nem lê a dim_fornecedor (SQL_BASE_LISTA). Sem espelho, a lista branca
+é montada no próprio BigQuery (SQL_BASE).
+"""
+from collections import defaultdict
+
+import pandas as pd
+
+from contratos import fornecedor_service
+from gcp_services.services import bigquery_client
+from gcp_services.services.query_templates import Query, Typed, DIM_FORNECEDOR, OBT_COMPRA_AGG
+
+# Quantidade de fornecedores listados no ranking de ofensores.
+TOP_OFENSORES = 10
+
+# Colunas de cada saída do dashboard (usadas também no formato colunar da API).
+COLUNAS_APURACAO = ['data_emissao', 'NomeAssociado', 'qtd_homologada', 'qtd_pirata', 'qtd_atrasada']
+COLUNAS_OFENSORES = ['fornecedor_nome', 'volume_pirata', 'valor_desviado']
+COLUNAS_TABELA = ['associado', 'produto', 'meta', 'aderente', 'fora_prazo', 'outros']
+
+# Observação: no BigQuery, um CTE referenciado mais de uma vez pode ser
+# reavaliado. Por isso a tabela de fatos só aparece em 'compras', e os nomes
+# dos fornecedores são cruzados depois da agregação (dim_fornecedor é pequena).
+SQL_BASE = f"""
+    WITH homologados AS (
+        SELECT DISTINCT CAST(cnpj_completo AS STRING) AS cnpj
+        FROM {DIM_FORNECEDOR}
+        WHERE SEQREDE IN UNNEST(@grupos)
+    ),
+    compras AS (
+        SELECT
+            c.data_emissao,
+            c.NomeAssociado,
+            c.SeqProduto,
+            h.cnpj IS NOT NULL AS homologado,
+            CASE WHEN h.cnpj IS NULL THEN CAST(c.CNPJ_fornecedor AS STRING) END AS cnpj_pirata,
+            SUM(c.QtdCompra) AS qtd,
+            SUM(c.ValorCompraBruta) AS valor
+        FROM {OBT_COMPRA_AGG} c
+        LEFT JOIN homologados h
+            ON CAST(c.CNPJ_fornecedor AS STRING) = h.cnpj
+        WHERE
+            c.data_emissao BETWEEN @dt_inicio AND @dt_fim_evento
+            AND c.SeqProduto IN UNNEST(@skus)
+        GROUP BY 1, 2, 3, 4, 5
+    ),
+    nomes AS (
+        SELECT
+            CAST(cnpj_completo AS STRING) AS cnpj,
+            MAX(COALESCE(NOMERAZAO, FANTASIA)) AS nome
+        FROM {DIM_FORNECEDOR}
+        GROUP BY 1
+    )
+    SELECT
+        c.data_emissao,
+        c.NomeAssociado,
+        c.SeqProduto,
+        c.homologado,
+        c.cnpj_pirata,
+        n.nome AS fornecedor_nome,
+        c.qtd,
+        c.valor
+    FROM compras c
+    LEFT JOIN nomes n
+        ON c.cnpj_pirata = n.cnpj
+"""
+
+# Mesmas linhas do SQL_BASE, com a lista branca de CNPJs como parâmetro
+# (@cnpjs). fornecedor_nome é preenchido depois, pelo índice local.
+SQL_BASE_LISTA = f"""
+    WITH compras AS (
+        SELECT
+            data_emissao,
+            NomeAssociado,
+            SeqProduto,
+            CAST(CNPJ_fornecedor AS STRING) AS cnpj,
+            QtdCompra,
+            ValorCompraBruta
+        FROM {OBT_COMPRA_AGG}
+        WHERE
+            data_emissao BETWEEN @dt_inicio AND @dt_fim_evento
+            AND SeqProduto IN UNNEST(@skus)
+    )
+    SELECT
+        data_emissao,
+        NomeAssociado,
+        SeqProduto,
+        cnpj IN UNNEST(@cnpjs) AS homologado,
+        CASE WHEN cnpj IN UNNEST(@cnpjs) THEN NULL ELSE cnpj END AS cnpj_pirata,
+        SUM(QtdCompra) AS qtd,
+        SUM(ValorCompraBruta) AS valor
+    FROM compras
+    GROUP BY 1, 2, 3, 4, 5
+"""
+
+
+def consultar_base(grupos: list[int], skus: list[int], dt_inicio, dt_fim_evento,
+                   max_bytes: int | None = None, timeout: float | None = None):
+    """
+    Executa a consulta consolidada e devolve o QueryResult (linhas no grão
+    da apuração + bytes processados). Levanta exceção em caso de erro.
+
+    Args:
+        grupos (list[int]): SEQREDE dos grupos de fornecedores homologados.
+        skus (list[int]): SeqProduto dos itens da grade.
+        dt_inicio, dt_fim_evento (date): Período de compras considerado.
+    """
+    indice = fornecedor_service.indice()
+    if indice is None:
+        query = Query(SQL_BASE, {
+            'grupos': grupos,
+            'skus': skus,
+            'dt_inicio': dt_inicio,
+            'dt_fim_evento': dt_fim_evento,
+        })
+        return bigquery_client.run_query_detailed(query, max_bytes=max_bytes, timeout=timeout)
+
+    query = Query(SQL_BASE_LISTA, {
+        'cnpjs': Typed('STRING', indice.cnpjs_dos_grupos(grupos)),
+        'skus': skus,
+        'dt_inicio': dt_inicio,
+        'dt_fim_evento': dt_fim_evento,
+    })
+    resultado = bigquery_client.run_query_detailed(query, max_bytes=max_bytes, timeout=timeout)
+    for row in resultado.rows:
+        row['fornecedor_nome'] = indice.nome(row['cnpj_pirata'])
+    return resultado
+
+
+def derivar(linhas: list[dict], dt_fim) -> dict:
+    """
+    Deriva as três saídas do dashboard a partir das linhas da consulta base.
+
+    Args:
+        linhas (list[dict]): Linhas de consultar_base (ou do snapshot).
+        dt_fim (date): Fim da grade; compras depois dele contam como atrasadas.
+
+    Returns:
+        Um dict com:
+            'apuracao': linha do tempo por (data_emissao, NomeAssociado), com
+                qtd_homologada, qtd_pirata e qtd_atrasada, ordenada por data.
+            'ofensores': top fornecedores não homologados por volume, com
+                fornecedor_nome, volume_pirata e valor_desviado.
+            'detalhe': realizado por (NomeAssociado, sku), com qtd_aderente,
+                qtd_fora_prazo e qtd_outros.
+    """
+    timeline = {}
+    ofensores = defaultdict(lambda: [0.0, 0.0])
+    detalhe = {}
+
+    for row in linhas:
+        data = row['data_emissao']
+        associado = row['NomeAssociado']
+        qtd = float(row['qtd'] or 0)
+        homologado = bool(row['homologado'])
+        atrasado = data > dt_fim
+
+        t = timeline.get((data, associado))
+        if t is None:
+            t = timeline[(data, associado)] = {
+                'data_emissao': data,
+                'NomeAssociado': associado,
+                'qtd_homologada': 0.0,
+                'qtd_pirata': 0.0,
+                'qtd_atrasada': 0.0,
+            }
+        t['qtd_homologada' if homologado else 'qtd_pirata'] += qtd
+        if atrasado:
+            t['qtd_atrasada'] += qtd
+
+        sku = str(row['SeqProduto'])
+        d = detalhe.get((associado, sku))
+        if d is None:
+            d = detalhe[(associado, sku)] = {
+                'NomeAssociado': associado,
+                'sku': sku,
+                'qtd_aderente': 0.0,
+                'qtd_fora_prazo': 0.0,
+                'qtd_outros': 0.0,
+            }
+        if not homologado:
+            d['qtd_outros'] += qtd
+            nome = row['fornecedor_nome'] or f"CNPJ: {row['cnpj_pirata']}"
+            ofensores[nome][0] += qtd
+            ofensores[nome][1] += float(row['valor'] or 0)
+        elif atrasado:
+            d['qtd_fora_prazo'] += qtd
+        else:
+            d['qtd_aderente'] += qtd
+
+    ranking = sorted(ofensores.items(), key=lambda item: item[1][0], reverse=True)[:TOP_OFENSORES]
+
+    return {
+        'apuracao': sorted(timeline.values(), key=lambda t: t['data_emissao']),
+        'ofensores': [
+            {'fornecedor_nome': nome, 'volume_pirata': volume, 'valor_desviado': valor}
+            for nome, (volume, valor) in ranking
+        ],
+        'detalhe': list(detalhe.values()),
+    }
+
+
+_COLUNAS_REALIZADO = ['aderente', 'fora_prazo', 'outros']
+
+
+def _normalizar(nomes: pd.Series) -> pd.Series:
+    # Mesma chave de associado nas metas (Django) e no realizado (BigQuery).
+    # Há poucas lojas distintas: normaliza cada nome uma vez e mapeia.
+    return nomes.map({nome: str(nome).upper().strip() for nome in nomes.unique()})
+
+
+def _registros(df: pd.DataFrame, colunas: list[str]) -> list[dict]:
+    # Mais rápido que to_dict('records') e já com tipos nativos do Python.
+    valores = [df[col].tolist() for col in colunas]
+    return [dict(zip(colunas, linha)) for linha in zip(*valores)]
+
+
+def cruzar_metas(metas: list[tuple], detalhe: list[dict], skus_map: dict) -> tuple[list[dict], dict]:
+    """
+    Cruza meta (Django) x realizado (BigQuery) por associado e produto pai.
+
+    Args:
+        metas (list[tuple]): Tuplas (associado_nome, descricao_resumida,
+            volume_fisico) da distribuição da grade.
+        detalhe (list[dict]): Saída 'detalhe' de derivar().
+        skus_map (dict): SKU (str) -> descrição do item pai.
+
+    Returns:
+        Uma tupla (tabela, metas_por_loja):
+            tabela: linhas com associado, produto, meta, aderente, fora_prazo
+                e outros, ordenadas por associado e produto. Compras sem meta
+                entram com meta 0.
+            metas_por_loja: meta total por associado (nome normalizado).
+    """
+    numericas = ['meta'] + _COLUNAS_REALIZADO
+    zeros_meta = [0.0] * len(metas)
+    df_meta = pd.DataFrame({
+        'associado': [m[0] for m in metas],
+        'produto': [m[1] for m in metas],
+        'meta': pd.Series([m[2] for m in metas], dtype=float),
+        **{col: zeros_meta for col in _COLUNAS_REALIZADO},
+    })
+
+    sku = pd.Series([str(row['sku']) for row in detalhe], dtype=object)
+    df_real = pd.DataFrame({
+        'associado': [row['NomeAssociado'] for row in detalhe],
+        'produto': sku.map(skus_map).fillna('SKU ' + sku + ' (Sem vínculo)'),
+        'meta': [0.0] * len(detalhe),
+        'aderente': pd.Series([row['qtd_aderente'] for row in detalhe], dtype=float),
+        'fora_prazo': pd.Series([row['qtd_fora_prazo'] for row in detalhe], dtype=float),
+        'outros': pd.Series([row['qtd_outros'] for row in detalhe], dtype=float),
+    })
+
+    # Metas e realizado empilhados (mesmas colunas) e agregados num único
+    # groupby, o que equivale ao outer join por associado x produto. As metas
+    # vêm primeiro: o nome exibido é o da distribuição; sem meta, o do BigQuery.
+    base = pd.concat([df_meta, df_real], ignore_index=True)
+    base['chave'] = _normalizar(base['associado'])
+    base[numericas] = base[numericas].fillna(0.0)
+    grupos = base.groupby(['chave', 'produto'], sort=False)
+    tabela = grupos[numericas].sum()
+    tabela['associado'] = grupos['associado'].first()
+    tabela = tabela.reset_index().sort_values(['associado', 'produto'], kind='stable')
+
+    metas_por_loja = base[:len(metas)].groupby('chave', sort=False)['meta'].sum()
+    return (
+        _registros(tabela, COLUNAS_TABELA),
+        metas_por_loja.to_dict(),
+    )
+
+
+def apurar(grupos: list[int], skus: list[int], dt_inicio, dt_fim, dt_fim_evento,
+           max_bytes: int | None = None, timeout: float | None = None) -> tuple[dict, object]:
+    """
+    Consulta o BigQuery (uma leitura da tabela de fatos) e deriva as saídas.
+
+    Returns:
+        Uma tupla (saidas, query_result): as saídas de derivar() e o
+        QueryResult, para expor bytes processados/cobrados.
+    """
+    resultado = consultar_base(grupos, skus, dt_inicio, dt_fim_evento, max_bytes=max_bytes, timeout=timeout)
+    return derivar(resultado.rows, dt_fim), resultado
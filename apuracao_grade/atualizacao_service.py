@@ -0,0 +1,188 @@
+"""
+Execução em segundo plano da atualização das tabelas de distribuição.
+
+iniciar() registra uma AtualizacaoDistribuicao e roda a rotina do
+distribuicao_service numa thread do próprio processo (sem fila externa), e a
+requisição HTTP volta na hora. O andamento fica no banco: etapa atual,
+duração de cada etapa (consulta, download, agregação, lojas, gravação),
+mensagem final. cancelar() marca o pedido de cancelamento, que a rotina
+confere ao começar cada etapa.
+
+Só uma execução fica ativa por vez, regra garantida por um índice único
+parcial no banco (ver reservar()). Uma execução 'executando' sem
+atualização há mais de DISTRIBUICAO_JOB_EXPIRA segundos é de um processo que
+foi encerrado no meio (deploy, reinício do gunicorn) e é marcada como erro.
+"""
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.utils import timezone
+
+from .distribuicao_service import ETAPAS, AtualizacaoCancelada, executar_atualizacao_distribuicao
+from .models import AtualizacaoDistribuicao
+
+# Tempo sem atualização depois do qual uma execução ativa é dada como abandonada (segundos).
+EXPIRA = getattr(settings, 'DISTRIBUICAO_JOB_EXPIRA', 60 * 60)
+
+ATIVOS = ('pendente', 'executando')
+
+
+class _Progresso:
+    """
+    Callback de progresso da rotina: fecha o tempo da etapa anterior, confere
+    o cancelamento e grava a nova etapa.
+    """
+
+    def __init__(self, job: AtualizacaoDistribuicao):
+        self.job = job
+        self._etapa = None
+        self._inicio = None
+
+    def fechar(self):
+        if self._etapa is not None:
+            self.job.tempos[self._etapa] = round(time.monotonic() - self._inicio, 3)
+            self._etapa = None
+
+    def __call__(self, etapa: str):
+        self.fechar()
+        self.job.refresh_from_db(fields=['cancelamento_solicitado'])
+        if self.job.cancelamento_solicitado:
+            raise AtualizacaoCancelada()
+        self._etapa, self._inicio = etapa, time.monotonic()
+        self.job.etapa = etapa
+        self.job.save(update_fields=['etapa', 'tempos', 'atualizado_em'])
+
+
+def _expirar_abandonados():
+    limite = timezone.now() - timedelta(seconds=EXPIRA)
+    AtualizacaoDistribuicao.objects.filter(status__in=ATIVOS, atualizado_em__lt=limite).update(
+        status='erro',
+        mensagem='Execução interrompida (o processo foi encerrado antes de terminar).',
+        finalizado_em=timezone.now(),
+    )
+
+
+def ativa() -> AtualizacaoDistribuicao | None:
+    """A execução em andamento, se houver."""
+    _expirar_abandonados()
+    return AtualizacaoDistribuicao.objects.filter(status__in=ATIVOS).first()
+
+
+def executar(job_id: int) -> AtualizacaoDistribuicao:
+    """
+    Roda a rotina para a execução informada, na thread atual, e grava o
+    resultado. Usado pela thread de iniciar() e pelo comando
+    'atualizar_distribuicao'.
+    """
+    job = AtualizacaoDistribuicao.objects.get(pk=job_id)
+    job.status = 'executando'
+    job.iniciado_em = timezone.now()
+    job.save(update_fields=['status', 'iniciado_em', 'atualizado_em'])
+
+    progresso = _Progresso(job)
+    try:
+        sucesso, mensagem = executar_atualizacao_distribuicao(progresso)
+        job.status = 'concluida' if sucesso else 'erro'
+        job.mensagem = mensagem
+    except AtualizacaoCancelada:
+        job.status = 'cancelada'
+        job.mensagem = 'Cancelada pelo usuário.'
+    except Exception as e:
+        print(f"Erro na atualização da distribuição #{job.pk}: {e}")
+        job.status = 'erro'
+        job.mensagem = str(e)
+    progresso.fechar()
+    job.etapa = ''
+    job.finalizado_em = timezone.now()
+    job.save(update_fields=['status', 'mensagem', 'etapa', 'tempos', 'finalizado_em', 'atualizado_em'])
+    return job
+
+
+def _executar_em_thread(job_id: int):
+    try:
+        executar(job_id)
+    finally:
+        # Thread própria: devolve a conexão com o banco.
+        connections.close_all()
+
+
+def reservar(usuario=None) -> tuple[AtualizacaoDistribuicao, bool]:
+    """
+    Registra uma execução pendente, se não houver outra ativa. Duas chamadas
+    simultâneas (threads ou processos diferentes) não criam duas: o índice
+    único parcial de AtualizacaoDistribuicao rejeita a segunda.
+
+    Returns:
+        Uma tupla (execucao, criada). Com uma execução já em andamento,
+        devolve essa execução e criada=False.
+    """
+    _expirar_abandonados()
+    try:
+        with transaction.atomic():
+            job = AtualizacaoDistribuicao.objects.create(
+                solicitado_por=usuario if usuario is not None and usuario.is_authenticated else None,
+            )
+        return job, True
+    except IntegrityError:
+        atual = AtualizacaoDistribuicao.objects.filter(status__in=ATIVOS).first()
+        if atual is None:
+            # A execução ativa terminou entre o INSERT e a consulta.
+            return reservar(usuario)
+        return atual, False
+
+
+def iniciar(usuario=None) -> tuple[AtualizacaoDistribuicao, bool]:
+    """
+    Inicia uma execução em segundo plano, se não houver outra ativa.
+
+    Returns:
+        Uma tupla (execucao, criada), como em reservar().
+    """
+    job, criada = reservar(usuario)
+    if criada:
+        threading.Thread(
+            target=_executar_em_thread, args=(job.pk,),
+            name=f'distribuicao-{job.pk}', daemon=True,
+        ).start()
+    return job, criada
+
+
+def cancelar(job: AtualizacaoDistribuicao) -> bool:
+    """
+    Pede o cancelamento de uma execução ativa. A rotina para ao começar a
+    próxima etapa (uma consulta já enviada ao BigQuery termina antes).
+
+    Returns:
+        False se a execução já tinha terminado.
+    """
+    return AtualizacaoDistribuicao.objects.filter(pk=job.pk, status__in=ATIVOS).update(
+        cancelamento_solicitado=True
+    ) > 0
+
+
+def como_dict(job: AtualizacaoDistribuicao) -> dict:
+    """Situação da execução para as APIs (JSON)."""
+    if job.status == 'concluida':
+        percentual = 100
+    elif job.etapa in ETAPAS:
+        percentual = round(100 * ETAPAS.index(job.etapa) / len(ETAPAS))
+    else:
+        percentual = 0
+    fim = job.finalizado_em or timezone.now()
+    return {
+        'id': job.pk,
+        'status': job.status,
+        'etapa': job.etapa,
+        'etapas': list(ETAPAS),
+        'percentual': percentual,
+        'tempos': job.tempos,
+        'mensagem': job.mensagem,
+        'cancelamento_solicitado': job.cancelamento_solicitado,
+        'criado_em': job.criado_em,
+        'iniciado_em': job.iniciado_em,
+        'finalizado_em': job.finalizado_em,
+        'duracao': round((fim - job.iniciado_em).total_seconds(), 3) if job.iniciado_em else None,
+    }
@@ -2,10 +2,55 @@ import os
 import pandas as pd
 from datetime import date, datetime
 from dateutil.relativedelta import relativedelta
-from google.cloud import bigquery
 from sqlalchemy import create_engine
 from django.conf import settings
+from django.db import connection, models, transaction
+from django.utils import timezone
 from usuarios.models import Associado 
+from gcp_services.services import bigquery_client
+from gcp_services.services.query_templates import Query, OBT_VENDA_SUMARIZADA
+from utils.bulk_load import substituir_tabelas
+from .models import ParticipacaoAssociado, TrimestreParticipacao
+
+# Quantos trimestres (os mais recentes) entram na média da sugestão de distribuição.
+TRIMESTRES_SUGESTAO = getattr(settings, 'DISTRIBUICAO_TRIMESTRES_SUGESTAO', 1)
+
+# Etapas da rotina, na ordem, informadas ao callback 'progresso'.
+ETAPAS = ('consulta', 'download', 'agregacao', 'lojas', 'gravacao')
+
+
+class AtualizacaoCancelada(Exception):
+    """Levantada pelo callback de progresso quando a execução foi cancelada."""
+
+# Participação de cada associado no trimestre, já agregada no BigQuery: desce
+# uma linha por (associado, grupo), em vez de uma por associado x loja x
+# produto. As porcentagens saem de funções de janela:
+#   percentual_qtd:       qtd do associado no grupo / qtd total do grupo;
+#   percentual_associado: qtd do associado / qtd total do trimestre.
+# Linhas sem associado ficam de fora (o groupby do pandas também as descartava).
+SQL_PARTICIPACAO = f"""
+    WITH por_grupo AS (
+        SELECT
+            NomeAssociado,
+            Nome_Grupo,
+            CAST(COALESCE(SUM(quantidadeItem), 0) AS FLOAT64) AS qtditens,
+            CAST(COALESCE(SUM(valorTotalItem - valorDescontoItem), 0) AS FLOAT64) AS valorTotalItem
+        FROM {OBT_VENDA_SUMARIZADA}
+        WHERE dataVenda BETWEEN @datainicio AND @datafim
+          AND NomeAssociado IS NOT NULL
+        GROUP BY NomeAssociado, Nome_Grupo
+    )
+    SELECT
+        NomeAssociado,
+        Nome_Grupo,
+        qtditens,
+        valorTotalItem,
+        SAFE_DIVIDE(qtditens, SUM(qtditens) OVER (PARTITION BY Nome_Grupo)) * 100 AS percentual_qtd,
+        SUM(qtditens) OVER (PARTITION BY NomeAssociado) AS qtd_associado,
+        SUM(valorTotalItem) OVER (PARTITION BY NomeAssociado) AS valor_associado,
+        SAFE_DIVIDE(SUM(qtditens) OVER (PARTITION BY NomeAssociado), SUM(qtditens) OVER ()) * 100 AS percentual_associado
+    FROM por_grupo
+"""
 
 def get_db_engine():
     """
@@ -45,16 +90,22 @@ def calculatrimestre():
     return [trimestre_anterior, data_inicio.date(), data_fim.date(), ano_trimestre_anterior]
 
 def agrupaporcategoria(df):
-    df_agrupado = df.groupby(['NomeAssociado', 'Nome_Grupo'], as_index=False)[['qtditens', 'valorTotalItem']].sum()
-    qtd_por_subgrupo = df_agrupado.groupby('Nome_Grupo')['qtditens'].transform('sum')
-    df_agrupado['percentual_qtd'] = (df_agrupado['qtditens'] / qtd_por_subgrupo) * 100
+    """
+    Participação por (associado, grupo), a partir do resultado do
+    SQL_PARTICIPACAO. Linhas sem grupo ficam de fora.
+    """
+    df_agrupado = df.loc[df['Nome_Grupo'].notna(), ['NomeAssociado', 'Nome_Grupo', 'qtditens', 'valorTotalItem', 'percentual_qtd']]
     df_agrupado = df_agrupado.sort_values(by=['Nome_Grupo', 'percentual_qtd'], ascending=[True, False])
-    return df_agrupado
+    return df_agrupado.reset_index(drop=True)
 
 def agrupaporassociado(df):
-    df_agrupado = df.groupby(['NomeAssociado'], as_index=False)[['qtditens', 'valorTotalItem']].sum()
-    df_agrupado['percentual_qtd'] = (df_agrupado['qtditens'] / df_agrupado['qtditens'].sum()) * 100
-    df_agrupado = df_agrupado.round(2)
+    """
+    Participação de cada associado no trimestre, a partir do resultado do
+    SQL_PARTICIPACAO (os totais por associado se repetem em cada grupo).
+    """
+    df_agrupado = df.drop_duplicates('NomeAssociado')[['NomeAssociado', 'qtd_associado', 'valor_associado', 'percentual_associado']]
+    df_agrupado.columns = ['NomeAssociado', 'qtditens', 'valorTotalItem', 'percentual_qtd']
+    df_agrupado = df_agrupado.sort_values('NomeAssociado').reset_index(drop=True).round(2)
     return df_agrupado
 
 def pivotableassociado(df):
@@ -68,49 +119,131 @@ def pivotableassociado(df):
     pivot = df_pivot_grupo.reset_index()
     return pivot
 
+def gravar_historico(df_associado, ano, trimestre):
+    """
+    Grava a participação dos associados no histórico (ParticipacaoAssociado),
+    substituindo só as linhas do trimestre informado, e aponta o trimestre
+    mais recente como vigente. Tudo numa transação.
+
+    Args:
+        df_associado (DataFrame): Saída de agrupaporassociado, com as colunas
+            já em minúsculas (nomeassociado, qtditens, valortotalitem,
+            percentual_qtd).
+    """
+    df = df_associado[df_associado['nomeassociado'].notna()]
+    nomes = df['nomeassociado'].astype(str).str.strip().str.upper()
+    df = df.groupby(nomes)[['qtditens', 'valortotalitem', 'percentual_qtd']].sum()
+
+    with transaction.atomic():
+        registro, _ = TrimestreParticipacao.objects.update_or_create(
+            ano=ano, trimestre=trimestre, defaults={'atualizado_em': timezone.now()}
+        )
+        registro.participacoes.all().delete()
+        ParticipacaoAssociado.objects.bulk_create([
+            ParticipacaoAssociado(trimestre=registro, nome=nome, qtditens=qtd, valor=valor, percentual=perc)
+            for nome, qtd, valor, perc in df.itertuples(name=None)
+        ], batch_size=1000)
+
+        # Primeiro desmarca o anterior: só pode haver um vigente.
+        atual = TrimestreParticipacao.objects.order_by('-ano', '-trimestre').first()
+        TrimestreParticipacao.objects.filter(vigente=True).exclude(pk=atual.pk).update(vigente=False)
+        TrimestreParticipacao.objects.filter(pk=atual.pk).update(vigente=True)
+
+def sugestao_distribuicao(trimestres=None):
+    """
+    Participação (%) de cada associado para a sugestão de distribuição.
+
+    Com um trimestre, é a do trimestre vigente (uma leitura pelo índice
+    (trimestre, nome)). Com N, é a média dos N trimestres até o vigente; o
+    associado que não vendeu num deles conta 0% naquele trimestre.
+
+    Args:
+        trimestres (int, opcional): Padrão DISTRIBUICAO_TRIMESTRES_SUGESTAO.
+
+    Returns:
+        Dicionário nome do associado (normalizado) -> percentual.
+    """
+    trimestres = trimestres or TRIMESTRES_SUGESTAO
+    if trimestres == 1:
+        linhas = ParticipacaoAssociado.objects.filter(trimestre__vigente=True).values_list('nome', 'percentual')
+        return dict(linhas)
+
+    atual = TrimestreParticipacao.objects.filter(vigente=True).first()
+    if atual is None:
+        return {}
+    ids = list(
+        TrimestreParticipacao.objects
+        .filter(models.Q(ano__lt=atual.ano) | models.Q(ano=atual.ano, trimestre__lte=atual.trimestre))
+        .order_by('-ano', '-trimestre')
+        .values_list('pk', flat=True)[:trimestres]
+    )
+    somas = (
+        ParticipacaoAssociado.objects.filter(trimestre_id__in=ids)
+        .values_list('nome').annotate(soma=models.Sum('percentual'))
+    )
+    return {nome: round(soma / len(ids), 2) for nome, soma in somas}
+
 def sincronizar_lojas(df_associado):
     """
     NOVIDADE 2: Pega a lista de lojas que veio do BigQuery e garante 
     que elas existam na tabela de Associados do Django.
+
+    Em lote: normaliza os nomes de uma vez, busca os já cadastrados numa
+    consulta e insere os que faltam num único bulk_create, com o mesmo
+    número de idas ao banco qualquer que seja a quantidade de lojas.
+
+    cadastro_associado não tem índice único no nome (tabela fora das
+    migrações). Por isso a conferência e a inserção rodam numa transação
+    com a tabela bloqueada para escrita (no Postgres): duas sincronizações
+    simultâneas não cadastram a mesma loja duas vezes. A leitura continua
+    liberada.
+
+    Returns:
+        Uma tupla (criadas, existentes), ou None em caso de erro.
     """
     print("Sincronizando lojas encontradas no BigQuery com o Cadastro...")
     try:
-        # Pega nomes únicos (removendo duplicados)
-        lojas_nomes = df_associado['NomeAssociado'].unique()
-        
-        cont_criadas = 0
-        for nome_loja in lojas_nomes:
-            if nome_loja:
-                nome_limpo = str(nome_loja).strip().upper()
-                # O Django get_or_create verifica se existe. Se não, cria.
-                obj, created = Associado.objects.get_or_create(
-                    nome=nome_limpo,
-                    defaults={'status': 'ATIVO'} # Se criar, já cria como ATIVO
-                )
-                if created:
-                    cont_criadas += 1
-        
-        print(f"Sincronização concluída. {cont_criadas} novas lojas cadastradas.")
-        return True
+        # Nomes únicos, limpos e em maiúsculas (vazios ficam de fora)
+        nomes = df_associado['NomeAssociado'].dropna().astype(str).str.strip().str.upper()
+        nomes = set(nomes[nomes != ''].unique())
+
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute(f"LOCK TABLE {Associado._meta.db_table} IN SHARE ROW EXCLUSIVE MODE")
+            existentes = set(Associado.objects.filter(nome__in=nomes).values_list('nome', flat=True))
+            novas = sorted(nomes - existentes)
+            Associado.objects.bulk_create(
+                [Associado(nome=nome, status='ATIVO') for nome in novas]  # Se criar, já cria como ATIVO
+            )
+
+        print(f"Sincronização concluída. {len(novas)} novas lojas cadastradas, {len(existentes)} já existentes.")
+        return len(novas), len(existentes)
     except Exception as e:
         print(f"Erro ao sincronizar lojas: {e}")
-        return False
+        return None
 
-def executar_atualizacao_distribuicao():
+def executar_atualizacao_distribuicao(progresso=None):
     """
-    Função principal chamada pela View do Django
+    Função principal, executada em segundo plano (ver atualizacao_service)
+    ou pelo comando 'atualizar_distribuicao'.
+
+    Args:
+        progresso (callable, opcional): Chamado com o nome de cada etapa (ver
+            ETAPAS) quando ela começa. Pode levantar AtualizacaoCancelada
+            para interromper a rotina entre uma etapa e outra.
+
+    Returns:
+        Uma tupla (sucesso, mensagem).
     """
+    etapa = progresso or (lambda nome: None)
     print("Iniciando rotina de distribuição...")
     
-    # 1. Conexão BigQuery (Blindada Híbrida)
+    # 1. Conexão BigQuery (cliente compartilhado do processo)
     try:
-        client = bigquery.Client() 
-    except:
-        from google.oauth2 import service_account
-        if os.path.exists('credenciais.json'):
-            client = bigquery.Client(credentials=service_account.Credentials.from_service_account_file('credenciais.json'))
-        else:
-            return False, "Erro: Credenciais GCP não encontradas."
+        bigquery_client.get_client()
+    except Exception as e:
+        return False, f"Erro: Credenciais GCP não encontradas. {e}"
 
     # 2. Conexão Postgres (SQLAlchemy)
     engine = get_db_engine()
@@ -124,16 +257,16 @@ def executar_atualizacao_distribuicao():
 
     print(f"Processando Trimestre: {trimestre}/{ano}")
 
-    query = f"""SELECT  NomeAssociado, NomeLoja,Nome_Produto as Produto,seqfamilia,Nome_familia as Familia,Nome_Grupo,Nome_SubGrupo as subgrupo,
-    sum(quantidadeItem) as qtditens, sum(valorAcrescimoItem) as valorAcrescimoItem ,
-    sum(valorDescontoItem) as valorDescontoItem , sum(valorTotalItem-valorDescontoItem) as valorTotalItem , sum(qtdCupomDepartamento) as qtdCupomDepartamento
-    FROM `singular-ray-422121`.gold.obt_tb_venda_sumarizada_prodcrm
-    where dataVenda between '{datainicio}' and '{datafim}'
-    group by NomeAssociado,NomeLoja,Nome_Produto,seqfamilia,Nome_familia,Nome_Grupo,Nome_SubGrupo
-    order by NomeAssociado, NomeLoja,Nome_Produto,Nome_Grupo,Nome_SubGrupo"""
+    query = Query(SQL_PARTICIPACAO, {'datainicio': datainicio, 'datafim': datafim})
 
+    etapa('consulta')
     try:
-        df = client.query(query).to_dataframe()
+        # Rotina batch: sem orçamento interativo, mas registra o volume lido.
+        estimado = bigquery_client.estimate_bytes(query)
+        print(f"Leitura estimada da venda sumarizada: {bigquery_client.format_bytes(estimado)}")
+        df = bigquery_client.query_dataframe(query, on_job_done=lambda job: etapa('download'))
+    except AtualizacaoCancelada:
+        raise
     except Exception as e:
         return False, f"Erro BigQuery: {str(e)}"
 
@@ -141,6 +274,7 @@ def executar_atualizacao_distribuicao():
         return False, "Nenhum dado encontrado no período."
 
     # Processamento Pandas
+    etapa('agregacao')
     df_agrupado = agrupaporcategoria(df)
     df_associado = agrupaporassociado(df)
     df_pivot = pivotableassociado(df_agrupado)
@@ -158,13 +292,32 @@ def executar_atualizacao_distribuicao():
     df_associado.columns = [col.lower().strip().replace(" ","_") for col in df_associado.columns]
 
     # --- NOVIDADE 3: Executar a sincronização das lojas ANTES de salvar ---
-    sincronizar_lojas(df) # Usamos o df original que tem a coluna NomeAssociado bruta
+    etapa('lojas')
+    lojas = sincronizar_lojas(df) # Usamos o df do BigQuery, que tem a coluna NomeAssociado bruta
+    if lojas is None:
+        resumo_lojas = "Lojas não sincronizadas (ver log)."
+    else:
+        resumo_lojas = f"Lojas: {lojas[0]} novas, {lojas[1]} já cadastradas."
 
-    # Gravação no Banco
-    try:
-        df_pivot.to_sql('gradepercatual', index=False, if_exists='replace', con=engine)
-        df_associado.to_sql('gradepercatualassoc', index=False, if_exists='replace', con=engine)
-        
-        return True, "Tabelas atualizadas e Lojas sincronizadas com sucesso!"
-    except Exception as e:
-        return False, f"Erro ao salvar no PostgreSQL: {str(e)}"
\ No newline at end of file
+    # Gravação no Banco: COPY para tabelas de staging e troca atômica das
+    # duas tabelas (quem lê nunca encontra tabela vazia ou ausente).
+    # O histórico é gravado antes, numa transação do Django que só faz
+    # COMMIT depois da troca: se o histórico falhar, as tabelas nem são
+    # trocadas; se a troca falhar, o trimestre sai do histórico.
+    etapa('gravacao')
+    with transaction.atomic():
+        try:
+            gravar_historico(df_associado, ano, trimestre)
+        except Exception as e:
+            transaction.set_rollback(True)
+            return False, f"Erro ao gravar o histórico de participação: {str(e)}"
+        try:
+            substituir_tabelas(engine, {
+                'gradepercatual': df_pivot,
+                'gradepercatualassoc': df_associado,
+            })
+        except Exception as e:
+            transaction.set_rollback(True)
+            return False, f"Erro ao salvar no PostgreSQL: {str(e)}"
+
+    return True, f"Tabelas atualizadas com sucesso! {resumo_lojas}"
@@ -88,7 +88,7 @@ class ItemGradeForm(forms.ModelForm):
         required=False,
         widget=forms.TextInput(attrs={
             'class': 'form-control', 
-            'placeholder': 'Digite o cód ou nome para buscar...',
+            'placeholder': 'Digite o cód ou nome para buscar, ou cole uma lista de códigos...',
             'id': 'input-busca-sku'
         })
     )
@@ -0,0 +1,96 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from apuracao_grade import snapshot_service
+from apuracao_grade.models import Grade
+from gcp_services.services import bigquery_client
+
+# Status das grades cujo dashboard é acompanhado pelos compradores.
+STATUS_ATIVOS = ('aprovada', 'em_analise')
+
+
+def _aquecer(grade, forcar: bool) -> tuple[str, float, int]:
+    """Atualiza o snapshot de uma grade (roda numa thread do pool)."""
+    inicio = time.monotonic()
+    try:
+        _, skus, grupos = snapshot_service.parametros(grade)
+        if not skus or not grupos:
+            return 'sem_parametros', time.monotonic() - inicio, 0
+        _, info = snapshot_service.carregar(
+            grade, grupos, skus, forcar=forcar,
+            timeout=bigquery_client.TIMEOUT_PADRAO,
+        )
+        if info['desatualizado']:
+            # O dashboard segue com o snapshot anterior, mas o aquecimento falhou.
+            raise RuntimeError(info['erro_atualizacao'])
+        return info['origem'], time.monotonic() - inicio, info['bytes_processados']
+    finally:
+        # Cada thread abre a própria conexão com o banco; fecha ao terminar.
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        "Pré-calcula os snapshots de apuração das grades ativas (aprovadas ou em análise "
+        "com o período de compras em curso), para o dashboard abrir sem consulta fria "
+        "ao BigQuery. Pensado para rodar no cron (ex.: a cada 15 minutos e antes do expediente)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.APURACAO_AQUECIMENTO_WORKERS,
+                            help='Grades atualizadas em paralelo.')
+        parser.add_argument('--forcar', action='store_true',
+                            help='Atualiza mesmo os snapshots recentes.')
+        parser.add_argument('--grade', type=int, action='append', dest='grades',
+                            help='Aquece só a(s) grade(s) informada(s), independente do status.')
+
+    def handle(self, *args, **options):
+        hoje = timezone.localdate()
+        grades = Grade.objects.select_related('evento')
+        if options['grades']:
+            grades = grades.filter(pk__in=options['grades'])
+        else:
+            grades = grades.filter(
+                status__in=STATUS_ATIVOS,
+                data_inicio__lte=hoje,
+                evento__data_fim__gte=hoje,
+            )
+        grades = list(grades)
+        if not grades:
+            self.stdout.write("Nenhuma grade ativa para aquecer.")
+            return
+
+        workers = max(1, options['workers'])
+        self.stdout.write(f"Aquecendo {len(grades)} grade(s) com {workers} worker(s)...")
+        inicio = time.monotonic()
+        falhas = 0
+        total_bytes = 0
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='aquecer') as pool:
+            futuros = {pool.submit(_aquecer, grade, options['forcar']): grade for grade in grades}
+            for futuro in as_completed(futuros):
+                grade = futuros[futuro]
+                try:
+                    origem, duracao, bytes_processados = futuro.result()
+                except Exception as e:
+                    falhas += 1
+                    self.stderr.write(f"  Grade #{grade.pk}: erro - {e}")
+                    continue
+                total_bytes += bytes_processados
+                self.stdout.write(
+                    f"  Grade #{grade.pk}: {origem} em {duracao:.1f}s "
+                    f"({bigquery_client.format_bytes(bytes_processados)})"
+                )
+
+        resumo = (
+            f"{len(grades) - falhas} grade(s) aquecida(s) em {time.monotonic() - inicio:.1f}s, "
+            f"{bigquery_client.format_bytes(total_bytes)} processados."
+        )
+        if falhas:
+            self.stdout.write(self.style.WARNING(f"{resumo} {falhas} falha(s)."))
+        else:
+            self.stdout.write(self.style.SUCCESS(resumo))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apuracao_grade import atualizacao_service
+
+
+class Command(BaseCommand):
+    help = (
+        "Atualiza as tabelas de distribuição (participação do trimestre anterior) neste "
+        "processo, registrando a execução como a tela de admin. Pensado para o cron, "
+        "uma vez por trimestre (ou por dia, para pegar notas atrasadas)."
+    )
+
+    def handle(self, *args, **options):
+        job, criada = atualizacao_service.reservar()
+        if not criada:
+            raise CommandError(f"Já existe uma atualização em andamento (#{job.pk}).")
+
+        self.stdout.write(f"Atualização #{job.pk} iniciada...")
+        job = atualizacao_service.executar(job.pk)
+
+        for etapa, segundos in job.tempos.items():
+            self.stdout.write(f"  {etapa}: {segundos:.1f}s")
+        if job.status == 'concluida':
+            self.stdout.write(self.style.SUCCESS(job.mensagem))
+        else:
+            raise CommandError(job.mensagem)
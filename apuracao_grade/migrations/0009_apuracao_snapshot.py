@@ -0,0 +1,50 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:00
+
+import django.db.models.deletion
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apuracao_grade', '0008_alter_grade_comprador'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApuracaoSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('assinatura', models.CharField(max_length=64)),
+                ('ultima_data', models.DateField(blank=True, null=True, verbose_name='Última data de emissão')),
+                ('atualizado_em', models.DateTimeField(verbose_name='Atualizado em (BigQuery)')),
+                ('bytes_processados', models.BigIntegerField(default=0)),
+                ('atualizando_ate', models.DateTimeField(blank=True, null=True)),
+                ('grade', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='apuracao_snapshot', to='apuracao_grade.grade')),
+            ],
+            options={
+                'verbose_name': 'Snapshot de Apuração',
+                'verbose_name_plural': 'Snapshots de Apuração',
+            },
+        ),
+        migrations.CreateModel(
+            name='ApuracaoSnapshotLinha',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data_emissao', models.DateField()),
+                ('associado', models.CharField(max_length=255)),
+                ('seq_produto', models.BigIntegerField()),
+                ('homologado', models.BooleanField()),
+                ('cnpj_pirata', models.CharField(blank=True, max_length=20, null=True)),
+                ('fornecedor_nome', models.CharField(blank=True, max_length=255, null=True)),
+                ('qtd', models.FloatField(default=0)),
+                ('valor', models.FloatField(default=0)),
+                ('snapshot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='linhas', to='apuracao_grade.apuracaosnapshot')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['snapshot', 'data_emissao'], name='apuracao_gr_snapsho_fcb3ae_idx')],
+                'constraints': [models.UniqueConstraint(models.F('snapshot'), models.F('data_emissao'), models.F('associado'), models.F('seq_produto'), models.F('homologado'), django.db.models.functions.comparison.Coalesce('cnpj_pirata', models.Value('')), name='apuracao_snapshot_linha_grao')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apuracao_grade', '0009_apuracao_snapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AtualizacaoDistribuicao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('executando', 'Executando'), ('concluida', 'Concluída'), ('erro', 'Erro'), ('cancelada', 'Cancelada')], default='pendente', max_length=20)),
+                ('etapa', models.CharField(blank=True, default='', max_length=20)),
+                ('mensagem', models.TextField(blank=True, default='')),
+                ('tempos', models.JSONField(blank=True, default=dict)),
+                ('cancelamento_solicitado', models.BooleanField(default=False)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('iniciado_em', models.DateTimeField(blank=True, null=True)),
+                ('finalizado_em', models.DateTimeField(blank=True, null=True)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+                ('solicitado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Atualização da Distribuição',
+                'verbose_name_plural': 'Atualizações da Distribuição',
+                'ordering': ['-criado_em'],
+                'constraints': [models.UniqueConstraint(models.Value(1), condition=models.Q(('status__in', ('pendente', 'executando'))), name='atualizacao_distribuicao_uma_ativa')],
+            },
+        ),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def copiar_trimestre_atual(apps, schema_editor):
+    """
+    Copia para o histórico o trimestre que está hoje em gradepercatualassoc
+    (tabela gravada pela rotina, fora das migrações), se ela existir.
+    """
+    conexao = schema_editor.connection
+    if 'gradepercatualassoc' not in conexao.introspection.table_names():
+        return
+    TrimestreParticipacao = apps.get_model('apuracao_grade', 'TrimestreParticipacao')
+    ParticipacaoAssociado = apps.get_model('apuracao_grade', 'ParticipacaoAssociado')
+    with conexao.cursor() as cursor:
+        cursor.execute("""
+            SELECT ano, trimestre, UPPER(TRIM(nomeassociado)), SUM(qtditens), SUM(valortotalitem), SUM(percentual_qtd)
+            FROM gradepercatualassoc
+            WHERE nomeassociado IS NOT NULL
+            GROUP BY ano, trimestre, UPPER(TRIM(nomeassociado))
+        """)
+        linhas = cursor.fetchall()
+    trimestres = {}
+    for ano, trimestre, *_ in linhas:
+        if (ano, trimestre) not in trimestres:
+            trimestres[(ano, trimestre)] = TrimestreParticipacao.objects.create(
+                ano=ano, trimestre=trimestre, atualizado_em=timezone.now()
+            )
+    ParticipacaoAssociado.objects.bulk_create([
+        ParticipacaoAssociado(
+            trimestre=trimestres[(ano, trimestre)], nome=nome,
+            qtditens=qtd or 0, valor=valor or 0, percentual=perc or 0,
+        )
+        for ano, trimestre, nome, qtd, valor, perc in linhas
+    ])
+    if trimestres:
+        atual = trimestres[max(trimestres)]
+        atual.vigente = True
+        atual.save(update_fields=['vigente'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apuracao_grade', '0010_atualizacao_distribuicao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrimestreParticipacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ano', models.PositiveSmallIntegerField()),
+                ('trimestre', models.PositiveSmallIntegerField()),
+                ('vigente', models.BooleanField(default=False)),
+                ('atualizado_em', models.DateTimeField(verbose_name='Atualizado em')),
+            ],
+            options={
+                'verbose_name': 'Trimestre de Participação',
+                'verbose_name_plural': 'Trimestres de Participação',
+                'ordering': ['-ano', '-trimestre'],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('vigente', True)), fields=('vigente',), name='trimestre_participacao_um_vigente')],
+                'unique_together': {('ano', 'trimestre')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ParticipacaoAssociado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=255)),
+                ('qtditens', models.FloatField(default=0)),
+                ('valor', models.FloatField(default=0)),
+                ('percentual', models.FloatField(default=0, verbose_name='% Participação')),
+                ('trimestre', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='participacoes', to='apuracao_grade.trimestreparticipacao')),
+            ],
+            options={
+                'verbose_name': 'Participação do Associado',
+                'verbose_name_plural': 'Participações dos Associados',
+                'unique_together': {('trimestre', 'nome')},
+            },
+        ),
+        migrations.RunPython(copiar_trimestre_atual, migrations.RunPython.noop),
+    ]
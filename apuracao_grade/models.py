@@ -2,6 +2,8 @@ from django.db import models
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
+from django.db.models import Value
+from django.db.models.functions import Coalesce
 
 
 #--Classe de Evento - Cabeçalho dos eventos comerciais --#
@@ -223,4 +225,167 @@ class ItemGradeDistribuicao(models.Model):
         verbose_name = "Distribuição por Associado"
         verbose_name_plural = "Distribuições por Associados"
         # Garante que não duplique loja no mesmo item
-        unique_together = ('item_grade', 'associado_id')
\ No newline at end of file
+        unique_together = ('item_grade', 'associado_id')
+
+class ApuracaoSnapshot(models.Model):
+    """
+    Cópia local (Postgres) do realizado de uma grade vindo do BigQuery.
+
+    Guarda as linhas da consulta base do apuracao_service (ver
+    ApuracaoSnapshotLinha). 'ultima_data' é a marca d'água: a atualização
+    incremental só busca no BigQuery as compras a partir dessa data.
+    """
+    grade = models.OneToOneField(Grade, on_delete=models.CASCADE, related_name='apuracao_snapshot')
+
+    # Hash dos parâmetros da consulta (grupos, SKUs e período). Se a grade
+    # for editada, a assinatura muda e o snapshot é refeito do zero.
+    assinatura = models.CharField(max_length=64)
+
+    ultima_data = models.DateField(null=True, blank=True, verbose_name="Última data de emissão")
+    atualizado_em = models.DateTimeField(verbose_name="Atualizado em (BigQuery)")
+    bytes_processados = models.BigIntegerField(default=0)
+    # Reserva da atualização em andamento (ver snapshot_service.atualizar):
+    # enquanto não vencer, outra requisição não consulta o BigQuery para a
+    # mesma grade. None = nenhuma atualização em andamento.
+    atualizando_ate = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Snapshot de Apuração"
+        verbose_name_plural = "Snapshots de Apuração"
+
+    def __str__(self):
+        return f"Snapshot Grade #{self.grade_id} ({self.atualizado_em:%d/%m/%Y %H:%M})"
+
+
+class ApuracaoSnapshotLinha(models.Model):
+    """
+    Linha do snapshot, no grão da consulta base:
+    (data_emissao, associado, seq_produto, homologado, cnpj_pirata).
+    """
+    snapshot = models.ForeignKey(ApuracaoSnapshot, on_delete=models.CASCADE, related_name='linhas')
+
+    data_emissao = models.DateField()
+    associado = models.CharField(max_length=255)
+    seq_produto = models.BigIntegerField()
+    homologado = models.BooleanField()
+    cnpj_pirata = models.CharField(max_length=20, null=True, blank=True)
+    fornecedor_nome = models.CharField(max_length=255, null=True, blank=True)
+    qtd = models.FloatField(default=0)
+    valor = models.FloatField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['snapshot', 'data_emissao']),
+        ]
+        constraints = [
+            # Uma linha por grão. cnpj_pirata é NULL nas compras homologadas:
+            # o COALESCE faz o índice valer para elas também.
+            models.UniqueConstraint(
+                'snapshot', 'data_emissao', 'associado', 'seq_produto', 'homologado',
+                Coalesce('cnpj_pirata', Value('')),
+                name='apuracao_snapshot_linha_grao',
+            ),
+        ]
+
+
+class AtualizacaoDistribuicao(models.Model):
+    """
+    Execução da rotina de atualização das tabelas de distribuição
+    (distribuicao_service), feita em segundo plano por atualizacao_service.
+
+    'etapa' é a etapa em andamento e 'tempos' guarda a duração, em segundos,
+    de cada etapa já concluída.
+    """
+    STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('executando', 'Executando'),
+        ('concluida', 'Concluída'),
+        ('erro', 'Erro'),
+        ('cancelada', 'Cancelada'),
+    ]
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pendente')
+    etapa = models.CharField(max_length=20, blank=True, default='')
+    mensagem = models.TextField(blank=True, default='')
+    tempos = models.JSONField(default=dict, blank=True)
+    cancelamento_solicitado = models.BooleanField(default=False)
+
+    solicitado_por = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+    )
+    criado_em = models.DateTimeField(auto_now_add=True)
+    iniciado_em = models.DateTimeField(null=True, blank=True)
+    finalizado_em = models.DateTimeField(null=True, blank=True)
+    # Atualizado a cada etapa: uma execução 'executando' sem atualização há
+    # muito tempo é de um processo que morreu (ver atualizacao_service).
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-criado_em']
+        constraints = [
+            # Só uma execução ativa por vez, garantido pelo banco: índice
+            # único parcial sobre uma constante, valendo só para as ativas.
+            models.UniqueConstraint(
+                Value(1),
+                condition=models.Q(status__in=('pendente', 'executando')),
+                name='atualizacao_distribuicao_uma_ativa',
+            ),
+        ]
+        verbose_name = "Atualização da Distribuição"
+        verbose_name_plural = "Atualizações da Distribuição"
+
+    def __str__(self):
+        return f"Atualização #{self.pk} ({self.get_status_display()})"
+
+
+class TrimestreParticipacao(models.Model):
+    """
+    Trimestre já apurado pela rotina de distribuição (distribuicao_service).
+
+    O histórico só cresce: cada trimestre fica com as suas participações
+    (ParticipacaoAssociado), e reprocessar um trimestre substitui apenas as
+    linhas dele. 'vigente' aponta o trimestre mais recente, usado na
+    sugestão de distribuição; só uma linha pode estar vigente.
+    """
+    ano = models.PositiveSmallIntegerField()
+    trimestre = models.PositiveSmallIntegerField()
+    vigente = models.BooleanField(default=False)
+    atualizado_em = models.DateTimeField(verbose_name="Atualizado em")
+
+    class Meta:
+        unique_together = ('ano', 'trimestre')
+        ordering = ['-ano', '-trimestre']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['vigente'],
+                condition=models.Q(vigente=True),
+                name='trimestre_participacao_um_vigente',
+            ),
+        ]
+        verbose_name = "Trimestre de Participação"
+        verbose_name_plural = "Trimestres de Participação"
+
+    def __str__(self):
+        return f"{self.trimestre}/{self.ano}"
+
+
+class ParticipacaoAssociado(models.Model):
+    """
+    Participação de um associado nas vendas de um trimestre. 'nome' já vem
+    normalizado (sem espaços nas pontas, em maiúsculas), como Associado.nome.
+    """
+    trimestre = models.ForeignKey(TrimestreParticipacao, on_delete=models.CASCADE, related_name='participacoes')
+    nome = models.CharField(max_length=255)
+    qtditens = models.FloatField(default=0)
+    valor = models.FloatField(default=0)
+    percentual = models.FloatField(default=0, verbose_name="% Participação")
+
+    class Meta:
+        # O índice único (trimestre, nome) atende a leitura por trimestre.
+        unique_together = ('trimestre', 'nome')
+        verbose_name = "Participação do Associado"
+        verbose_name_plural = "Participações dos Associados"
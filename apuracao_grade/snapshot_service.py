@@ -0,0 +1,270 @@
+"""
+Snapshot em Postgres da apuração da grade, com atualização incremental.
+
+Na primeira consulta de uma grade, o resultado completo do BigQuery (linhas
+da consulta base do apuracao_service) é gravado em ApuracaoSnapshotLinha.
+Nas seguintes:
+  - grade encerrada (snapshot atualizado depois do fim do evento + carência):
+    lê só do Postgres, sem custo de BigQuery;
+  - snapshot recente (menos de APURACAO_SNAPSHOT_INTERVALO segundos): idem;
+  - caso contrário: busca no BigQuery só as compras a partir da marca d'água
+    ('ultima_data') e substitui esses dias no snapshot.
+
+Só uma requisição por vez atualiza a grade: ela reserva o snapshot com um
+UPDATE condicional (atualizando_ate) e consulta o BigQuery fora de transação.
+As demais servem o snapshot atual, ou esperam a reserva se ainda não há
+snapshot válido.
+"""
+import hashlib
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from gcp_services.services import bigquery_client
+from . import apuracao_service
+from .models import ApuracaoSnapshot, ApuracaoSnapshotLinha, ItemGradeSKU
+
+# Intervalo mínimo entre atualizações de uma grade em andamento (segundos).
+INTERVALO = getattr(settings, 'APURACAO_SNAPSHOT_INTERVALO', 15 * 60)
+
+# Dias após o fim do evento em que ainda chegam notas atrasadas. Depois
+# disso, a grade é considerada encerrada e o snapshot não muda mais.
+DIAS_CARENCIA = getattr(settings, 'APURACAO_SNAPSHOT_DIAS_CARENCIA', 7)
+
+_TAMANHO_LOTE = 2000
+
+# Folga da reserva além do timeout da consulta (download e gravação), em
+# segundos. Uma reserva vencida é de uma atualização que morreu no meio.
+_FOLGA_RESERVA = 60
+# Intervalo entre conferências de quem espera outra atualização (segundos).
+_INTERVALO_ESPERA = 0.5
+
+
+def assinatura(grupos: list[int], skus: list[int], dt_inicio, dt_fim_evento) -> str:
+    """Hash dos parâmetros da consulta base."""
+    raw = f"{sorted(grupos)}|{sorted(skus)}|{dt_inicio}|{dt_fim_evento}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def esta_encerrado(snapshot: ApuracaoSnapshot, dt_fim_evento) -> bool:
+    """True se o snapshot foi atualizado depois do fim do evento + carência."""
+    return timezone.localdate(snapshot.atualizado_em) > dt_fim_evento + timedelta(days=DIAS_CARENCIA)
+
+
+def parametros(grade) -> tuple[dict, list[int], list[int]]:
+    """
+    Parâmetros da apuração a partir do cadastro da grade.
+
+    Returns:
+        Uma tupla (skus_map, skus, grupos): o mapa SKU -> descrição do item
+        pai, os SeqProduto numéricos e os SEQREDE dos grupos da grade.
+    """
+    skus_objs = ItemGradeSKU.objects.filter(item_grade__grade=grade).select_related('item_grade')
+    skus_map = {str(s.codigo_produto): s.item_grade.descricao_resumida for s in skus_objs}
+    # Chaves numéricas nativas: comparar SeqProduto sem CAST permite pruning/clustering
+    skus = [int(s) for s in skus_map if s.isdigit()]
+    grupos = [int(g.grupo_id) for g in grade.grupos.all() if str(g.grupo_id).isdigit()]
+    return skus_map, skus, grupos
+
+
+def _para_linha(snapshot: ApuracaoSnapshot, row: dict) -> ApuracaoSnapshotLinha:
+    return ApuracaoSnapshotLinha(
+        snapshot=snapshot,
+        data_emissao=row['data_emissao'],
+        associado=row['NomeAssociado'],
+        seq_produto=row['SeqProduto'],
+        homologado=bool(row['homologado']),
+        cnpj_pirata=row['cnpj_pirata'],
+        fornecedor_nome=row['fornecedor_nome'],
+        qtd=float(row['qtd'] or 0),
+        valor=float(row['valor'] or 0),
+    )
+
+
+def _linhas(snapshot: ApuracaoSnapshot) -> list[dict]:
+    # Devolve no mesmo formato das linhas do BigQuery, para o derivar().
+    return [
+        {
+            'data_emissao': l['data_emissao'],
+            'NomeAssociado': l['associado'],
+            'SeqProduto': l['seq_produto'],
+            'homologado': l['homologado'],
+            'cnpj_pirata': l['cnpj_pirata'],
+            'fornecedor_nome': l['fornecedor_nome'],
+            'qtd': l['qtd'],
+            'valor': l['valor'],
+        }
+        for l in snapshot.linhas.values(
+            'data_emissao', 'associado', 'seq_produto', 'homologado',
+            'cnpj_pirata', 'fornecedor_nome', 'qtd', 'valor',
+        )
+    ]
+
+
+def _em_dia(snapshot: ApuracaoSnapshot, chave: str, dt_fim_evento) -> bool:
+    """True se o snapshot é da consulta atual e recente ou de grade encerrada."""
+    if snapshot.assinatura != chave:
+        return False
+    recente = (timezone.now() - snapshot.atualizado_em).total_seconds() < INTERVALO
+    return recente or esta_encerrado(snapshot, dt_fim_evento)
+
+
+def _reservar(snapshot: ApuracaoSnapshot, segundos: float):
+    """
+    Reserva a atualização do snapshot com um UPDATE condicional (sem manter
+    transação aberta). Devolve o fim da reserva, ou None se outra
+    atualização estiver em andamento.
+    """
+    agora = timezone.now()
+    ate = agora + timedelta(seconds=segundos)
+    livre = Q(atualizando_ate__isnull=True) | Q(atualizando_ate__lt=agora)
+    if ApuracaoSnapshot.objects.filter(livre, pk=snapshot.pk).update(atualizando_ate=ate):
+        return ate
+    return None
+
+
+def _liberar(snapshot: ApuracaoSnapshot, reserva):
+    ApuracaoSnapshot.objects.filter(pk=snapshot.pk, atualizando_ate=reserva).update(atualizando_ate=None)
+
+
+def atualizar(grade, grupos: list[int], skus: list[int], forcar: bool = False,
+              max_bytes: int | None = None, timeout: float | None = None) -> tuple[ApuracaoSnapshot, str, int]:
+    """
+    Cria ou atualiza o snapshot da grade a partir do BigQuery.
+
+    A atualização reserva o snapshot (atualizando_ate) antes de consultar o
+    BigQuery, fora de transação; a gravação é uma transação curta no fim.
+    Se outra requisição já estiver atualizando a grade, devolve o snapshot
+    atual (modo 'snapshot') ou, sem snapshot válido, espera por ela até o
+    timeout. Sem 'forcar', um snapshot que ficou em dia nesse meio-tempo não
+    é consultado de novo.
+
+    Returns:
+        Uma tupla (snapshot, modo, bytes), com modo 'completo',
+        'incremental' ou 'snapshot' (não consultou o BigQuery) e os bytes
+        processados pela consulta.
+    """
+    dt_inicio = grade.data_inicio
+    dt_fim_evento = grade.evento.data_fim
+    chave = assinatura(grupos, skus, dt_inicio, dt_fim_evento)
+    espera = timeout or bigquery_client.TIMEOUT_PADRAO
+
+    # get_or_create trata a corrida de duas primeiras cargas; assinatura
+    # vazia = snapshot ainda sem dados.
+    ApuracaoSnapshot.objects.get_or_create(
+        grade=grade, defaults={'assinatura': '', 'atualizado_em': timezone.now()}
+    )
+
+    limite = time.monotonic() + espera
+    while True:
+        snapshot = ApuracaoSnapshot.objects.get(grade=grade)
+        if not forcar and _em_dia(snapshot, chave, dt_fim_evento):
+            return snapshot, 'snapshot', 0
+        reserva = _reservar(snapshot, espera + _FOLGA_RESERVA)
+        if reserva is not None:
+            break
+        # Outra requisição está atualizando a grade.
+        if snapshot.assinatura == chave:
+            return snapshot, 'snapshot', 0
+        if time.monotonic() >= limite:
+            raise TimeoutError(f"Atualização da grade #{grade.pk} em andamento há mais de {espera}s.")
+        time.sleep(_INTERVALO_ESPERA)
+
+    try:
+        # Pode ter ficado em dia entre a leitura e a reserva.
+        snapshot.refresh_from_db()
+        if not forcar and _em_dia(snapshot, chave, dt_fim_evento):
+            _liberar(snapshot, reserva)
+            return snapshot, 'snapshot', 0
+
+        incremental = snapshot.assinatura == chave and snapshot.ultima_data is not None
+        # A marca d'água é inclusiva: o último dia é buscado de novo, pois pode
+        # ter recebido notas depois da atualização anterior.
+        desde = snapshot.ultima_data if incremental else dt_inicio
+
+        resultado = apuracao_service.consultar_base(
+            grupos, skus, desde, dt_fim_evento, max_bytes=max_bytes, timeout=timeout
+        )
+
+        with transaction.atomic():
+            snapshot.assinatura = chave
+            snapshot.atualizado_em = timezone.now()
+            snapshot.atualizando_ate = None
+            snapshot.bytes_processados = (resultado.bytes_processed or 0) + (
+                snapshot.bytes_processados if incremental else 0
+            )
+            novas = [row['data_emissao'] for row in resultado.rows]
+            if novas:
+                snapshot.ultima_data = max(novas)
+            elif not incremental:
+                snapshot.ultima_data = None
+            snapshot.save()
+
+            linhas = snapshot.linhas.all()
+            if incremental:
+                linhas = linhas.filter(data_emissao__gte=desde)
+            linhas.delete()
+            ApuracaoSnapshotLinha.objects.bulk_create(
+                (_para_linha(snapshot, row) for row in resultado.rows), batch_size=_TAMANHO_LOTE
+            )
+    except BaseException:
+        _liberar(snapshot, reserva)
+        raise
+
+    return snapshot, 'incremental' if incremental else 'completo', resultado.bytes_processed or 0
+
+
+def carregar(grade, grupos: list[int], skus: list[int], forcar: bool = False,
+             max_bytes: int | None = None, timeout: float | None = None) -> tuple[dict, dict]:
+    """
+    Devolve as saídas do dashboard (ver apuracao_service.derivar), lendo do
+    snapshot quando possível e atualizando-o quando necessário.
+
+    Se a atualização falhar (circuito aberto, timeout, orçamento) e houver
+    snapshot válido, serve o snapshot anterior marcado como desatualizado; o
+    erro só é repassado quando não há o que servir.
+
+    Args:
+        forcar (bool): Atualiza a partir do BigQuery mesmo com snapshot recente
+            (a grade encerrada também é atualizada).
+
+    Returns:
+        Uma tupla (saidas, info). info traz 'origem' ('snapshot', 'incremental'
+        ou 'completo'), 'atualizado_em', 'ultima_data', 'encerrado',
+        'bytes_processados' (da consulta feita agora; 0 se veio do snapshot),
+        'desatualizado' e 'erro_atualizacao' (mensagem da falha, ou None).
+    """
+    dt_fim_evento = grade.evento.data_fim
+    chave = assinatura(grupos, skus, grade.data_inicio, dt_fim_evento)
+    snapshot = ApuracaoSnapshot.objects.filter(grade=grade).first()
+
+    origem = 'snapshot'
+    bytes_processados = 0
+    erro = None
+    valido = snapshot is not None and snapshot.assinatura == chave
+    if forcar or not valido or not _em_dia(snapshot, chave, dt_fim_evento):
+        try:
+            snapshot, origem, bytes_processados = atualizar(
+                grade, grupos, skus, forcar=forcar, max_bytes=max_bytes, timeout=timeout
+            )
+        except Exception as e:
+            if not valido:
+                raise
+            print(f"Falha ao atualizar o snapshot da grade #{grade.pk}; servindo o anterior: {e}")
+            erro = str(e)
+
+    saidas = apuracao_service.derivar(_linhas(snapshot), grade.data_fim)
+    info = {
+        'origem': origem,
+        'atualizado_em': snapshot.atualizado_em,
+        'ultima_data': snapshot.ultima_data,
+        'encerrado': esta_encerrado(snapshot, dt_fim_evento),
+        'bytes_processados': bytes_processados,
+        'desatualizado': erro is not None,
+        'erro_atualizacao': erro,
+    }
+    return saidas, info
@@ -1,3 +1,85 @@
+from datetime import date, timedelta
+from types import SimpleNamespace
+from unittest import mock
+
 from django.test import TestCase
+from django.utils import timezone
+
+from . import snapshot_service
+from .models import ApuracaoSnapshot, Evento, Grade
+
+
+def _linha(dia, associado='LOJA A', seq=1, homologado=True, cnpj=None, qtd=1):
+    return {
+        'data_emissao': dia, 'NomeAssociado': associado, 'SeqProduto': seq,
+        'homologado': homologado, 'cnpj_pirata': cnpj, 'fornecedor_nome': None,
+        'qtd': qtd, 'valor': qtd * 10,
+    }
+
+
+class SnapshotIncrementalTests(TestCase):
+
+    def setUp(self):
+        hoje = timezone.localdate()
+        evento = Evento.objects.create(
+            descricao='Evento', data_inicio=hoje - timedelta(days=20), data_fim=hoje + timedelta(days=10)
+        )
+        self.grade = Grade.objects.create(
+            evento=evento, data_inicio=evento.data_inicio, data_fim=evento.data_fim
+        )
+        self.dia = lambda n: evento.data_inicio + timedelta(days=n)
+
+    def atualizar(self, linhas, grupos=(1,)):
+        resultado = SimpleNamespace(rows=linhas, bytes_processed=100)
+        with mock.patch('apuracao_grade.apuracao_service.consultar_base', return_value=resultado) as consulta:
+            snapshot, modo, _ = snapshot_service.atualizar(self.grade, list(grupos), [1, 2], forcar=True)
+        return snapshot, modo, consulta.call_args.args[2]
+
+    def grao(self, snapshot):
+        return sorted(
+            (l.data_emissao, l.associado, l.seq_produto, l.homologado, l.cnpj_pirata, l.qtd)
+            for l in snapshot.linhas.all()
+        )
+
+    def test_incremental_refaz_o_ultimo_dia_sem_duplicar(self):
+        snapshot, modo, desde = self.atualizar([
+            _linha(self.dia(0)),
+            _linha(self.dia(5)),
+            _linha(self.dia(9)),
+            _linha(self.dia(9), homologado=False, cnpj='123'),
+        ])
+        self.assertEqual((modo, desde, snapshot.ultima_data), ('completo', self.dia(0), self.dia(9)))
+
+        # O BigQuery devolve de novo o dia da marca d'água (com notas que
+        # chegaram depois) e um dia novo.
+        snapshot, modo, desde = self.atualizar([
+            _linha(self.dia(9), qtd=3),
+            _linha(self.dia(9), homologado=False, cnpj='123'),
+            _linha(self.dia(9), associado='LOJA B'),
+            _linha(self.dia(11)),
+        ])
+        self.assertEqual((modo, desde, snapshot.ultima_data), ('incremental', self.dia(9), self.dia(11)))
+        self.assertEqual(self.grao(snapshot), [
+            (self.dia(0), 'LOJA A', 1, True, None, 1),
+            (self.dia(5), 'LOJA A', 1, True, None, 1),
+            (self.dia(9), 'LOJA A', 1, False, '123', 1),
+            (self.dia(9), 'LOJA A', 1, True, None, 3),
+            (self.dia(9), 'LOJA B', 1, True, None, 1),
+            (self.dia(11), 'LOJA A', 1, True, None, 1),
+        ])
+        self.assertEqual(snapshot.bytes_processados, 200)
+
+    def test_incremental_vazio_mantem_a_marca_dagua(self):
+        self.atualizar([_linha(self.dia(0)), _linha(self.dia(3))])
+        snapshot, modo, desde = self.atualizar([])
+        self.assertEqual((modo, desde), ('incremental', self.dia(3)))
+        self.assertEqual(snapshot.ultima_data, self.dia(3))
+        # O dia da marca d'água vale o que o BigQuery devolveu (nota cancelada).
+        self.assertEqual(self.grao(snapshot), [(self.dia(0), 'LOJA A', 1, True, None, 1)])
 
-# Create your tests here.
+    def test_grade_editada_refaz_do_zero(self):
+        self.atualizar([_linha(self.dia(0)), _linha(self.dia(3))])
+        snapshot, modo, desde = self.atualizar([_linha(self.dia(1), seq=2)], grupos=(1, 2))
+        self.assertEqual((modo, desde), ('completo', self.dia(0)))
+        self.assertEqual(self.grao(snapshot), [(self.dia(1), 'LOJA A', 2, True, None, 1)])
+        self.assertIsNone(ApuracaoSnapshot.objects.get(pk=snapshot.pk).atualizando_ate)
@@ -9,6 +9,7 @@ from .views import (
     GradeCreateView,
     buscar_fornecedores_api,
     buscar_produtos_api,
+    resolver_skus_api,
     excluir_grade,
     excluir_item_grade,
     exportar_grade_excel,
@@ -39,6 +40,7 @@ urlpatterns = [
     path('grades/nova/', GradeCreateView.as_view(), name='grade-create'),
     path('grades/<int:pk>/itens/', GradeDetalheView.as_view(), name='grade-detalhe'),
     path('api/buscar-produtos/', buscar_produtos_api, name='api-buscar-produtos'),
+    path('api/resolver-skus/', resolver_skus_api, name='api-resolver-skus'),
     path('itens/<int:pk>/excluir/', excluir_item_grade, name='item-delete'),
     path('grades/<int:pk>/excluir/', excluir_grade, name='grade-delete'),
     path('api/eventos/novo-modal/', api_criar_evento_modal, name='api-criar-evento-modal'),
@@ -56,5 +58,7 @@ urlpatterns = [
     
 
     path('api/atualizar-distribuicao/', views.atualizar_distribuicao_view, name='api-atualizar-distribuicao'),
+    path('api/atualizar-distribuicao/<int:pk>/', views.status_atualizacao_distribuicao, name='api-atualizacao-distribuicao-status'),
+    path('api/atualizar-distribuicao/<int:pk>/cancelar/', views.cancelar_atualizacao_distribuicao, name='api-atualizacao-distribuicao-cancelar'),
     path('diagnostico-distribuicao/', views.diagnostico_distribuicao, name='diagnostico-distribuicao'),
 ]
\ No newline at end of file
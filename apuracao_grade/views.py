@@ -6,9 +6,10 @@ from django.contrib import messages
 from django.contrib.messages.views import SuccessMessageMixin
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView
-from .models import Evento,Grade,GradeGrupo, ItemGrade, ItemGradeSKU,ItemGradeDistribuicao
+from .models import Evento,Grade,GradeGrupo, ItemGrade, ItemGradeSKU,ItemGradeDistribuicao, AtualizacaoDistribuicao
 from .forms import GradeForm, ItemGradeForm,EventoForm,GradeHeaderForm
 from django.http import JsonResponse
+from django.conf import settings
 from django.urls import reverse
 from django.db import transaction,connection
 from usuarios.models import Associado
@@ -16,14 +17,19 @@ from django.db.models import Sum, Value, DecimalField,Min, Max, Count, Q
 from django.db.models.functions import Coalesce
 import json
 from django.http import HttpResponse
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition
+from django.utils.cache import patch_cache_control
+import hashlib
 from datetime import datetime
 import openpyxl
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-from google.cloud import bigquery
-import os
-from google.oauth2 import service_account # Precisa disso para ler o JSON
 
-from .distribuicao_service import executar_atualizacao_distribuicao
+from . import apuracao_service, atualizacao_service, snapshot_service
+from .distribuicao_service import sugestao_distribuicao
+from contratos import fornecedor_service, produto_service
+from utils.json_utils import JsonResponseRapida, colunar, quer_colunar
+from utils.search_index import normalizar
 
 
 try:
@@ -31,10 +37,7 @@ try:
 except ImportError:
     bigquery_client = None
 
-try:
-    bq_client = bigquery.Client()
-except Exception:
-    bq_client = None
+from gcp_services.services.query_templates import Query, like, DIM_FORNECEDOR, DIM_PRODUTOS
 
 
 
@@ -82,6 +85,7 @@ try:
 except ImportError:
     bigquery_client = None
 
+
 class GradeCreateView(LoginRequiredMixin, CreateView):
     model = Grade
     form_class = GradeForm
@@ -140,11 +144,36 @@ class GradeListView(LoginRequiredMixin, ListView):
         context['search_term'] = self.request.GET.get('q', '')
         return context
     
+def _etag_busca(servico):
+    """
+    ETag das buscas do autocomplete servidas pelo índice em memória: o mesmo
+    termo normalizado sobre a mesma sincronização do espelho dá a mesma
+    resposta. Sem índice (busca no BigQuery), não há ETag.
+    """
+    def etag(request):
+        termo = normalizar(request.GET.get('term', ''))
+        versao = servico.versao() if len(termo) >= 3 else None
+        if versao is None:
+            return None
+        return hashlib.md5(f"{servico.__name__}|{versao}|{termo}".encode('utf-8')).hexdigest()
+    return etag
+
+
+def _resposta_busca(resultados):
+    # O navegador pode reaproveitar a resposta por AUTOCOMPLETE_MAX_AGE
+    # segundos; depois revalida pelo ETag (304 sem refazer a busca).
+    response = JsonResponse(resultados, safe=False)
+    patch_cache_control(response, private=True, max_age=settings.AUTOCOMPLETE_MAX_AGE)
+    return response
+
+
+@gzip_page
+@condition(etag_func=_etag_busca(fornecedor_service))
 def buscar_fornecedores_api(request):
     """
-    Versão HÍBRIDA:
-    1. Tenta usar Autenticação Automática (Cloud Run).
-    2. Se der erro, tenta usar o arquivo 'credenciais.json' (Local).
+    Busca grupos de fornecedores (redes).
+    Usa o índice em memória do espelho local de dim_fornecedor; se o espelho
+    ainda não foi sincronizado, consulta o BigQuery pelo cliente compartilhado.
     """
     termo = request.GET.get('term', '').upper().strip()
     termo_limpo = termo.replace('.', '').replace('/', '').replace('-', '')
@@ -152,54 +181,44 @@ def buscar_fornecedores_api(request):
     if len(termo) < 3:
         return JsonResponse([], safe=False)
 
-    client = None
-
-    # --- BLOCO DE CONEXÃO INTELIGENTE ---
-    try:
-        # TENTATIVA 1: Modo Nuvem (Automático)
-        # O Google tenta achar a credencial sozinho.
-        client = bigquery.Client()
-    except Exception as e:
-        print(f"Modo Nuvem falhou, tentando modo Local... Erro: {e}")
-        
-        # TENTATIVA 2: Modo Local (Arquivo JSON)
-        try:
-            # Ajuste o caminho se seu arquivo estiver em outra pasta
-            caminho_json = 'credenciais.json' 
-            
-            if os.path.exists(caminho_json):
-                credentials = service_account.Credentials.from_service_account_file(caminho_json)
-                client = bigquery.Client(credentials=credentials)
-            else:
-                return JsonResponse([{'id': 0, 'text': 'Erro: credenciais.json não encontrado'}], safe=False)
-        except Exception as e_local:
-             return JsonResponse([{'id': 0, 'text': f'Erro Fatal Auth: {str(e_local)}'}], safe=False)
-
-    # --- FIM DO BLOCO DE CONEXÃO ---
+    indice = fornecedor_service.indice()
+    if indice is not None:
+        resultados = []
+        for seqrede, grupo, razao in indice.buscar(termo):
+            grupo = grupo or 'SEM NOME'
+            resultados.append({
+                'id': str(seqrede) if seqrede is not None else "0",
+                'text': f"{grupo} | {razao}" if razao else grupo,
+            })
+        return _resposta_busca(resultados)
 
-    # Query SQL
-    tabela_fornecedores = "`singular-ray-422121`.gold.dim_fornecedor" 
-    
-    sql = f"""
+    # Query SQL (parametrizada: o texto não muda entre as buscas)
+    query = Query(f"""
         SELECT 
             SEQREDE as id, 
             NOME_REDE as grupo,
             cnpj_completo as cnpj,
             NOMERAZAO as razao
-        FROM {tabela_fornecedores}
+        FROM {DIM_FORNECEDOR}
         WHERE 
            (
-               UPPER(NOME_REDE) LIKE '%{termo}%'
-            OR UPPER(NOMERAZAO) LIKE '%{termo}%'
-            OR REPLACE(REPLACE(REPLACE(cnpj_completo, '.', ''), '/', ''), '-', '') LIKE '%{termo_limpo}%'
-            OR CAST(SEQREDE AS STRING) LIKE '%{termo}%'
+               UPPER(NOME_REDE) LIKE @termo
+            OR UPPER(NOMERAZAO) LIKE @termo
+            OR REPLACE(REPLACE(REPLACE(cnpj_completo, '.', ''), '/', ''), '-', '') LIKE @termo_limpo
+            OR CAST(SEQREDE AS STRING) LIKE @termo
            )
         LIMIT 50
-    """
+    """, {'termo': like(termo), 'termo_limpo': like(termo_limpo)})
 
     try:
-        query_job = client.query(sql)
-        dados = query_job.result()
+        # dim_fornecedor muda no máximo 1x/dia: buscas repetidas saem do cache
+        # e, se o BigQuery estiver lento ou fora, o último resultado é servido.
+        dados = bigquery_client.execute(
+            query,
+            cache_ttl=bigquery_client.TTL_DIMENSAO,
+            stale_ttl=bigquery_client.STALE_DIMENSAO,
+            timeout=bigquery_client.TIMEOUT_INTERATIVO,
+        )
         
         resultados = []
         ids_processados = set()
@@ -225,7 +244,8 @@ def buscar_fornecedores_api(request):
         return JsonResponse(resultados, safe=False)
 
     except Exception as e:
-        return JsonResponse([{'id': 0, 'text': f'Erro SQL: {str(e)}'}], safe=False)
+        print(f"Erro API Fornecedores SQL: {e}")
+        return JsonResponse({'status': 'erro', 'message': 'Busca de fornecedores indisponível no momento. Tente novamente.'}, status=503)
         
 class GradeDetalheView(LoginRequiredMixin, DetailView):
     model = Grade
@@ -288,61 +308,50 @@ class GradeDetalheView(LoginRequiredMixin, DetailView):
         return self.render_to_response(context)
 
 
+@gzip_page
+@condition(etag_func=_etag_busca(produto_service))
 def buscar_produtos_api(request):
     """
-    API para buscar produtos (SKUs) no BigQuery.
-    Versão BLINDADA: Usa autenticação nativa (Cloud Run) ou arquivo local.
+    API para buscar produtos (SKUs).
+    Usa o índice de n-gramas do espelho local de DIM_PRODUTOS; se o espelho
+    ainda não foi sincronizado, consulta o BigQuery pelo cliente compartilhado.
     """
     termo = request.GET.get('term', '').upper().strip()
     
     if len(termo) < 3:
         return JsonResponse([], safe=False)
-    
-    # --- 1. CONEXÃO HÍBRIDA (IGUAL À DE FORNECEDORES) ---
-    client = None
-    try:
-        # Tenta conectar automaticamente (Funciona no Cloud Run)
-        client = bigquery.Client()
-    except Exception as e:
-        # Se falhar, tenta o arquivo local (Funciona no seu PC)
-        try:
-            caminho_json = 'credenciais.json' 
-            if os.path.exists(caminho_json):
-                credentials = service_account.Credentials.from_service_account_file(caminho_json)
-                client = bigquery.Client(credentials=credentials)
-            else:
-                print("Erro: credenciais.json não encontrado para produtos")
-                return JsonResponse([], safe=False)
-        except Exception as e_local:
-            print(f"Erro Conexão Produtos: {e_local}")
-            return JsonResponse([], safe=False)
-    # ----------------------------------------------------
 
+    indice = produto_service.indice()
+    if indice is not None:
+        resultados = [{'id': seq, 'text': texto} for seq, texto in indice.buscar(termo)]
+        return _resposta_busca(resultados)
+    
     # Prepara termo para busca (troca espaço por %)
     termo_smart = termo.replace(' ', '%')
 
-    tabela_produtos = "`singular-ray-422121`.landing_saerj.DIM_PRODUTOS" 
-
-    sql = f"""
+    query = Query(f"""
         SELECT DISTINCT
             CAST(SEQPRODUTO AS INT64) as id,
             DESCCOMPLETA as text
-        FROM {tabela_produtos}
+        FROM {DIM_PRODUTOS}
         WHERE 
            (
-               UPPER(DESCCOMPLETA) LIKE '%{termo_smart}%'
-               OR CAST(SEQPRODUTO AS STRING) LIKE '%{termo}%'
-               OR CAST(CODACESSO AS STRING) LIKE '%{termo}%'
-               OR UPPER(MARCA) LIKE '%{termo_smart}%'
+               UPPER(DESCCOMPLETA) LIKE @termo_smart
+               OR CAST(SEQPRODUTO AS STRING) LIKE @termo
+               OR CAST(CODACESSO AS STRING) LIKE @termo
+               OR UPPER(MARCA) LIKE @termo_smart
            )
         ORDER BY text
         LIMIT 300
-    """
+    """, {'termo': like(termo), 'termo_smart': like(termo_smart)})
     
     try:
-        # Executa a query usando o cliente nativo
-        query_job = client.query(sql)
-        dados = query_job.result()
+        dados = bigquery_client.execute(
+            query,
+            cache_ttl=bigquery_client.TTL_DIMENSAO,
+            stale_ttl=bigquery_client.STALE_DIMENSAO,
+            timeout=bigquery_client.TIMEOUT_INTERATIVO,
+        )
         
         resultados = []
         for linha in dados:
@@ -364,6 +373,35 @@ def buscar_produtos_api(request):
         # Retorna lista vazia em caso de erro para não quebrar o front
         return JsonResponse([], safe=False)
 
+@require_POST
+def resolver_skus_api(request):
+    """
+    Resolve de uma vez uma lista colada de códigos (SEQPRODUTO ou CODACESSO),
+    em vez de uma busca por código no buscar_produtos_api.
+    Corpo JSON: {"codigos": ["123", "7891000100103", ...]}.
+    """
+    try:
+        codigos = json.loads(request.body or b'{}').get('codigos')
+    except (ValueError, AttributeError):
+        codigos = None
+    if not isinstance(codigos, list):
+        return JsonResponse({'status': 'erro', 'message': 'Envie {"codigos": [...]}.'}, status=400)
+
+    codigos = produto_service.limpar_codigos(codigos)
+    if len(codigos) > produto_service.LIMITE_LOTE:
+        return JsonResponse({
+            'status': 'erro',
+            'message': f'Envie no máximo {produto_service.LIMITE_LOTE} códigos por vez.',
+        }, status=400)
+
+    try:
+        encontrados, nao_encontrados = produto_service.resolver_codigos(codigos)
+    except Exception as e:
+        print(f"Erro API Resolver SKUs: {e}")
+        return JsonResponse({'status': 'erro', 'message': 'Busca de produtos indisponível no momento. Tente novamente.'}, status=503)
+
+    return JsonResponse({'encontrados': encontrados, 'nao_encontrados': nao_encontrados})
+
 @require_POST 
 def excluir_item_grade(request, pk):
     """
@@ -393,36 +431,12 @@ def get_lojas_ativas():
 # 2. Função para buscar Histórico de % (Query SQL Direta)
 def get_sugestao_distribuicao():
     """
-    Busca o histórico.
-    Protegido para não quebrar se a tabela/view não existir no banco.
+    Busca o histórico (participação do trimestre vigente, ou a média dos
+    últimos trimestres, ver sugestao_distribuicao).
+    Protegido para não quebrar se a tabela não existir no banco.
     """
-    sugestao = {}
-    
-    # Removemos o 'public.' para compatibilidade e adicionamos try/except robusto
-    sql = """
-        SELECT 
-            UPPER(TRIM(nomeassociado)) as nome, 
-            SUM(percentual_qtd) as perc
-        FROM gradepercatualassoc 
-        WHERE (ano, trimestre) IN (
-            SELECT ano, MAX(trimestre) 
-            FROM gradepercatualassoc 
-            WHERE ano = (SELECT MAX(ano) FROM gradepercatualassoc)
-            GROUP BY ano
-        )
-        GROUP BY nomeassociado
-    """
-    
     try:
-        with connection.cursor() as cursor:
-            cursor.execute(sql)
-            rows = cursor.fetchall()
-            
-            for row in rows:
-                nome = row[0]
-                perc = float(row[1]) if row[1] is not None else 0.0
-                sugestao[nome] = perc
-                
+        return sugestao_distribuicao()
     except Exception as e:
         # Aqui capturamos o erro "relation does not exist" silenciosamente
         # para permitir que a tela de distribuição abra mesmo sem histórico.
@@ -430,8 +444,6 @@ def get_sugestao_distribuicao():
         print(f"Erro detalhado: {e}")
         # Retorna vazio, assim o sistema assume 0% para todos sem travar
         return {}
-    
-    return sugestao
 
 # 3. View Principal
 def gerenciar_distribuicao(request, pk):
@@ -787,10 +799,13 @@ def exportar_grade_excel(request, pk):
     return response
 
 
+@gzip_page
 def api_dashboard_apuracao(request, pk):
     """
     API do Dashboard usando 'bigquery_client'.
     Retorna dados cruzando META (Django) x REALIZADO (BigQuery).
+    Com ?formato=colunar, dados_apuracao, dados_ofensores e dados_tabela vêm
+    como {coluna: [valores]} em vez de lista de dicionários.
     """
     if not bigquery_client:
         return JsonResponse({'status': 'erro', 'message': 'Serviço GCP BigQuery não disponível.'}, status=500)
@@ -803,11 +818,7 @@ def api_dashboard_apuracao(request, pk):
     dt_fim_evento = grade.evento.data_fim.strftime('%Y-%m-%d')
     
     # Mapeamento SKU -> Produto Pai
-    skus_objs = ItemGradeSKU.objects.filter(item_grade__grade=grade).select_related('item_grade')
-    skus_map = {str(s.codigo_produto): s.item_grade.descricao_resumida for s in skus_objs}
-    skus_list = list(skus_map.keys())
-    
-    grupos_ids = [g.grupo_id for g in grade.grupos.all()]
+    skus_map, skus_list, grupos_ids = snapshot_service.parametros(grade)
 
     if not skus_list:
         return JsonResponse({'status': 'erro', 'message': 'Nenhum SKU vinculado à grade.'})
@@ -815,163 +826,48 @@ def api_dashboard_apuracao(request, pk):
         return JsonResponse({'status': 'erro', 'message': 'Nenhum Grupo vinculado.'})
 
     try:
-        # --- PASSO 1: LISTA BRANCA DE CNPJS ---
-        grupos_sql = ", ".join(f"'{g}'" for g in grupos_ids)
-        query_cnpjs = f"""
-            SELECT DISTINCT CAST(cnpj_completo AS STRING) as cnpj
-            FROM `singular-ray-422121.gold.dim_fornecedor`
-            WHERE CAST(SEQREDE AS STRING) IN ({grupos_sql})
-        """
-        dados_cnpjs = bigquery_client.run_query(query_cnpjs)
-        
-        cnpjs_validos = []
-        if dados_cnpjs:
-            for row in dados_cnpjs:
-                val = row.get('cnpj') if isinstance(row, dict) else row[0]
-                if val: cnpjs_validos.append(val)
-
-        if not cnpjs_validos:
-            cnpjs_validos = ['00000000000000']
-
-        # Formatação Arrays SQL
-        skus_array_str = "[" + ", ".join(f"'{s}'" for s in skus_list) + "]"
-        cnpjs_array_str = "[" + ", ".join(f"'{c}'" for c in cnpjs_validos) + "]"
-
-        # --- PASSO 2: QUERY GERAL (GRÁFICOS TIMELINE) ---
-        sql_apuracao = f"""
-            SELECT 
-                data_emissao, 
-                NomeAssociado, 
-                SUM(CASE WHEN CAST(CNPJ_fornecedor AS STRING) IN UNNEST({cnpjs_array_str}) THEN QtdCompra ELSE 0 END) AS qtd_homologada,
-                SUM(CASE WHEN CAST(CNPJ_fornecedor AS STRING) NOT IN UNNEST({cnpjs_array_str}) THEN QtdCompra ELSE 0 END) AS qtd_pirata,
-                SUM(CASE WHEN data_emissao > '{dt_fim}' THEN QtdCompra ELSE 0 END) AS qtd_atrasada
-            FROM `singular-ray-422121.gold.obt_tb_compra_agg`
-            WHERE 
-                data_emissao BETWEEN '{dt_inicio}' AND '{dt_fim_evento}'
-                AND CAST(SeqProduto AS STRING) IN UNNEST({skus_array_str})
-            GROUP BY 1, 2
-            ORDER BY data_emissao
-        """
-        print("\n" + "="*50)
-        print(">>> SQL apuracao:")
-        print(sql_apuracao)
-        print("="*50 + "\n")
-
-        res_apuracao = bigquery_client.run_query(sql_apuracao)
-        df_apuracao = [dict(row) for row in res_apuracao] if res_apuracao else []
-
-        # --- PASSO 3: QUERY OFENSORES ---
-        # Adicionei tratamento extra para garantir nome
-        sql_ofensores = f"""
-            SELECT 
-                COALESCE(f.NOMERAZAO, f.FANTASIA, CONCAT('CNPJ: ', CAST(c.CNPJ_fornecedor AS STRING))) as fornecedor_nome,
-                SUM(c.QtdCompra) as volume_pirata,
-                SUM(c.ValorCompraBruta) as valor_desviado
-            FROM `singular-ray-422121.gold.obt_tb_compra_agg` c
-            LEFT JOIN `singular-ray-422121.gold.dim_fornecedor` f
-                ON CAST(c.CNPJ_fornecedor AS STRING) = CAST(f.cnpj_completo AS STRING)
-            WHERE 
-                c.data_emissao BETWEEN '{dt_inicio}' AND '{dt_fim_evento}'
-                AND CAST(c.SeqProduto AS STRING) IN UNNEST({skus_array_str})
-                AND CAST(c.CNPJ_fornecedor AS STRING) NOT IN UNNEST({cnpjs_array_str})
-            GROUP BY 1
-            ORDER BY 2 DESC
-            LIMIT 10
-        """
-        print("\n" + "="*50)
-        print(">>> SQL OFENSORES:")
-        print(sql_ofensores)
-        print("="*50 + "\n")
-
-        res_ofensores = bigquery_client.run_query(sql_ofensores)
-        df_ofensores = [dict(row) for row in res_ofensores] if res_ofensores else []
-
-        # --- PASSO 4: TABELA DETALHADA (META vs REALIZADO) ---
-        
-        # A. Busca Metas do Django (O que deveria ter sido comprado)
-        # Chave do dict será tupla: (NomeAssociado, DescricaoProduto)
-        distribuicoes = ItemGradeDistribuicao.objects.filter(item_grade__grade=grade).select_related('item_grade')
-        tabela_final = {}
-        
-        for dist in distribuicoes:
-            chave = (dist.associado_nome.upper().strip(), dist.item_grade.descricao_resumida)
-            tabela_final[chave] = {
-                'associado': dist.associado_nome,
-                'produto': dist.item_grade.descricao_resumida,
-                'meta': float(dist.volume_fisico), # A META QUE FALTAVA
-                'aderente': 0.0,
-                'fora_prazo': 0.0,
-                'outros': 0.0
-            }
-
-        # B. Busca Realizado do BigQuery
-        sql_detalhe = f"""
-            SELECT 
-                NomeAssociado,
-                CAST(SeqProduto AS STRING) as sku,
-                SUM(CASE 
-                    WHEN CAST(CNPJ_fornecedor AS STRING) IN UNNEST({cnpjs_array_str}) AND data_emissao <= '{dt_fim}'
-                    THEN QtdCompra ELSE 0 END
-                ) AS qtd_aderente,
-                SUM(CASE 
-                    WHEN CAST(CNPJ_fornecedor AS STRING) IN UNNEST({cnpjs_array_str}) AND data_emissao > '{dt_fim}'
-                    THEN QtdCompra ELSE 0 END
-                ) AS qtd_fora_prazo,
-                SUM(CASE 
-                    WHEN CAST(CNPJ_fornecedor AS STRING) NOT IN UNNEST({cnpjs_array_str})
-                    THEN QtdCompra ELSE 0 END
-                ) AS qtd_outros
-            FROM `singular-ray-422121.gold.obt_tb_compra_agg`
-            WHERE 
-                data_emissao BETWEEN '{dt_inicio}' AND '{dt_fim_evento}'
-                AND CAST(SeqProduto AS STRING) IN UNNEST({skus_array_str})
-            GROUP BY 1, 2
-        """
-        res_detalhe = bigquery_client.run_query(sql_detalhe)
-        
-        # C. Cruza os dados
-        if res_detalhe:
-            for row in res_detalhe:
-                assoc = row['NomeAssociado'].upper().strip()
-                sku = row['sku']
-                produto_pai = skus_map.get(sku, f"SKU {sku} (Sem vínculo)")
-                
-                chave = (assoc, produto_pai)
-                
-                # Se a loja comprou algo que não tinha meta, cria a linha na hora
-                if chave not in tabela_final:
-                    tabela_final[chave] = {
-                        'associado': row['NomeAssociado'], # Usa o nome que veio do BQ
-                        'produto': produto_pai,
-                        'meta': 0.0,
-                        'aderente': 0.0,
-                        'fora_prazo': 0.0,
-                        'outros': 0.0
-                    }
-                
-                tabela_final[chave]['aderente'] += float(row['qtd_aderente'] or 0)
-                tabela_final[chave]['fora_prazo'] += float(row['qtd_fora_prazo'] or 0)
-                tabela_final[chave]['outros'] += float(row['qtd_outros'] or 0)
-
-        # Transforma em lista ordenada
-        lista_tabela = list(tabela_final.values())
-        lista_tabela.sort(key=lambda x: (x['associado'], x['produto']))
-
-        # --- PASSO 5: TOTAIS POR LOJA (PARA O GRÁFICO DE BARRAS) ---
-        metas_raw = ItemGradeDistribuicao.objects.filter(item_grade__grade=grade)\
-            .values('associado_nome')\
-            .annotate(meta_total=Sum('volume_fisico'))
-        metas_dict = {m['associado_nome'].upper().strip(): float(m['meta_total']) for m in metas_raw}
-
-        return JsonResponse({
+        # --- PASSOS 1 a 4: REALIZADO (BIGQUERY) ---
+        # Uma única leitura da obt_tb_compra_agg, já cruzada com a lista branca
+        # de CNPJs dos grupos. Linha do tempo, ofensores e realizado por
+        # associado x SKU saem da mesma consulta (ver apuracao_service).
+        # O resultado fica num snapshot no Postgres: grades encerradas não
+        # consultam mais o BigQuery e as demais só buscam os dias novos.
+        saidas, snapshot_info = snapshot_service.carregar(
+            grade, grupos_ids, skus_list,
+            forcar=request.GET.get('atualizar') == '1',
+            max_bytes=settings.BIGQUERY_MAX_BYTES_INTERATIVO,
+            timeout=bigquery_client.TIMEOUT_INTERATIVO,
+        )
+        df_apuracao = saidas['apuracao']
+        df_ofensores = saidas['ofensores']
+        res_detalhe = saidas['detalhe']
+
+        # --- PASSO 5: META (DJANGO) x REALIZADO (BIGQUERY) ---
+        # Uma leitura da distribuição; a tabela detalhada e os totais por loja
+        # (gráfico de barras) saem do mesmo cruzamento em pandas.
+        metas = ItemGradeDistribuicao.objects.filter(item_grade__grade=grade)\
+            .values_list('associado_nome', 'item_grade__descricao_resumida', 'volume_fisico')
+        lista_tabela, metas_dict = apuracao_service.cruzar_metas(list(metas), res_detalhe, skus_map)
+
+        if quer_colunar(request):
+            df_apuracao = colunar(df_apuracao, apuracao_service.COLUNAS_APURACAO)
+            df_ofensores = colunar(df_ofensores, apuracao_service.COLUNAS_OFENSORES)
+            lista_tabela = colunar(lista_tabela, apuracao_service.COLUNAS_TABELA)
+
+        return JsonResponseRapida({
             'status': 'ok',
             'dados_apuracao': df_apuracao,
             'dados_ofensores': df_ofensores,
             'dados_tabela': lista_tabela,
             'metas_por_loja': metas_dict,
-            'periodo': {'inicio': dt_inicio, 'fim_grade': dt_fim, 'fim_evento': dt_fim_evento}
-        }, safe=False)
-
+            'periodo': {'inicio': dt_inicio, 'fim_grade': dt_fim, 'fim_evento': dt_fim_evento},
+            'snapshot': snapshot_info,
+        })
+
+    except bigquery_client.QueryBudgetExceeded as e:
+        return JsonResponse({'status': 'erro', 'message': str(e)}, status=400)
+    except (bigquery_client.CircuitOpenError, TimeoutError) as e:
+        return JsonResponse({'status': 'erro', 'message': str(e)}, status=503)
     except Exception as e:
         print(f"Erro Dash: {e}")
         return JsonResponse({'status': 'erro', 'message': str(e)}, status=500)
@@ -1080,19 +976,51 @@ def editar_cabecalho_grade(request, grade_id):
 
 
 # Adicione a função de View
+@require_POST
 def atualizar_distribuicao_view(request):
     """
-    Rota para forçar a atualização da tabela de distribuição via navegador.
+    Rota para forçar a atualização da tabela de distribuição (botão
+    'Atualizar Distribuição' da lista de grades; só POST, com CSRF).
+    A rotina roda em segundo plano: a resposta (202) traz a execução e a URL
+    para acompanhar o andamento. Se já houver uma em andamento, devolve essa.
     """
     if not request.user.is_superuser: # Segurança básica
         return JsonResponse({'status': 'erro', 'msg': 'Apenas admin pode fazer isso.'}, status=403)
 
-    sucesso, mensagem = executar_atualizacao_distribuicao()
-    
-    if sucesso:
-        return JsonResponse({'status': 'ok', 'msg': mensagem})
-    else:
-        return JsonResponse({'status': 'erro', 'msg': mensagem}, status=500)
+    job, criada = atualizacao_service.iniciar(request.user)
+    return JsonResponse({
+        'status': 'ok',
+        'msg': 'Atualização iniciada.' if criada else 'Já existe uma atualização em andamento.',
+        'job': atualizacao_service.como_dict(job),
+        'status_url': reverse('apuracao_grade:api-atualizacao-distribuicao-status', args=[job.pk]),
+        'cancelar_url': reverse('apuracao_grade:api-atualizacao-distribuicao-cancelar', args=[job.pk]),
+    }, status=202 if criada else 200)
+
+
+def status_atualizacao_distribuicao(request, pk):
+    """
+    Andamento de uma execução da atualização: status, etapa atual, percentual
+    e duração de cada etapa concluída.
+    """
+    if not request.user.is_superuser:
+        return JsonResponse({'status': 'erro', 'msg': 'Apenas admin pode fazer isso.'}, status=403)
+    job = get_object_or_404(AtualizacaoDistribuicao, pk=pk)
+    return JsonResponse({'status': 'ok', 'job': atualizacao_service.como_dict(job)})
+
+
+@require_POST
+def cancelar_atualizacao_distribuicao(request, pk):
+    """
+    Pede o cancelamento de uma execução em andamento. A rotina para ao
+    começar a próxima etapa.
+    """
+    if not request.user.is_superuser:
+        return JsonResponse({'status': 'erro', 'msg': 'Apenas admin pode fazer isso.'}, status=403)
+    job = get_object_or_404(AtualizacaoDistribuicao, pk=pk)
+    if not atualizacao_service.cancelar(job):
+        return JsonResponse({'status': 'erro', 'msg': 'A atualização já terminou.'}, status=409)
+    job.refresh_from_db()
+    return JsonResponse({'status': 'ok', 'msg': 'Cancelamento solicitado.', 'job': atualizacao_service.como_dict(job)})
 
 def diagnostico_distribuicao(request):
     """
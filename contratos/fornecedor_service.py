@@ -0,0 +1,237 @@
+"""
+Espelho local de gold.dim_fornecedor e índice em memória por processo.
+
+sincronizar() copia a dimensão do BigQuery para o Postgres (FornecedorEspelho).
+indice() carrega o espelho uma vez por processo e o mantém em memória, com
+três acessos diretos:
+  - SEQREDE -> CNPJs do grupo (lista branca da apuração da grade);
+  - CNPJ -> nome do fornecedor (ranking de ofensores);
+  - texto normalizado (rede, razão social, SEQREDE e dígitos do CNPJ) para a
+    busca do autocomplete, sem diferenciar acentos e com busca aproximada
+    (palavras fora de ordem ou com erro de digitação) quando a exata não
+    basta.
+
+A cada FORNECEDOR_INDICE_VERIFICAR segundos o índice confere no Postgres se
+houve nova sincronização e, se houve, é recarregado. Enquanto o espelho estiver
+vazio (nunca sincronizado), indice() devolve None e quem chama consulta o
+BigQuery como antes.
+"""
+import re
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from gcp_services.services import bigquery_client
+from gcp_services.services.query_templates import DIM_FORNECEDOR
+from utils.search_index import CachePrefixos, IndiceDoProcesso, IndiceNgramas, dobrar, normalizar
+from .models import FornecedorEspelho
+
+# Intervalo entre verificações de nova sincronização no Postgres (segundos).
+VERIFICAR = getattr(settings, 'FORNECEDOR_INDICE_VERIFICAR', 60)
+
+_TAMANHO_LOTE = 2000
+_NAO_DIGITO_RE = re.compile(r'\D')
+
+SQL_DIMENSAO = f"""
+    SELECT
+        SEQREDE,
+        NOME_REDE,
+        CAST(cnpj_completo AS STRING) AS cnpj_completo,
+        NOMERAZAO,
+        FANTASIA
+    FROM {DIM_FORNECEDOR}
+"""
+
+
+def somente_digitos(texto: str) -> str:
+    return _NAO_DIGITO_RE.sub('', texto or '')
+
+
+def sincronizar(timeout: float | None = None) -> int:
+    """
+    Substitui o conteúdo do espelho pela dimensão atual do BigQuery.
+    A troca é feita numa transação: em caso de erro, o espelho anterior fica.
+
+    Returns:
+        A quantidade de linhas gravadas.
+    """
+    agora = timezone.now()
+    novos = [
+        FornecedorEspelho(
+            seqrede=row.SEQREDE,
+            nome_rede=row.NOME_REDE,
+            cnpj_completo=row.cnpj_completo or '',
+            nomerazao=row.NOMERAZAO,
+            fantasia=row.FANTASIA,
+            sincronizado_em=agora,
+        )
+        for row in bigquery_client.stream_query(SQL_DIMENSAO, timeout=timeout or bigquery_client.TIMEOUT_PADRAO)
+    ]
+    with transaction.atomic():
+        FornecedorEspelho.objects.all().delete()
+        FornecedorEspelho.objects.bulk_create(novos, batch_size=_TAMANHO_LOTE)
+    invalidar()
+    return len(novos)
+
+
+class IndiceFornecedores:
+    """
+    Índice em memória do espelho de fornecedores. Imutável depois de criado:
+    uma recarga cria outro objeto e troca a referência.
+    """
+
+    def __init__(self, linhas):
+        self.total = 0
+        self._cnpjs_por_rede = defaultdict(set)
+        self._nome_por_cnpj = {}
+        # (seqrede, nome_rede, razao, texto de busca, dígitos do CNPJ)
+        self._busca = []
+        # Rede e razão social dobradas, para a relevância.
+        self._nomes = []
+
+        for seqrede, nome_rede, cnpj, razao, fantasia in linhas:
+            self.total += 1
+            if seqrede is not None:
+                self._cnpjs_por_rede[seqrede].add(cnpj)
+            # Mesmo critério do SQL: MAX(COALESCE(NOMERAZAO, FANTASIA)) por CNPJ
+            nome = razao or fantasia
+            if nome is not None and nome > self._nome_por_cnpj.get(cnpj, ''):
+                self._nome_por_cnpj[cnpj] = nome
+            nomes = (dobrar(nome_rede or ''), dobrar(razao or ''))
+            texto = f"{nomes[0]}\x00{nomes[1]}\x00{'' if seqrede is None else seqrede}"
+            self._busca.append((seqrede, nome_rede, razao, texto, somente_digitos(cnpj)))
+            self._nomes.append(nomes)
+
+        self._prefixos = CachePrefixos()
+        self._ngramas = IndiceNgramas(
+            f"{texto.replace(chr(0), ' ')} {cnpj}" for _, _, _, texto, cnpj in self._busca
+        )
+
+    @classmethod
+    def carregar(cls, versao=None) -> 'IndiceFornecedores':
+        linhas = FornecedorEspelho.objects.order_by('seqrede', 'id').values_list(
+            'seqrede', 'nome_rede', 'cnpj_completo', 'nomerazao', 'fantasia'
+        )
+        return cls(linhas.iterator(chunk_size=_TAMANHO_LOTE))
+
+    def cnpjs_dos_grupos(self, grupos: list[int]) -> list[str]:
+        """CNPJs (cnpj_completo) dos fornecedores das redes informadas."""
+        cnpjs = set()
+        for grupo in grupos:
+            cnpjs.update(self._cnpjs_por_rede.get(grupo, ()))
+        return sorted(cnpjs)
+
+    def nome(self, cnpj: str | None) -> str | None:
+        return self._nome_por_cnpj.get(cnpj) if cnpj else None
+
+    def buscar(self, termo: str, limite: int = 50) -> list[tuple]:
+        """
+        Redes cuja rede, razão social ou SEQREDE contenham 'termo', ou cujo
+        CNPJ contenha os dígitos de 'termo', sem diferenciar acentos. Uma
+        linha por SEQREDE, ordenadas por relevância: SEQREDE ou CNPJ exato,
+        nome que começa com o termo, alguma palavra do nome que começa com a
+        primeira palavra do termo, o restante da busca exata; depois, da busca
+        aproximada, todas as palavras do termo fora de ordem e, por fim,
+        palavras com erro de digitação (menor distância primeiro).
+
+        Como em IndiceProdutos.buscar, o conjunto da busca exata fica em
+        cache por termo e serve aos termos que o estendem.
+
+        Returns:
+            Lista de tuplas (seqrede, nome_rede, razao), no máximo 'limite'.
+        """
+        termo = normalizar(termo)
+        tokens = termo.split()
+        if not tokens:
+            return []
+        digitos = termo.replace('.', '').replace('/', '').replace('-', '')
+        inicio_palavra = ' ' + tokens[0]
+
+        posicoes = self._prefixos.obter(termo)
+        if posicoes is None:
+            candidatos = self._ngramas.candidatos(tokens)
+            if candidatos is not None and digitos != termo:
+                por_cnpj = self._ngramas.candidatos([digitos])
+                candidatos = np.union1d(candidatos, por_cnpj) if por_cnpj is not None else None
+            posicoes = range(len(self._busca)) if candidatos is None else candidatos.tolist()
+
+        exatos = [
+            i for i in posicoes
+            if termo in self._busca[i][3] or (digitos and digitos in self._busca[i][4])
+        ]
+        # Sem dígitos no termo, a regra do CNPJ não se aplica a ele, mas pode
+        # valer para um termo que o estenda: o resultado não serve de prefixo.
+        if digitos:
+            self._prefixos.guardar(termo, exatos)
+
+        # (faixa, distância, posição) de cada linha encontrada.
+        encontrados = []
+        for i in exatos:
+            seqrede, _, _, _, cnpj = self._busca[i]
+            rede, razao = self._nomes[i]
+            if termo == str(seqrede) or (digitos and digitos == cnpj):
+                faixa = 0
+            elif rede.startswith(termo) or razao.startswith(termo):
+                faixa = 1
+            elif (rede.startswith(tokens[0]) or razao.startswith(tokens[0])
+                  or inicio_palavra in rede or inicio_palavra in razao):
+                faixa = 2
+            else:
+                faixa = 3
+            encontrados.append((faixa, 0, i))
+
+        docs, distancias = self._ngramas.aproximados(tokens)
+        exatos = set(exatos)
+        for i, d in zip(docs.tolist(), distancias.tolist()):
+            if i not in exatos:
+                encontrados.append((4 if d == 0 else 5, d, i))
+
+        vistos = set()
+        resultado = []
+        for _, _, i in sorted(encontrados):
+            seqrede, nome_rede, razao, _, _ = self._busca[i]
+            if seqrede in vistos:
+                continue
+            vistos.add(seqrede)
+            resultado.append((seqrede, nome_rede, razao))
+            if len(resultado) >= limite:
+                break
+        return resultado
+
+
+def _versao():
+    return FornecedorEspelho.objects.aggregate(v=Max('sincronizado_em'))['v']
+
+
+_indice = IndiceDoProcesso('fornecedores', _versao, IndiceFornecedores.carregar, VERIFICAR)
+
+
+def aquecer():
+    """Constrói o índice em segundo plano (chamado na subida do servidor)."""
+    _indice.aquecer()
+
+
+def invalidar():
+    """Força a conferência do espelho na próxima chamada de indice()."""
+    _indice.invalidar()
+
+
+def versao():
+    """
+    Versão (data da sincronização) do índice servido por indice(); None se
+    não houver índice. Identifica o resultado de uma busca para o ETag.
+    """
+    return _indice.versao if indice() is not None else None
+
+
+def indice() -> IndiceFornecedores | None:
+    """
+    Índice do processo, recarregado quando há nova sincronização.
+    None se o espelho estiver vazio ou indisponível.
+    """
+    atual = _indice.obter()
+    return atual if atual is not None and atual.total else None
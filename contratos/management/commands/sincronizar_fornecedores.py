@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from contratos import fornecedor_service
+
+
+class Command(BaseCommand):
+    help = (
+        "Copia gold.dim_fornecedor do BigQuery para o espelho local (FornecedorEspelho), "
+        "usado pela busca de fornecedores e pela lista branca da apuração. "
+        "Agendar no cron (a dimensão muda no máximo 1x/dia)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--timeout', type=float, default=None,
+                            help='Tempo máximo de espera pela consulta ao BigQuery (segundos).')
+
+    def handle(self, *args, **options):
+        inicio = time.monotonic()
+        try:
+            total = fornecedor_service.sincronizar(timeout=options['timeout'])
+        except Exception as e:
+            raise CommandError(f"Erro ao sincronizar fornecedores: {e}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} fornecedores sincronizados em {time.monotonic() - inicio:.1f}s."
+        ))
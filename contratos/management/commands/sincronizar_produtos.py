@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from contratos import produto_service
+
+
+class Command(BaseCommand):
+    help = (
+        "Copia landing_saerj.DIM_PRODUTOS do BigQuery para o espelho local (ProdutoEspelho), "
+        "usado pelo autocomplete de produtos. "
+        "Agendar no cron (1x/dia, fora do expediente)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--timeout', type=float, default=None,
+                            help='Tempo máximo de espera pela consulta ao BigQuery (segundos).')
+
+    def handle(self, *args, **options):
+        inicio = time.monotonic()
+        try:
+            total = produto_service.sincronizar(timeout=options['timeout'])
+        except Exception as e:
+            raise CommandError(f"Erro ao sincronizar produtos: {e}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} produtos sincronizados em {time.monotonic() - inicio:.1f}s."
+        ))
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contratos', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FornecedorEspelho',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seqrede', models.IntegerField(blank=True, db_index=True, null=True)),
+                ('nome_rede', models.TextField(blank=True, null=True)),
+                ('cnpj_completo', models.TextField(db_index=True)),
+                ('nomerazao', models.TextField(blank=True, null=True)),
+                ('fantasia', models.TextField(blank=True, null=True)),
+                ('sincronizado_em', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Fornecedor (Espelho local)',
+                'verbose_name_plural': 'Fornecedores (Espelho local)',
+            },
+        ),
+    ]
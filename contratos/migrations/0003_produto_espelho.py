@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contratos', '0002_fornecedor_espelho'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProdutoEspelho',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seqproduto', models.BigIntegerField(db_index=True)),
+                ('desccompleta', models.TextField()),
+                ('codacesso', models.TextField(blank=True, null=True)),
+                ('marca', models.TextField(blank=True, null=True)),
+                ('sincronizado_em', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Produto (Espelho local)',
+                'verbose_name_plural': 'Produtos (Espelho local)',
+            },
+        ),
+    ]
@@ -32,3 +32,47 @@ class DimFornecedor(models.Model):
     def __str__(self):
         return self.nomerazao
 
+
+
+class FornecedorEspelho(models.Model):
+    """
+    Cópia local de gold.dim_fornecedor (BigQuery), só com as colunas usadas
+    nas buscas de fornecedores e na lista branca de CNPJs da apuração.
+    Atualizada pelo comando 'sincronizar_fornecedores' (ver fornecedor_service).
+    Textos sem limite de tamanho: a cópia grava os valores do BigQuery como
+    vêm, e um valor maior que a coluna abortaria a sincronização inteira.
+    """
+    seqrede = models.IntegerField(null=True, blank=True, db_index=True)
+    nome_rede = models.TextField(null=True, blank=True)
+    cnpj_completo = models.TextField(db_index=True)
+    nomerazao = models.TextField(null=True, blank=True)
+    fantasia = models.TextField(null=True, blank=True)
+    sincronizado_em = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = 'Fornecedor (Espelho local)'
+        verbose_name_plural = 'Fornecedores (Espelho local)'
+
+    def __str__(self):
+        return self.nomerazao or self.cnpj_completo
+
+
+class ProdutoEspelho(models.Model):
+    """
+    Cópia local de landing_saerj.DIM_PRODUTOS (BigQuery), usada pelo
+    autocomplete de produtos. Uma linha por (SEQPRODUTO, CODACESSO).
+    Atualizada pelo comando 'sincronizar_produtos' (ver produto_service).
+    Textos sem limite de tamanho, pelo mesmo motivo de FornecedorEspelho.
+    """
+    seqproduto = models.BigIntegerField(db_index=True)
+    desccompleta = models.TextField()
+    codacesso = models.TextField(null=True, blank=True)
+    marca = models.TextField(null=True, blank=True)
+    sincronizado_em = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = 'Produto (Espelho local)'
+        verbose_name_plural = 'Produtos (Espelho local)'
+
+    def __str__(self):
+        return f"{self.seqproduto} - {self.desccompleta}"
@@ -0,0 +1,328 @@
+"""
+Espelho local de landing_saerj.DIM_PRODUTOS e busca de produtos em memória.
+
+sincronizar() copia a dimensão do BigQuery para o Postgres (ProdutoEspelho).
+indice() monta, uma vez por processo, um índice de n-gramas sobre descrição,
+marca, SEQPRODUTO e CODACESSO (utils.search_index) e o recarrega quando há
+nova sincronização. Enquanto o espelho estiver vazio, indice() devolve None e
+o autocomplete consulta o BigQuery como antes.
+
+A regra de busca é a do SQL do buscar_produtos_api (as palavras do termo
+aparecem, nessa ordem, na descrição ou na marca, ou o termo inteiro está
+contido no SEQPRODUTO ou em um CODACESSO), mas sem diferenciar acentos
+('ACUCAR' acha 'AÇÚCAR'). Se ela devolver menos que o limite, a lista é
+completada com a busca aproximada do índice: palavras fora de ordem e, por
+último, palavras com erro de digitação ('NESLTE' acha 'NESTLÉ').
+"""
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from gcp_services.services import bigquery_client
+from gcp_services.services.query_templates import DIM_PRODUTOS, Query, Typed
+from utils.search_index import CachePrefixos, IndiceDoProcesso, IndiceNgramas, dobrar, normalizar
+from .models import ProdutoEspelho
+
+# Intervalo entre verificações de nova sincronização no Postgres (segundos).
+VERIFICAR = getattr(settings, 'PRODUTO_INDICE_VERIFICAR', 60)
+
+# Quantidade máxima de produtos devolvidos pela busca.
+LIMITE_BUSCA = 300
+
+# Quantidade máxima de códigos numa resolução em lote (lista colada).
+LIMITE_LOTE = 500
+
+_TAMANHO_LOTE = 5000
+
+SQL_DIMENSAO = f"""
+    SELECT DISTINCT
+        CAST(SEQPRODUTO AS INT64) AS SEQPRODUTO,
+        DESCCOMPLETA,
+        CAST(CODACESSO AS STRING) AS CODACESSO,
+        MARCA
+    FROM {DIM_PRODUTOS}
+"""
+
+# Resolução em lote: produtos cujo SEQPRODUTO ou CODACESSO está na lista.
+SQL_RESOLVER = f"""
+    SELECT DISTINCT
+        CAST(SEQPRODUTO AS STRING) AS seqproduto,
+        CAST(CODACESSO AS STRING) AS codacesso,
+        CAST(SEQPRODUTO AS INT64) AS id,
+        DESCCOMPLETA AS text
+    FROM {DIM_PRODUTOS}
+    WHERE CAST(SEQPRODUTO AS STRING) IN UNNEST(@codigos)
+       OR CAST(CODACESSO AS STRING) IN UNNEST(@codigos)
+"""
+
+
+def sincronizar(timeout: float | None = None) -> int:
+    """
+    Substitui o conteúdo do espelho pela dimensão atual do BigQuery.
+    A troca é feita numa transação: em caso de erro, o espelho anterior fica.
+
+    Returns:
+        A quantidade de linhas gravadas.
+    """
+    agora = timezone.now()
+    novos = [
+        ProdutoEspelho(
+            seqproduto=row.SEQPRODUTO,
+            desccompleta=row.DESCCOMPLETA or '',
+            codacesso=row.CODACESSO,
+            marca=row.MARCA,
+            sincronizado_em=agora,
+        )
+        for row in bigquery_client.stream_query(SQL_DIMENSAO, timeout=timeout or bigquery_client.TIMEOUT_PADRAO)
+        if row.SEQPRODUTO is not None
+    ]
+    with transaction.atomic():
+        ProdutoEspelho.objects.all().delete()
+        ProdutoEspelho.objects.bulk_create(novos, batch_size=_TAMANHO_LOTE)
+    invalidar()
+    return len(novos)
+
+
+def _em_ordem(texto: str, tokens: list[str]) -> bool:
+    # Equivale a texto LIKE '%tok1%tok2%...%'.
+    pos = 0
+    for token in tokens:
+        pos = texto.find(token, pos)
+        if pos < 0:
+            return False
+        pos += len(token)
+    return True
+
+
+class IndiceProdutos:
+    """
+    Produtos distintos por (SEQPRODUTO, DESCCOMPLETA), como o SELECT DISTINCT
+    da busca original, com os códigos de acesso e marcas de cada um.
+
+    Os produtos ficam em ordem alfabética de descrição (sem acentos): como os
+    candidatos do índice de n-gramas vêm em ordem de posição, já saem
+    ordenados pelo texto.
+    """
+
+    def __init__(self, linhas):
+        produtos = {}
+        for seq, desc, codacesso, marca in linhas:
+            codigos, marcas = produtos.setdefault((seq, desc), (set(), set()))
+            if codacesso:
+                codigos.add(codacesso)
+            if marca:
+                marcas.add(dobrar(marca))
+
+        self.total = len(produtos)
+        self._ids = []
+        self._textos = []
+        self._descricoes = []
+        self._marcas = []
+        self._codigos = []
+        # Código (SEQPRODUTO ou CODACESSO) -> posições, para a resolução em lote.
+        self._por_codigo = {}
+        ordenados = sorted(((dobrar(desc), desc, seq), codigos, marcas) for (seq, desc), (codigos, marcas) in produtos.items())
+        for (dobrada, desc, seq), codigos, marcas in ordenados:
+            self._ids.append(seq)
+            self._textos.append(desc)
+            self._descricoes.append(dobrada)
+            self._marcas.append(tuple(marcas))
+            self._codigos.append((str(seq),) + tuple(codigos))
+            for codigo in self._codigos[-1]:
+                self._por_codigo.setdefault(codigo, []).append(len(self._ids) - 1)
+
+        self._prefixos = CachePrefixos()
+        self._ngramas = IndiceNgramas(
+            f"{self._descricoes[i]} {' '.join(self._marcas[i])} {' '.join(self._codigos[i])}"
+            for i in range(self.total)
+        )
+
+    @classmethod
+    def carregar(cls, versao=None) -> 'IndiceProdutos':
+        linhas = ProdutoEspelho.objects.values_list('seqproduto', 'desccompleta', 'codacesso', 'marca')
+        return cls(linhas.iterator(chunk_size=_TAMANHO_LOTE))
+
+    def buscar(self, termo: str, limite: int = LIMITE_BUSCA) -> list[tuple[int, str]]:
+        """
+        Produtos que atendem ao termo, ordenados por relevância e depois pela
+        descrição. Relevância, da maior para a menor: código exato, descrição
+        que começa com o termo, alguma palavra da descrição que começa com a
+        primeira palavra do termo, o restante da busca exata; depois, da
+        busca aproximada, todas as palavras do termo fora de ordem e, por
+        fim, palavras com erro de digitação (menor distância primeiro).
+
+        O conjunto completo da busca exata fica em cache por termo: um termo
+        que estende outro já buscado ('NESTL' -> 'NESTLE') só confere os
+        produtos achados pelo prefixo.
+
+        Se nenhuma palavra do termo tiver 2+ caracteres (sem n-gramas), a
+        varredura para nos primeiros 'limite' produtos em ordem alfabética,
+        sem busca aproximada nem cache.
+
+        Returns:
+            Lista de tuplas (seqproduto, descricao), no máximo 'limite'.
+        """
+        termo = normalizar(termo)
+        tokens = termo.split()
+        if not tokens:
+            return []
+        varredura = False
+        posicoes = self._prefixos.obter(termo)
+        if posicoes is None:
+            candidatos = self._ngramas.candidatos(tokens)
+            varredura = candidatos is None
+            posicoes = range(self.total) if varredura else candidatos.tolist()
+
+        descricoes, marcas, codigos = self._descricoes, self._marcas, self._codigos
+        busca_codigo = ' ' not in termo
+        # Uma palavra só (o caso mais comum): 'in' direto, sem _em_ordem.
+        confere = (lambda texto: termo in texto) if len(tokens) == 1 else (lambda texto: _em_ordem(texto, tokens))
+        exatos = []
+        for i in posicoes:
+            if (
+                confere(descricoes[i])
+                or any(confere(marca) for marca in marcas[i])
+                or (busca_codigo and any(termo in codigo for codigo in codigos[i]))
+            ):
+                exatos.append(i)
+                if varredura and len(exatos) >= limite:
+                    break
+        if not varredura:
+            self._prefixos.guardar(termo, exatos)
+
+        inicio_palavra = ' ' + tokens[0]
+        faixas = ([], [], [], [])
+        for i in exatos:
+            descricao = descricoes[i]
+            if busca_codigo and termo in codigos[i]:
+                faixas[0].append(i)
+            elif descricao.startswith(termo):
+                faixas[1].append(i)
+            elif descricao.startswith(tokens[0]) or inicio_palavra in descricao:
+                faixas[2].append(i)
+            else:
+                faixas[3].append(i)
+
+        posicoes = []
+        for faixa in faixas:
+            posicoes.extend(faixa[:limite - len(posicoes)])
+
+        if not varredura and len(posicoes) < limite:
+            docs, distancias = self._ngramas.aproximados(tokens)
+            if len(docs):
+                # Fora os que já vieram da busca exata; empate pela descrição
+                # (a posição já é a ordem alfabética).
+                novos = ~np.isin(docs, posicoes)
+                docs, distancias = docs[novos], distancias[novos]
+                ordem = np.lexsort((docs, distancias))[:limite - len(posicoes)]
+                posicoes.extend(docs[ordem].tolist())
+
+        return [(self._ids[i], self._textos[i]) for i in posicoes]
+
+
+    def resolver(self, codigos: list[str]) -> dict[str, list[tuple[int, str]]]:
+        """
+        Produtos de cada código (SEQPRODUTO ou CODACESSO exato).
+
+        Returns:
+            Dicionário código -> lista de (seqproduto, descricao); códigos
+            não encontrados ficam de fora.
+        """
+        return {
+            codigo: [(self._ids[i], self._textos[i]) for i in self._por_codigo[codigo]]
+            for codigo in codigos
+            if codigo in self._por_codigo
+        }
+
+
+def limpar_codigos(codigos) -> list[str]:
+    """
+    Códigos de uma lista colada, como texto, sem espaços, vazios e
+    repetições (mantida a ordem).
+    """
+    vistos = {}
+    for codigo in codigos:
+        codigo = str(codigo).strip()
+        if codigo:
+            vistos.setdefault(codigo, None)
+    return list(vistos)
+
+
+def resolver_codigos(codigos: list[str], timeout: float | None = None) -> tuple[list[dict], list[str]]:
+    """
+    Resolve uma lista de códigos (SEQPRODUTO ou CODACESSO) de uma vez: pelo
+    índice em memória ou, com o espelho vazio, numa única consulta
+    parametrizada no BigQuery.
+
+    Args:
+        codigos (list[str]): Códigos já limpos (ver limpar_codigos).
+
+    Returns:
+        Uma tupla (encontrados, nao_encontrados). encontrados traz dicts
+        {'codigo', 'id', 'text'} na ordem dos códigos (um código pode achar
+        mais de um produto); nao_encontrados, os códigos sem produto.
+    """
+    atual = indice()
+    if atual is not None:
+        por_codigo = atual.resolver(codigos)
+    else:
+        query = Query(SQL_RESOLVER, {'codigos': Typed('STRING', codigos)})
+        linhas = bigquery_client.execute(
+            query,
+            cache_ttl=bigquery_client.TTL_DIMENSAO,
+            stale_ttl=bigquery_client.STALE_DIMENSAO,
+            timeout=timeout or bigquery_client.TIMEOUT_INTERATIVO,
+        )
+        por_codigo = {}
+        for linha in linhas:
+            produto = (int(linha['id']), linha['text'])
+            for codigo in {linha['seqproduto'], linha['codacesso']}:
+                achados = por_codigo.setdefault(codigo, [])
+                if produto not in achados:
+                    achados.append(produto)
+
+    encontrados = []
+    nao_encontrados = []
+    for codigo in codigos:
+        produtos = por_codigo.get(codigo)
+        if not produtos:
+            nao_encontrados.append(codigo)
+            continue
+        encontrados.extend({'codigo': codigo, 'id': seq, 'text': texto} for seq, texto in produtos)
+    return encontrados, nao_encontrados
+
+
+def _versao():
+    return ProdutoEspelho.objects.aggregate(v=Max('sincronizado_em'))['v']
+
+
+_indice = IndiceDoProcesso('produtos', _versao, IndiceProdutos.carregar, VERIFICAR)
+
+
+def aquecer():
+    """Constrói o índice em segundo plano (chamado na subida do servidor)."""
+    _indice.aquecer()
+
+
+def invalidar():
+    """Força a conferência do espelho na próxima chamada de indice()."""
+    _indice.invalidar()
+
+
+def versao():
+    """
+    Versão (data da sincronização) do índice servido por indice(); None se
+    não houver índice. Identifica o resultado de uma busca para o ETag.
+    """
+    return _indice.versao if indice() is not None else None
+
+
+def indice() -> IndiceProdutos | None:
+    """
+    Índice do processo, recarregado quando há nova sincronização.
+    None se o espelho estiver vazio ou indisponível.
+    """
+    atual = _indice.obter()
+    return atual if atual is not None and atual.total else None
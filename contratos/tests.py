@@ -1,3 +1,155 @@
-from django.test import TestCase
+import threading
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase
+
+from utils.search_index import IndiceDoProcesso
+
+from . import fornecedor_service, produto_service
+from .models import FornecedorEspelho, ProdutoEspelho
+
+
+def _linhas(*linhas):
+    """Substitui bigquery_client.stream_query pelas linhas informadas."""
+    return mock.patch(
+        'gcp_services.services.bigquery_client.stream_query',
+        return_value=[SimpleNamespace(**linha) for linha in linhas],
+    )
+
+
+class SincronizarFornecedoresTests(TestCase):
+
+    def test_valor_maior_que_o_usual_nao_aborta_a_sincronizacao(self):
+        cnpj_longo = '12.345.678/0001-90 (matriz e filiais)'
+        razao_longa = 'INDUSTRIA ' * 40
+        with _linhas(
+            dict(SEQREDE=10, NOME_REDE='REDE A', cnpj_completo=cnpj_longo, NOMERAZAO=razao_longa, FANTASIA=None),
+            dict(SEQREDE=11, NOME_REDE='REDE B', cnpj_completo='11222333000144', NOMERAZAO='B LTDA', FANTASIA='B'),
+        ):
+            self.assertEqual(fornecedor_service.sincronizar(), 2)
+
+        linha = FornecedorEspelho.objects.get(seqrede=10)
+        self.assertEqual(linha.cnpj_completo, cnpj_longo)
+        self.assertEqual(linha.nomerazao, razao_longa)
+        for linha in FornecedorEspelho.objects.all():
+            linha.full_clean()
+
+
+class SincronizarProdutosTests(TestCase):
+
+    def test_valor_maior_que_o_usual_nao_aborta_a_sincronizacao(self):
+        codigo_longo = '7891234567890' * 5
+        with _linhas(
+            dict(SEQPRODUTO=1, DESCCOMPLETA='ACUCAR REFINADO 1KG', CODACESSO=codigo_longo, MARCA='UNIAO'),
+            dict(SEQPRODUTO=2, DESCCOMPLETA='CAFE ' * 60, CODACESSO='789', MARCA=None),
+        ):
+            self.assertEqual(produto_service.sincronizar(), 2)
+
+        self.assertEqual(ProdutoEspelho.objects.get(seqproduto=1).codacesso, codigo_longo)
+        for linha in ProdutoEspelho.objects.all():
+            linha.full_clean()
+
+
+PRODUTOS = [
+    (1, 'BISCOITO NESTLÉ CLASSIC 140G', '7891000100001', 'NESTLÉ'),
+    (2, 'AÇÚCAR REFINADO UNIÃO 1KG', '7891910000197', 'UNIÃO'),
+    (3, 'AÇÚCAR CRISTAL 5KG', '7896001200017', 'CARAVELAS'),
+    (4, 'DOCE DE LEITE COM AÇÚCAR MASCAVO', '7890000000044', None),
+    (5, 'LEITE CONDENSADO MOÇA NESTLÉ 395G', '7891000100002', 'NESTLÉ'),
+    (6, 'CAFÉ PILÃO 500G', '7896089011', 'PILÃO'),
+    (7, 'REFINADO AÇÚCAR ORGÂNICO', None, None),
+]
+
+
+class IndiceProdutosTests(SimpleTestCase):
+
+    def setUp(self):
+        self.indice = produto_service.IndiceProdutos(PRODUTOS)
+
+    def ids(self, termo, **kwargs):
+        return [seq for seq, _ in self.indice.buscar(termo, **kwargs)]
+
+    def test_ignora_acentos(self):
+        self.assertEqual(self.ids('acucar'), [3, 2, 4, 7])
+
+    def test_relevancia(self):
+        # Código exato, descrição que começa com o termo, palavra que começa
+        # com o termo, o restante; por fim as palavras fora de ordem.
+        self.assertEqual(self.ids('7891910000197'), [2])
+        self.assertEqual(self.ids('acucar refinado'), [2, 7])
+        self.assertEqual(self.ids('leite'), [5, 4])
+
+    def test_tolera_erro_de_digitacao(self):
+        self.assertEqual(self.ids('neslte'), [1, 5])
+        self.assertIn(6, self.ids('cafe pilao'))
+        self.assertIn(6, self.ids('pilau'))
+
+    def test_cache_de_prefixo_igual_a_busca_fria(self):
+        for termo in ('acu', 'acuc', 'acucar', 'acucar ref', 'nes', 'nestle', 'nestle 3'):
+            self.indice.buscar(termo[:3])
+            com_cache = self.indice.buscar(termo)
+            frio = produto_service.IndiceProdutos(PRODUTOS).buscar(termo)
+            self.assertEqual(com_cache, frio, termo)
+
+    def test_limite(self):
+        self.assertEqual(len(self.indice.buscar('acucar', limite=2)), 2)
+
+
+FORNECEDORES = [
+    (10, 'REDE NESTLÉ', '60.409.075/0001-52', 'NESTLÉ BRASIL LTDA', 'NESTLÉ'),
+    (10, 'REDE NESTLÉ', '60.409.075/0002-33', 'NESTLÉ BRASIL LTDA', 'NESTLÉ'),
+    (20, 'UNIÃO', '33.111.222/0001-00', 'AÇÚCAR UNIÃO S.A.', None),
+    (30, 'CARAVELAS', '44.555.666/0001-11', 'USINA AÇÚCAR CARAVELAS', 'CARAVELAS'),
+    (40, 'PILÃO', '55.666.777/0001-22', 'CAFÉ PILÃO', None),
+]
+
+
+class IndiceFornecedoresTests(SimpleTestCase):
+
+    def setUp(self):
+        self.indice = fornecedor_service.IndiceFornecedores(FORNECEDORES)
+
+    def redes(self, termo):
+        return [seqrede for seqrede, _, _ in self.indice.buscar(termo)]
+
+    def test_ignora_acentos_e_agrupa_por_rede(self):
+        self.assertEqual(self.redes('acucar'), [20, 30])
+        self.assertEqual(self.redes('nestle'), [10])
+
+    def test_relevancia(self):
+        self.assertEqual(self.redes('60409075000233'), [10])
+        self.assertEqual(self.redes('40'), [40, 10])
+
+    def test_tolera_erro_de_digitacao(self):
+        self.assertEqual(self.redes('neslte'), [10])
+        self.assertEqual(self.redes('caravela'), [30])
+
+    def test_cache_de_prefixo_igual_a_busca_fria(self):
+        for termo in ('acu', 'acucar', 'acucar car', '60.4', '60.409.075/0001'):
+            self.indice.buscar(termo[:3])
+            frio = fornecedor_service.IndiceFornecedores(FORNECEDORES).buscar(termo)
+            self.assertEqual(self.indice.buscar(termo), frio, termo)
+
+    def test_cnpjs_e_nomes(self):
+        self.assertEqual(self.indice.cnpjs_dos_grupos([10]), ['60.409.075/0001-52', '60.409.075/0002-33'])
+        self.assertEqual(self.indice.nome('33.111.222/0001-00'), 'AÇÚCAR UNIÃO S.A.')
+
+
+class IndiceDoProcessoTests(SimpleTestCase):
+
+    def test_aquecer_constroi_em_segundo_plano(self):
+        construido = threading.Event()
+        liberar = threading.Event()
+
+        def construir(versao):
+            construido.set()
+            liberar.wait(5)
+            return ('indice', versao)
+
+        indice = IndiceDoProcesso('teste', lambda: 1, construir, verificar=60)
+        indice.aquecer()
+        self.assertTrue(construido.wait(5))
+        liberar.set()
+        # A busca que chega durante a construção espera por ela.
+        self.assertEqual(indice.obter(), ('indice', 1))
@@ -2,6 +2,9 @@ from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from gcp_services.services import bigquery_client
+from gcp_services.services.query_templates import (
+    Query, like, DIM_CONTRATO, DIM_FORNECEDOR, DIM_PRODUTO, DIM_PRODUTO_POR_CONTRATO,
+)
 from django.http import JsonResponse
 
 # Create your views here.
@@ -42,28 +45,40 @@ def buscar_contratos(request):
         per_page = 25  # Valor padrão se a conversão falhar
 
     # Query base para selecionar os contratos no BigQuery.
-    query = """SELECT nomesubcontrato, 
+    sql = f"""SELECT nomesubcontrato, 
                       nomecontrato,
                       cast(nrocontrato as int) as nrocontrato, 
                       cast(contrato as int) as contrato, 
                       cast(subcontrato as int) as subcontrato
-               FROM `singular-ray-422121`.gold.dim_contrato"""
+               FROM {DIM_CONTRATO}"""
 
     # Constrói as cláusulas WHERE dinamicamente com base nos filtros fornecidos.
+    # Os valores vão como parâmetros; só a estrutura do SQL varia.
     condicoes = []
+    params = {}
     if filtro_descsub:
-        condicoes.append(f"UPPER(nomesubcontrato) LIKE UPPER('%{filtro_descsub}%')")
+        condicoes.append("UPPER(nomesubcontrato) LIKE UPPER(@descsub)")
+        params['descsub'] = like(filtro_descsub)
     if filtro_desccontrato:
-        condicoes.append(f"UPPER(nomecontrato) LIKE UPPER('%{filtro_desccontrato}%')")
+        condicoes.append("UPPER(nomecontrato) LIKE UPPER(@desccontrato)")
+        params['desccontrato'] = like(filtro_desccontrato)
 
     if condicoes:
-        query += " WHERE " + " AND ".join(condicoes)
+        sql += " WHERE " + " AND ".join(condicoes)
 
-    query += " ORDER BY nomesubcontrato;"
+    sql += " ORDER BY nomesubcontrato;"
+    query = Query(sql, params)
 
     try:
-        # Executa a query no BigQuery.
-        resultados = bigquery_client.run_query(query)
+        # Executa a query no BigQuery (dim_contrato muda no máximo 1x/dia).
+        # Com o BigQuery lento ou fora, serve a última lista boa (stale) e,
+        # sem nada em cache, cai no except com a mensagem de erro.
+        resultados = bigquery_client.execute(
+            query,
+            cache_ttl=bigquery_client.TTL_DIMENSAO,
+            stale_ttl=bigquery_client.STALE_DIMENSAO,
+            timeout=bigquery_client.TIMEOUT_INTERATIVO,
+        )
         
         # Converte os resultados para uma lista de dicionários.
         contratos = [dict(row) for row in resultados] if resultados else []
@@ -129,7 +144,9 @@ def listar_detalhes_contrato(request, nrosubcontrato):
             - 'erro' (str): Mensagem de erro, presente apenas se 'success' for False.
     """
     # Query para buscar informações básicas do contrato.
-    query_contrato = f"""SELECT DISTINCT
+    params = {'nrosubcontrato': nrosubcontrato}
+
+    query_contrato = Query(f"""SELECT DISTINCT
                         a.nomecontrato,
                         a.nomesubcontrato,
                         a.percdesconto/100 as percdesconto,
@@ -137,39 +154,51 @@ def listar_detalhes_contrato(request, nrosubcontrato):
                         a.dtainiciovalidade, 
                         a.dtafimvalidade,
                         a.subcontrato
-                    FROM `singular-ray-422121`.gold.dim_contrato a
-                    WHERE a.subcontrato = {nrosubcontrato}"""
+                    FROM {DIM_CONTRATO} a
+                    WHERE a.subcontrato = @nrosubcontrato""", params)
 
     # Query para buscar os fornecedores (redes) associados ao contrato.
-    query_fornecedores = f"""SELECT 
+    query_fornecedores = Query(f"""SELECT 
                             b.NOMERAZAO,
                             b.FANTASIA,
                             b.cnpj_completo
-                        FROM `singular-ray-422121`.gold.dim_contrato a
-                        LEFT JOIN `singular-ray-422121`.gold.dim_fornecedor b ON a.seqrede = b.SEQREDE
-                        WHERE a.subcontrato = {nrosubcontrato}
-                        AND b.cnpj_completo IS NOT NULL"""
+                        FROM {DIM_CONTRATO} a
+                        LEFT JOIN {DIM_FORNECEDOR} b ON a.seqrede = b.SEQREDE
+                        WHERE a.subcontrato = @nrosubcontrato
+                        AND b.cnpj_completo IS NOT NULL""", params)
 
     # Query para buscar os produtos incluídos no contrato.
-    query_produtos = f"""SELECT  
+    query_produtos = Query(f"""SELECT  
                         cast(a.SEQPRODUTO AS int) as SEQPRODUTO, 
                         b.DESCCOMPLETA 
-                    FROM `singular-ray-422121`.gold.dim_produto_por_contrato a 
+                    FROM {DIM_PRODUTO_POR_CONTRATO} a 
                     left join (SELECT DISTINCT SEQPRODUTO, DESCCOMPLETA
-                               FROM `singular-ray-422121`.gold.dim_produto) as b on a.SEQPRODUTO = b.seqproduto
-                    where seqidentificador={nrosubcontrato}
+                               FROM {DIM_PRODUTO}) as b on a.SEQPRODUTO = b.seqproduto
+                    where seqidentificador = @nrosubcontrato
                     ORDER BY b.DESCCOMPLETA
-                    limit 10;"""
+                    limit 10;""", params)
 
     try:
-        # Executa as queries e processa os resultados.
-        resultado_contrato = bigquery_client.run_query(query_contrato)
+        # Executa as três queries ao mesmo tempo e processa os resultados.
+        resultados = bigquery_client.run_queries({
+            'contrato': query_contrato,
+            'fornecedores': query_fornecedores,
+            'produtos': query_produtos,
+        },
+            cache_ttl=bigquery_client.TTL_DIMENSAO,
+            stale_ttl=bigquery_client.STALE_DIMENSAO,
+            timeout=bigquery_client.TIMEOUT_INTERATIVO,
+        )
+        if not resultados['contrato'].ok:
+            raise resultados['contrato'].error
+
+        resultado_contrato = resultados['contrato'].rows
         info_contrato = dict(resultado_contrato[0]) if resultado_contrato else {}
 
-        resultado_fornecedores = bigquery_client.run_query(query_fornecedores)
+        resultado_fornecedores = resultados['fornecedores'].rows
         fornecedores = [dict(row) for row in resultado_fornecedores] if resultado_fornecedores else []
 
-        resultado_produtos = bigquery_client.run_query(query_produtos)
+        resultado_produtos = resultados['produtos'].rows
         produtos = [dict(row) for row in resultado_produtos] if resultado_produtos else []
 
         # Retorna os dados consolidados em uma resposta JSON.
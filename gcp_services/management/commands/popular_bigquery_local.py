@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from gcp_services.services import local_seed
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera os bancos SQLite do backend local do BigQuery (BIGQUERY_BACKEND='local') "
+        "com dados sintéticos das tabelas usadas pelas views."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escala', type=float, default=1.0,
+                            help='Multiplicador dos volumes (1.0 ~ produção, 0.01 para testes rápidos).')
+        parser.add_argument('--semente', type=int, default=42,
+                            help='Semente do gerador aleatório (mesma semente, mesmos dados).')
+
+    def handle(self, *args, **options):
+        inicio = time.monotonic()
+        self.stdout.write(f"Gerando dados sintéticos (escala {options['escala']})...")
+        contagem = local_seed.seed(
+            escala=options['escala'], semente=options['semente'], log=self.stdout.write
+        )
+        total = sum(contagem.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} linhas geradas em {time.monotonic() - inicio:.1f}s."
+        ))
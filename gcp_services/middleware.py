@@ -0,0 +1,62 @@
+import time
+
+from django.db import connection
+
+from gcp_services.services import telemetry
+
+
+class TelemetryMiddleware:
+    """
+    Marca a requisição com o nome da view (para a telemetria e para os labels
+    dos jobs do BigQuery) e registra o tempo de cada consulta ao Postgres.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = telemetry.set_view(request.path)
+        inicio = time.monotonic()
+        response = None
+        erro = None
+        try:
+            with connection.execute_wrapper(_registrar_consulta_db):
+                response = self.get_response(request)
+            return response
+        except Exception as e:
+            erro = e
+            raise
+        finally:
+            # Registrado também quando a view levanta exceção (status 500).
+            telemetry.record(
+                'request',
+                path=request.path,
+                status=response.status_code if response is not None else 500,
+                elapsed_ms=(time.monotonic() - inicio) * 1000,
+                error=type(erro).__name__ if erro else None,
+            )
+            telemetry.reset_view(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # A partir daqui já se sabe qual view vai atender: troca o path pelo
+        # nome da rota (ex.: 'apuracao_grade:api-dashboard').
+        match = request.resolver_match
+        telemetry.set_view(match.view_name if match and match.view_name else view_func.__name__)
+        return None
+
+
+def _registrar_consulta_db(execute, sql, params, many, context):
+    inicio = time.monotonic()
+    erro = None
+    try:
+        return execute(sql, params, many, context)
+    except Exception as e:
+        erro = e
+        raise
+    finally:
+        telemetry.record(
+            'postgres',
+            sql=sql[:300],
+            elapsed_ms=(time.monotonic() - inicio) * 1000,
+            error=repr(erro) if erro else None,
+        )
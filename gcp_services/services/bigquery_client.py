@@ -2,36 +2,695 @@
 # com o Google BigQuery. Qualquer parte da aplicação que precisar de dados
 # do BigQuery deve usar as funções daqui.
 
+import asyncio
+import contextvars
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from functools import partial
+from typing import Iterator
+
+import google.auth
+from google.api_core.exceptions import BadRequest, GoogleAPICallError, NotFound
+from google.auth.transport.requests import AuthorizedSession
 from google.cloud import bigquery
+from google.cloud import bigquery_storage
+from google.oauth2 import service_account
 from django.conf import settings
+from requests.adapters import HTTPAdapter
 import pandas as pd
 
-def _get_client():
+from gcp_services.services import telemetry
+from gcp_services.services.query_cache import AUSENTE, FRESCO, VENCIDO, QueryCache, extract_tables, make_key, normalize_sql
+from gcp_services.services.resilience import CircuitBreaker, CircuitOpenError
+from gcp_services.services.query_templates import Query, split_query
+
+_SCOPES = ['https://www.googleapis.com/auth/cloud-platform']
+
+# Cliente único por processo. Criado sob demanda na primeira chamada e
+# compartilhado por todas as threads do gunicorn.
+_client = None
+_client_lock = threading.Lock()
+_bqstorage_client = None
+
+# Cache opcional de resultados (ver run_query(cache_ttl=...)).
+_cache = QueryCache(max_entries=getattr(settings, 'BIGQUERY_CACHE_MAX_ENTRIES', 256))
+
+# Pool de threads usado por run_queries/run_queries_async para esperar
+# vários jobs do BigQuery ao mesmo tempo.
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'BIGQUERY_MAX_WORKERS', 8),
+    thread_name_prefix='bigquery',
+)
+
+# Consultas em andamento neste processo (chave -> Future), para que chamadas
+# idênticas e simultâneas esperem o mesmo job em vez de disparar outro.
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+# Chaves do cache com atualização em segundo plano em andamento (stale_ttl).
+_refreshing = set()
+
+# Depois de várias falhas seguidas (timeout, credenciais, erro 5xx), para de
+# chamar o BigQuery por um tempo e falha na hora com CircuitOpenError.
+_breaker = CircuitBreaker(
+    'bigquery',
+    failure_threshold=getattr(settings, 'BIGQUERY_CIRCUITO_FALHAS', 5),
+    reset_timeout=getattr(settings, 'BIGQUERY_CIRCUITO_ESPERA', 30),
+)
+
+# TTL sugerido para consultas a tabelas de dimensão, que mudam no máximo 1x/dia.
+TTL_DIMENSAO = getattr(settings, 'BIGQUERY_CACHE_TTL_DIMENSAO', 6 * 60 * 60)
+
+# Por quanto tempo, depois de vencido, um resultado de dimensão ainda pode ser
+# servido enquanto a atualização roda em segundo plano (ver stale_ttl).
+STALE_DIMENSAO = getattr(settings, 'BIGQUERY_CACHE_STALE_DIMENSAO', 24 * 60 * 60)
+
+# Timeout das consultas das telas interativas e o padrão das demais (segundos).
+TIMEOUT_INTERATIVO = getattr(settings, 'BIGQUERY_TIMEOUT_INTERATIVO', 20)
+TIMEOUT_PADRAO = getattr(settings, 'BIGQUERY_TIMEOUT_PADRAO', 120)
+
+
+def _get_credentials():
+    """
+    Resolve as credenciais do GCP.
+
+    Usa o arquivo definido em settings.GOOGLE_APPLICATION_CREDENTIALS (modo
+    local) ou, na ausência dele, a autenticação nativa do Google Cloud (ADC),
+    que é o caso do Cloud Run.
+
+    Returns:
+        Uma tupla (credentials, project_id).
+    """
+    credentials_path = getattr(settings, 'GOOGLE_APPLICATION_CREDENTIALS', None)
+    if credentials_path:
+        credentials = service_account.Credentials.from_service_account_file(
+            credentials_path, scopes=_SCOPES
+        )
+        return credentials, credentials.project_id
+    return google.auth.default(scopes=_SCOPES)
+
+
+def is_local() -> bool:
+    """True se as consultas rodam no backend local em vez do BigQuery."""
+    return getattr(settings, 'BIGQUERY_BACKEND', 'bigquery') == 'local'
+
+
+def _build_client() -> bigquery.Client:
+    """
+    Monta o cliente BigQuery com uma sessão HTTP própria.
+
+    A AuthorizedSession renova o token de forma preguiçosa (só quando ele
+    expira) e o HTTPAdapter mantém um pool de conexões keep-alive, evitando
+    um novo handshake TLS a cada consulta.
+
+    Com settings.BIGQUERY_BACKEND = 'local', devolve o cliente do backend
+    local (SQLite com dados sintéticos, ver local_backend).
     """
-    Função privada para criar e retornar um cliente BigQuery autenticado.
-    O underscore (_) no início indica que ela deve ser usada apenas dentro deste módulo.
+    if is_local():
+        from gcp_services.services import local_backend
+        return local_backend.LocalClient()
+
+    credentials, project = _get_credentials()
+    pool_size = getattr(settings, 'BIGQUERY_HTTP_POOL_SIZE', 16)
+
+    session = AuthorizedSession(credentials)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+
+    return bigquery.Client(project=project, credentials=credentials, _http=session)
+
+
+def get_client() -> bigquery.Client:
+    """
+    Retorna o cliente BigQuery compartilhado pelo processo.
+
+    O cliente é criado uma única vez (na primeira chamada) e reutilizado por
+    todas as views e serviços. O bigquery.Client é thread-safe, então pode
+    ser usado simultaneamente pelas threads do gunicorn.
     """
-    credentials_path = settings.GOOGLE_APPLICATION_CREDENTIALS
-    return bigquery.Client.from_service_account_json(credentials_path)
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _build_client()
+    return _client
 
-def run_query(query: str) -> list | None:
+
+def reset_client():
+    """
+    Descarta o cliente atual, forçando uma nova criação na próxima chamada.
+    Útil quando as credenciais são trocadas em tempo de execução.
+    """
+    global _client, _bqstorage_client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
+        _bqstorage_client = None
+
+
+def get_bqstorage_client() -> bigquery_storage.BigQueryReadClient:
+    """
+    Retorna o cliente da BigQuery Storage Read API compartilhado pelo processo.
+    Usa as mesmas credenciais do cliente principal. No backend local
+    retorna None (a leitura é feita direto do SQLite).
+    """
+    global _bqstorage_client
+    if is_local():
+        return None
+    if _bqstorage_client is None:
+        client = get_client()
+        with _client_lock:
+            if _bqstorage_client is None:
+                _bqstorage_client = bigquery_storage.BigQueryReadClient(
+                    credentials=client._credentials
+                )
+    return _bqstorage_client
+
+
+def invalidate_tables(*tables: str) -> int:
+    """
+    Remove do cache os resultados que leem as tabelas informadas
+    (ex.: invalidate_tables('dim_contrato')). Retorna quantas entradas saíram.
+    """
+    return _cache.invalidate_tables(*tables)
+
+
+def clear_cache():
+    """Esvazia todo o cache de resultados do processo."""
+    _cache.clear()
+
+
+class QueryBudgetExceeded(Exception):
+    """
+    A consulta leria mais bytes do que o orçamento permitido.
+
+    Levantada antes de executar (quando a estimativa via dry-run já passa do
+    limite) ou quando o próprio BigQuery recusa o job por maximum_bytes_billed.
+    """
+
+    def __init__(self, budget: int, estimated: int | None = None):
+        self.budget = budget
+        self.estimated = estimated
+        if estimated is not None:
+            msg = (f"A consulta leria {format_bytes(estimated)}, acima do limite de "
+                   f"{format_bytes(budget)}. Reduza o período ou os filtros.")
+        else:
+            msg = (f"A consulta ultrapassou o limite de {format_bytes(budget)} processados. "
+                   f"Reduza o período ou os filtros.")
+        super().__init__(msg)
+
+
+def format_bytes(num_bytes: int | None) -> str:
+    """Formata um volume de bytes para exibição (ex.: '1.5 GB')."""
+    if num_bytes is None:
+        return '-'
+    valor = float(num_bytes)
+    for unidade in ('B', 'KB', 'MB', 'GB', 'TB'):
+        if valor < 1024 or unidade == 'TB':
+            return f"{valor:.1f} {unidade}" if unidade != 'B' else f"{int(valor)} B"
+        valor /= 1024
+
+
+@dataclass
+class QueryResult:
+    """
+    Resultado de uma consulta, com as estatísticas do job.
+
+    Attributes:
+        rows: Lista de dicionários (None se a consulta falhou).
+        error: A exceção levantada, se houve erro (inclusive timeout).
+        elapsed: Tempo total da consulta, em segundos.
+        bytes_estimated: Estimativa do dry-run (None se não foi feito).
+        bytes_processed: Bytes processados pelo job.
+        bytes_billed: Bytes cobrados pelo job (0 se veio do cache do BigQuery).
+        job_id: Identificador do job no BigQuery.
+        cache_hit: True se o BigQuery respondeu do cache de resultados dele.
+        slot_ms: Total de slot-milissegundos consumidos pelo job.
+    """
+    rows: list | None = None
+    error: Exception | None = None
+    elapsed: float = 0.0
+    bytes_estimated: int | None = None
+    bytes_processed: int | None = None
+    bytes_billed: int | None = None
+    job_id: str | None = None
+    cache_hit: bool = False
+    slot_ms: int | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def copy(self) -> 'QueryResult':
+        # Cópia rasa da lista: quem recebe pode reordenar/filtrar sem afetar
+        # o cache ou outras threads que compartilham o mesmo resultado.
+        return replace(self, rows=list(self.rows) if self.rows is not None else None)
+
+
+def _resolve_budget(max_bytes: int | None) -> int | None:
+    return max_bytes or getattr(settings, 'BIGQUERY_MAX_BYTES_BILLED', None)
+
+
+def _start_job(query: str | Query, max_bytes: int | None = None, **config) -> bigquery.QueryJob:
+    """
+    Dispara o job no BigQuery (com parâmetros, se for uma Query).
+    O orçamento vira maximum_bytes_billed: o BigQuery recusa o job se passar.
+    """
+    client = get_client()
+    sql, _ = split_query(query)
+    budget = _resolve_budget(max_bytes)
+    if budget:
+        config['maximum_bytes_billed'] = budget
+    config.setdefault('labels', telemetry.job_labels())
+    if isinstance(query, Query):
+        job_config = query.job_config(**config)
+    else:
+        job_config = bigquery.QueryJobConfig(**config)
+    return client.query(sql, job_config=job_config)
+
+
+def estimate_bytes(query: str | Query) -> int:
+    """
+    Estima, via dry-run, quantos bytes a consulta vai processar.
+    O dry-run não custa nada e não ocupa slots.
+    """
+    job = _start_job(query, dry_run=True, use_query_cache=False)
+    return job.total_bytes_processed or 0
+
+
+def _check_budget(query: str | Query, max_bytes: int | None) -> int:
+    """
+    Faz o dry-run e levanta QueryBudgetExceeded se a estimativa passar do
+    orçamento. Retorna a estimativa.
+    """
+    estimated = estimate_bytes(query)
+    budget = _resolve_budget(max_bytes)
+    if budget and estimated > budget:
+        raise QueryBudgetExceeded(budget, estimated)
+    return estimated
+
+
+@contextmanager
+def _circuit():
+    """
+    Passa a chamada pelo circuit breaker. Erros de consulta (SQL inválido,
+    tabela inexistente, orçamento) mostram que o BigQuery respondeu e não
+    contam como falha do serviço.
+    """
+    _breaker.before_call()
+    try:
+        yield
+    except (QueryBudgetExceeded, BadRequest, NotFound):
+        _breaker.record_success()
+        raise
+    except Exception:
+        _breaker.record_failure()
+        raise
+    else:
+        _breaker.record_success()
+
+
+def circuit_state() -> str:
+    """Estado do circuit breaker do BigQuery ('fechado', 'aberto' ou 'meio_aberto')."""
+    return _breaker.state
+
+
+def _record_job(query: str | Query, query_job: bigquery.QueryJob | None, inicio: float,
+                error: Exception | None = None):
+    """Registra o job na telemetria (tempo, bytes, cache do BigQuery, slot-ms)."""
+    sql, _ = split_query(query)
+    telemetry.record(
+        'bigquery',
+        sql=normalize_sql(sql)[:300],
+        elapsed_ms=(time.monotonic() - inicio) * 1000,
+        job_id=query_job.job_id if query_job else None,
+        bytes_processed=query_job.total_bytes_processed if query_job else None,
+        bytes_billed=query_job.total_bytes_billed if query_job else None,
+        cache_hit=bool(query_job and query_job.cache_hit),
+        slot_ms=query_job.slot_millis if query_job else None,
+        error=repr(error) if error else None,
+    )
+
+
+def _wait(query_job: bigquery.QueryJob, timeout: float | None, max_bytes: int | None):
+    """
+    Espera o job terminar. Cancela no BigQuery se passar do timeout e traduz
+    a recusa por maximum_bytes_billed em QueryBudgetExceeded.
+    """
+    try:
+        return query_job.result(timeout=timeout)
+    except FuturesTimeoutError:
+        query_job.cancel()
+        raise TimeoutError(f"Consulta excedeu o tempo limite de {timeout}s (job {query_job.job_id}).")
+    except GoogleAPICallError as e:
+        reasons = {err.get('reason') for err in (getattr(e, 'errors', None) or [])}
+        if 'bytesBilledLimitExceeded' in reasons:
+            raise QueryBudgetExceeded(_resolve_budget(max_bytes)) from e
+        raise
+
+
+def query_dataframe(query: str | Query, timeout: float | None = None,
+                    max_bytes: int | None = None, on_job_done=None) -> pd.DataFrame:
+    """
+    Executa a consulta e devolve um DataFrame do pandas (sem cache).
+    Levanta exceção em caso de erro. Se o job passar de 'timeout' segundos,
+    é cancelado no BigQuery e um TimeoutError é levantado.
+
+    Args:
+        on_job_done (callable, opcional): Chamado com o job quando a consulta
+            termina, antes do download do resultado (ex.: para medir as duas
+            etapas separadamente).
+    """
+    inicio = time.monotonic()
+    query_job = None
+    try:
+        with _circuit():
+            query_job = _start_job(query, max_bytes=max_bytes)
+            row_iterator = _wait(query_job, timeout, max_bytes)
+        # Fora do circuit breaker: um erro do callback não é falha do BigQuery.
+        if on_job_done is not None:
+            on_job_done(query_job)
+        with _circuit():
+            df = row_iterator.to_dataframe(bqstorage_client=get_bqstorage_client())
+    except Exception as e:
+        _record_job(query, query_job, inicio, error=e)
+        raise
+    _record_job(query, query_job, inicio)
+    return df
+
+
+def _execute(query: str | Query, timeout: float | None = None, max_bytes: int | None = None,
+             estimate: bool = False) -> QueryResult:
+    """
+    Executa a consulta e devolve um QueryResult com as linhas e as
+    estatísticas do job. Levanta exceção em caso de erro.
+    """
+    inicio = time.monotonic()
+    query_job = None
+    try:
+        with _circuit():
+            bytes_estimated = _check_budget(query, max_bytes) if estimate else None
+
+            query_job = _start_job(query, max_bytes=max_bytes)
+            row_iterator = _wait(query_job, timeout, max_bytes)
+            # Arrow -> dicionários direto, sem passar por DataFrame. Os valores já
+            # saem como tipos nativos do Python (NULL vira None).
+            rows = row_iterator.to_arrow(bqstorage_client=get_bqstorage_client()).to_pylist()
+    except Exception as e:
+        _record_job(query, query_job, inicio, error=e)
+        raise
+    _record_job(query, query_job, inicio)
+
+    return QueryResult(
+        rows=rows,
+        elapsed=time.monotonic() - inicio,
+        bytes_estimated=bytes_estimated,
+        bytes_processed=query_job.total_bytes_processed,
+        bytes_billed=query_job.total_bytes_billed,
+        job_id=query_job.job_id,
+        cache_hit=bool(query_job.cache_hit),
+        slot_ms=query_job.slot_millis,
+    )
+
+
+def _execute_coalesced(query: str | Query, timeout: float | None = None, max_bytes: int | None = None,
+                       estimate: bool = False) -> QueryResult:
+    """
+    Igual ao _execute, mas com coalescência (single-flight): se uma consulta
+    idêntica já está rodando neste processo, espera pelo job dela e
+    compartilha o resultado (ou o erro) em vez de iniciar um job duplicado.
+
+    O orçamento (max_bytes resolvido) e o modo estimate fazem parte da chave:
+    quem tem um limite mais restrito, ou pede o dry-run, não aproveita um job
+    que não passou pela mesma verificação.
+    """
+    key = f"{make_key(*split_query(query))}|{_resolve_budget(max_bytes)}|{int(estimate)}"
+    with _inflight_lock:
+        future = _inflight.get(key)
+        is_leader = future is None
+        if is_leader:
+            future = Future()
+            _inflight[key] = future
+
+    if not is_leader:
+        try:
+            return future.result(timeout=timeout).copy()
+        except FuturesTimeoutError:
+            raise TimeoutError(f"Consulta excedeu o tempo limite de {timeout}s aguardando job idêntico.")
+
+    try:
+        result = _execute(query, timeout=timeout, max_bytes=max_bytes, estimate=estimate)
+        future.set_result(result)
+        return result.copy()
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+
+def run_query_detailed(query: str | Query, cache_ttl: int | None = None, timeout: float | None = None,
+                       max_bytes: int | None = None, estimate: bool = False,
+                       stale_ttl: int | None = None) -> QueryResult:
+    """
+    Executa a consulta e devolve um QueryResult (linhas + bytes estimados,
+    processados e cobrados). Levanta exceção em caso de erro.
+
+    Args:
+        query (str | Query): A consulta SQL a ser executada.
+        cache_ttl (int, opcional): Segundos de cache do resultado (ver run_query).
+        timeout (float, opcional): Tempo máximo de espera pelo job, em
+            segundos. Se omitido, usa settings.BIGQUERY_TIMEOUT_PADRAO.
+        max_bytes (int, opcional): Orçamento de bytes da consulta. Se omitido,
+            usa settings.BIGQUERY_MAX_BYTES_BILLED. O BigQuery recusa o job
+            que passar do limite e QueryBudgetExceeded é levantada.
+        estimate (bool): Faz um dry-run antes de executar. A estimativa volta
+            em bytes_estimated e, se passar do orçamento, a consulta nem roda.
+            Opcional: o orçamento já é garantido pelo maximum_bytes_billed do
+            job, sem a ida a mais ao BigQuery.
+        stale_ttl (int, opcional): Stale-while-revalidate. Depois de vencido
+            o cache_ttl, o resultado antigo ainda é devolvido na hora por mais
+            stale_ttl segundos, enquanto uma atualização roda em segundo plano.
+            Com o BigQuery lento ou fora (circuito aberto), a tela continua
+            respondendo com o último resultado bom.
+    """
+    if timeout is None:
+        timeout = TIMEOUT_PADRAO
+    sql, params = split_query(query)
+    key = None
+    if cache_ttl:
+        key = make_key(sql, params)
+        estado, result = _cache.get_stale(key)
+        telemetry.record('cache', sql=normalize_sql(sql)[:300], cache_hit=estado != AUSENTE,
+                         stale=estado == VENCIDO)
+        if estado == FRESCO:
+            return result.copy()
+        if estado == VENCIDO:
+            _refresh_in_background(key, query, cache_ttl, timeout, max_bytes, stale_ttl)
+            return result.copy()
+
+    result = _execute_coalesced(query, timeout=timeout, max_bytes=max_bytes, estimate=estimate)
+
+    if key is not None:
+        _cache.set(key, result.copy(), cache_ttl, extract_tables(sql), stale_ttl=stale_ttl)
+    return result
+
+
+def _refresh_in_background(key: str, query: str | Query, cache_ttl: int, timeout: float | None,
+                           max_bytes: int | None, stale_ttl: int | None):
+    """
+    Atualiza uma entrada vencida do cache no pool de threads. Se já houver
+    uma atualização da mesma chave em andamento, não faz nada.
+    """
+    with _inflight_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+
+    def _refresh():
+        sql, _ = split_query(query)
+        try:
+            result = _execute_coalesced(query, timeout=timeout, max_bytes=max_bytes)
+            _cache.set(key, result.copy(), cache_ttl, extract_tables(sql), stale_ttl=stale_ttl)
+        except Exception as e:
+            # Mantém o valor antigo; a próxima leitura tenta de novo.
+            print(f"Erro ao atualizar o cache do BigQuery em segundo plano: {e}")
+        finally:
+            with _inflight_lock:
+                _refreshing.discard(key)
+
+    _executor.submit(contextvars.copy_context().run, _refresh)
+
+
+def execute(query: str | Query, cache_ttl: int | None = None, timeout: float | None = None,
+            max_bytes: int | None = None, stale_ttl: int | None = None) -> list:
+    """
+    Igual ao run_query, mas levanta a exceção em caso de erro em vez de
+    devolver None. Use quando a view precisa mostrar o motivo da falha.
+    """
+    return run_query_detailed(
+        query, cache_ttl=cache_ttl, timeout=timeout, max_bytes=max_bytes, stale_ttl=stale_ttl
+    ).rows
+
+
+def run_query(query: str | Query, cache_ttl: int | None = None, timeout: float | None = None,
+              max_bytes: int | None = None, stale_ttl: int | None = None) -> list | None:
     """
     Executa uma consulta SQL no BigQuery e retorna os resultados.
 
     Args:
-        query (str): A string da consulta SQL a ser executada.
+        query (str | Query): A consulta SQL a ser executada. Prefira Query
+            (ver query_templates) com parâmetros @nome a montar o SQL com
+            f-strings: o texto fica estável e o cache do BigQuery funciona.
+        cache_ttl (int, opcional): Se informado, o resultado fica em cache
+            por esse número de segundos. A chave é o SQL normalizado, então
+            a mesma consulta com espaçamento diferente reaproveita a entrada.
+        timeout (float, opcional): Tempo máximo de espera pelo job, em segundos.
+        max_bytes (int, opcional): Orçamento de bytes (ver run_query_detailed).
+        stale_ttl (int, opcional): Janela stale-while-revalidate (ver run_query_detailed).
 
     Returns:
         Uma lista de dicionários representando as linhas do resultado,
-        ou None se ocorrer um erro.
+        ou None se ocorrer um erro (inclusive QueryBudgetExceeded; use
+        execute para receber a exceção).
     """
     try:
-        client = _get_client()
-        query_job = client.query(query)
-        # O to_dataframe é muito eficiente para lidar com os resultados
-        results_df = query_job.to_dataframe()
-        return results_df.to_dict('records')
+        return execute(query, cache_ttl=cache_ttl, timeout=timeout, max_bytes=max_bytes, stale_ttl=stale_ttl)
     except Exception as e:
         # No futuro, podemos adicionar um log de erro aqui
         print(f"Erro no serviço BigQuery: {e}")
-        return None
\ No newline at end of file
+        return None
+
+
+def _run_isolated(query: str | Query, cache_ttl: int | None, timeout: float | None,
+                  max_bytes: int | None, stale_ttl: int | None = None) -> QueryResult:
+    # Roda dentro do pool: nunca levanta exceção, o erro vai no QueryResult.
+    inicio = time.monotonic()
+    try:
+        return run_query_detailed(
+            query, cache_ttl=cache_ttl, timeout=timeout, max_bytes=max_bytes, stale_ttl=stale_ttl
+        )
+    except Exception as e:
+        print(f"Erro no serviço BigQuery: {e}")
+        return QueryResult(error=e, elapsed=time.monotonic() - inicio)
+
+
+def _timeout_for(name: str, timeout) -> float | None:
+    if isinstance(timeout, dict):
+        return timeout.get(name)
+    return timeout
+
+
+def run_queries(queries: dict[str, str | Query], cache_ttl: int | None = None,
+                timeout: float | dict[str, float] | None = None,
+                max_bytes: int | None = None, stale_ttl: int | None = None) -> dict[str, QueryResult]:
+    """
+    Executa várias consultas ao mesmo tempo e espera todas terminarem.
+
+    O tempo total fica próximo ao da consulta mais lenta, e não à soma de
+    todas. O erro de uma consulta não afeta as demais.
+
+    Args:
+        queries (dict): Nome -> SQL (str ou Query). Os nomes são devolvidos no resultado.
+        cache_ttl (int, opcional): Igual ao run_query, aplicado a todas.
+        timeout (float | dict, opcional): Tempo máximo por consulta, em
+            segundos. Pode ser um valor único ou um dict nome -> timeout.
+        max_bytes (int, opcional): Orçamento de bytes por consulta.
+        stale_ttl (int, opcional): Janela stale-while-revalidate (ver run_query_detailed).
+
+    Returns:
+        Um dict nome -> QueryResult.
+
+    Exemplo:
+        res = run_queries({'contrato': sql_a, 'produtos': sql_b}, timeout=30)
+        if res['contrato'].ok:
+            linhas = res['contrato'].rows
+    """
+    # Cada tarefa leva uma cópia do contexto atual (view corrente da
+    # telemetria), já que as threads do pool não herdam ContextVars.
+    futures = {
+        name: _executor.submit(
+            contextvars.copy_context().run,
+            _run_isolated, query, cache_ttl, _timeout_for(name, timeout), max_bytes, stale_ttl,
+        )
+        for name, query in queries.items()
+    }
+    return {name: future.result() for name, future in futures.items()}
+
+
+async def run_queries_async(queries: dict[str, str | Query], cache_ttl: int | None = None,
+                            timeout: float | dict[str, float] | None = None,
+                            max_bytes: int | None = None,
+                            stale_ttl: int | None = None) -> dict[str, QueryResult]:
+    """
+    Versão assíncrona do run_queries, para uso em views async/ASGI.
+    As consultas rodam no mesmo pool de threads, sem bloquear o event loop.
+    """
+    loop = asyncio.get_running_loop()
+    names = list(queries)
+    results = await asyncio.gather(*(
+        loop.run_in_executor(
+            _executor,
+            partial(
+                contextvars.copy_context().run,
+                _run_isolated, queries[name], cache_ttl, _timeout_for(name, timeout), max_bytes, stale_ttl,
+            ),
+        )
+        for name in names
+    ))
+    return dict(zip(names, results))
+
+
+def stream_query(query: str | Query, as_arrow: bool = False, max_bytes: int | None = None,
+                 timeout: float | None = None) -> Iterator:
+    """
+    Executa uma consulta e entrega o resultado em partes, à medida que chega,
+    lendo pela BigQuery Storage Read API.
+
+    Ao contrário do run_query, não materializa o resultado inteiro (nem em
+    DataFrame, nem em lista de dicionários), então quem chama pode ir
+    agregando as linhas e manter o pico de memória baixo.
+
+    Args:
+        query (str | Query): A consulta SQL a ser executada.
+        as_arrow (bool): Se True, entrega pyarrow.RecordBatch. Se False
+            (padrão), entrega cada linha como uma namedtuple com os nomes
+            das colunas (ex.: row.NomeAssociado).
+        max_bytes (int, opcional): Orçamento de bytes, aplicado como
+            maximum_bytes_billed do job: o BigQuery recusa a consulta que
+            passar do limite e QueryBudgetExceeded é levantada.
+        timeout (float, opcional): Tempo máximo de espera pelo job (até o
+            início da leitura), em segundos.
+
+    Erros NÃO são engolidos aqui: exceções do BigQuery sobem para quem
+    está iterando.
+    """
+    inicio = time.monotonic()
+    query_job = None
+    try:
+        with _circuit():
+            query_job = _start_job(query, max_bytes=max_bytes)
+            row_iterator = _wait(query_job, timeout, max_bytes)
+    except Exception as e:
+        _record_job(query, query_job, inicio, error=e)
+        raise
+    # O tempo registrado vai até o job terminar; a leitura em streaming
+    # fica por conta de quem está iterando.
+    _record_job(query, query_job, inicio)
+    batches = row_iterator.to_arrow_iterable(bqstorage_client=get_bqstorage_client())
+
+    if as_arrow:
+        yield from batches
+        return
+
+    Row = namedtuple('Row', [field.name for field in row_iterator.schema], rename=True)
+    for batch in batches:
+        columns = [column.to_pylist() for column in batch.columns]
+        for values in zip(*columns):
+            yield Row._make(values)
@@ -0,0 +1,277 @@
+# Documentação: Backend local (SQLite embutido) para o BigQuery.
+#
+# Com settings.BIGQUERY_BACKEND = 'local', o get_client() do bigquery_client
+# devolve um LocalClient em vez do cliente do BigQuery. As mesmas consultas das
+# views rodam contra bancos SQLite com dados sintéticos (ver local_seed e o
+# comando 'popular_bigquery_local'), sem credenciais do GCP. Serve para
+# benchmarks e testes repetíveis, offline.
+#
+# Só a parte da API do google-cloud-bigquery usada pelo bigquery_client é
+# imitada: client.query() -> job com result(), cancel(), job_id e estatísticas;
+# result() -> iterador com to_arrow(), to_dataframe(), to_arrow_iterable() e
+# schema. Cache, coalescência, orçamento de bytes e telemetria continuam
+# funcionando por cima.
+#
+# O SQL é traduzido do dialeto do BigQuery para o SQLite por expressões
+# regulares (só as construções que o projeto usa):
+#   `projeto.gold.tabela`         -> gold.tabela (bancos anexados por dataset)
+#   x IN UNNEST(@lista)           -> x IN (SELECT value FROM json_each(@lista))
+#   CAST(x AS STRING/INT64/...)   -> CAST(x AS TEXT/INTEGER/...)
+#   CONCAT, SAFE_DIVIDE, COUNTIF  -> funções registradas na conexão
+
+import json
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+from django.conf import settings
+from google.api_core.exceptions import BadRequest
+from google.cloud import bigquery
+
+from gcp_services.services.query_cache import extract_tables
+
+# Datasets do BigQuery, cada um vira um arquivo SQLite anexado à conexão.
+DATASETS = ('gold', 'landing_saerj')
+
+_TABELA_CRASE_RE = re.compile(r'`[\w-]+\.(\w+)\.(\w+)`|`[\w-]+`\.(\w+)\.(\w+)')
+_UNNEST_RE = re.compile(r'\bIN\s+UNNEST\s*\(\s*@(\w+)\s*\)', re.IGNORECASE)
+_CAST_DATE_RE = re.compile(r'\bCAST\s*\(([^()]+?)\s+AS\s+DATE\s*\)', re.IGNORECASE)
+_TIPOS = {
+    'STRING': 'TEXT',
+    'INT64': 'INTEGER',
+    'FLOAT64': 'REAL',
+    'BIGNUMERIC': 'NUMERIC',
+    'BOOL': 'INTEGER',
+}
+_TIPO_RE = re.compile(r'\bAS\s+(' + '|'.join(_TIPOS) + r')\b', re.IGNORECASE)
+
+_local = threading.local()
+
+
+def data_dir() -> Path:
+    return Path(getattr(settings, 'BIGQUERY_LOCAL_DIR', Path(settings.BASE_DIR) / 'bigquery_local'))
+
+
+def dataset_path(dataset: str) -> Path:
+    return data_dir() / f'{dataset}.sqlite3'
+
+
+def translate_sql(sql: str) -> str:
+    """
+    Traduz o SQL do dialeto do BigQuery para o do SQLite.
+    """
+    sql = _TABELA_CRASE_RE.sub(
+        lambda m: f'{m.group(1) or m.group(3)}.{m.group(2) or m.group(4)}', sql
+    )
+    sql = _UNNEST_RE.sub(r'IN (SELECT value FROM json_each(@\1))', sql)
+    sql = _CAST_DATE_RE.sub(r'DATE(\1)', sql)
+    sql = _TIPO_RE.sub(lambda m: f'AS {_TIPOS[m.group(1).upper()]}', sql)
+    return sql.strip().rstrip(';')
+
+
+def _valor_sqlite(value):
+    if isinstance(value, (list, tuple)):
+        return json.dumps([_valor_sqlite(v) for v in value])
+    if isinstance(value, datetime):
+        return value.isoformat(' ')
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def _parametros(job_config) -> dict:
+    params = {}
+    for param in getattr(job_config, 'query_parameters', None) or []:
+        if isinstance(param, bigquery.ArrayQueryParameter):
+            params[param.name] = _valor_sqlite(list(param.values))
+        else:
+            params[param.name] = _valor_sqlite(param.value)
+    return params
+
+
+class _CountIf:
+    def __init__(self):
+        self.total = 0
+
+    def step(self, condicao):
+        if condicao:
+            self.total += 1
+
+    def finalize(self):
+        return self.total
+
+
+def _concat(*args):
+    # Igual ao BigQuery: NULL em qualquer argumento resulta em NULL.
+    if any(a is None for a in args):
+        return None
+    return ''.join(str(a) for a in args)
+
+
+def _safe_divide(a, b):
+    if a is None or not b:
+        return None
+    return a / b
+
+
+def connect(readonly: bool = True) -> sqlite3.Connection:
+    """
+    Abre uma conexão em memória com os datasets anexados.
+    """
+    conn = sqlite3.connect(
+        ':memory:', detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False, uri=True
+    )
+    modo = '?mode=ro' if readonly else ''
+    for dataset in DATASETS:
+        caminho = dataset_path(dataset)
+        if readonly and not caminho.exists():
+            raise FileNotFoundError(
+                f"Banco local '{caminho}' não existe. Rode 'python manage.py popular_bigquery_local'."
+            )
+        conn.execute(f"ATTACH DATABASE ? AS {dataset}", (f'file:{caminho}{modo}',))
+    conn.create_function('CONCAT', -1, _concat, deterministic=True)
+    conn.create_function('SAFE_DIVIDE', 2, _safe_divide, deterministic=True)
+    conn.create_aggregate('COUNTIF', 1, _CountIf)
+    return conn
+
+
+def _connection() -> sqlite3.Connection:
+    # Uma conexão por thread (as threads do gunicorn e do pool do run_queries).
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = _local.conn = connect()
+    return conn
+
+
+def _bytes_tabelas(conn: sqlite3.Connection, sql: str) -> int:
+    """
+    Aproximação dos bytes lidos: tamanho em disco das tabelas referenciadas.
+    Ao contrário do BigQuery (colunar), não considera só as colunas usadas.
+    """
+    total = 0
+    for tabela in extract_tables(sql):
+        for dataset in DATASETS:
+            try:
+                row = conn.execute(
+                    f"SELECT SUM(pgsize) FROM dbstat('{dataset}') WHERE lower(name) = ?", (tabela,)
+                ).fetchone()
+            except sqlite3.Error:
+                row = None
+            total += (row[0] or 0) if row else 0
+    return total
+
+
+sqlite3.register_converter('DATE', lambda b: date.fromisoformat(b.decode()))
+
+
+class LocalRowIterator:
+    """Resultado de um LocalQueryJob (imita o RowIterator do BigQuery)."""
+
+    def __init__(self, columns: list[str], rows: list[tuple]):
+        self._columns = columns
+        self._rows = rows
+        self.total_rows = len(rows)
+
+    @property
+    def schema(self) -> list:
+        return [bigquery.SchemaField(name, 'STRING') for name in self._columns]
+
+    def __iter__(self):
+        for row in self._rows:
+            yield dict(zip(self._columns, row))
+
+    def to_arrow(self, bqstorage_client=None, **kwargs) -> pa.Table:
+        colunas = list(zip(*self._rows)) if self._rows else [[] for _ in self._columns]
+        return pa.table({name: list(values) for name, values in zip(self._columns, colunas)})
+
+    def to_arrow_iterable(self, bqstorage_client=None, max_queue_size=None, **kwargs):
+        yield from self.to_arrow().to_batches(max_chunksize=10_000)
+
+    def to_dataframe(self, bqstorage_client=None, **kwargs) -> pd.DataFrame:
+        return pd.DataFrame.from_records(self._rows, columns=self._columns)
+
+
+class LocalQueryJob:
+    """Job local (imita o QueryJob do BigQuery). Executa no result()."""
+
+    def __init__(self, sql: str, job_config=None):
+        self.job_id = f'local_{uuid.uuid4().hex}'
+        self.query = sql
+        self._sql = translate_sql(sql)
+        self._params = _parametros(job_config)
+        self._max_bytes = getattr(job_config, 'maximum_bytes_billed', None)
+        self._result = None
+        self._cancelado = False
+        self.cache_hit = False
+        self.slot_millis = None
+
+        conn = _connection()
+        self.total_bytes_processed = _bytes_tabelas(conn, sql)
+        self.total_bytes_billed = None if getattr(job_config, 'dry_run', False) else self.total_bytes_processed
+
+    def result(self, timeout: float | None = None) -> LocalRowIterator:
+        if self._result is not None:
+            return self._result
+
+        if self._max_bytes and self.total_bytes_processed > int(self._max_bytes):
+            raise BadRequest(
+                f"Query exceeded limit for bytes billed: {self._max_bytes}.",
+                errors=[{'reason': 'bytesBilledLimitExceeded'}],
+            )
+
+        conn = _connection()
+        inicio = time.monotonic()
+        limite = inicio + timeout if timeout else None
+
+        def _interromper():
+            # Chamado pelo SQLite a cada N instruções: retorno != 0 aborta.
+            return 1 if self._cancelado or (limite and time.monotonic() > limite) else 0
+
+        conn.set_progress_handler(_interromper, 10_000)
+        try:
+            cursor = conn.execute(self._sql, self._params)
+            rows = cursor.fetchall()
+        except sqlite3.OperationalError as e:
+            if 'interrupted' in str(e) and limite and time.monotonic() > limite:
+                raise FuturesTimeoutError() from e
+            raise BadRequest(f"{e}\n{self._sql}") from e
+        finally:
+            conn.set_progress_handler(None, 0)
+
+        columns = [d[0] for d in cursor.description] if cursor.description else []
+        self.slot_millis = int((time.monotonic() - inicio) * 1000)
+        self._result = LocalRowIterator(columns, rows)
+        return self._result
+
+    def cancel(self):
+        self._cancelado = True
+        return True
+
+
+class LocalClient:
+    """Cliente local (imita o bigquery.Client)."""
+
+    project = 'local'
+
+    def __init__(self):
+        # Falha cedo se os bancos ainda não foram gerados.
+        _connection()
+
+    def query(self, sql: str, job_config=None) -> LocalQueryJob:
+        return LocalQueryJob(sql, job_config)
+
+    def close(self):
+        conn = getattr(_local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            _local.conn = None
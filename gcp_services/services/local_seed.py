@@ -0,0 +1,245 @@
+# Documentação: Dados sintéticos para o backend local do BigQuery.
+#
+# Gera as tabelas usadas pelas views (mesmos nomes e colunas do BigQuery) em
+# bancos SQLite, com volumes próximos aos de produção na escala 1.0. Os dados
+# são determinísticos para uma mesma semente, então benchmarks feitos em
+# máquinas diferentes leem exatamente o mesmo conteúdo.
+
+import random
+import sqlite3
+import time
+from datetime import date, timedelta
+
+from gcp_services.services import local_backend
+
+# Volumes na escala 1.0 (linhas por tabela).
+VOLUMES = {
+    'redes': 400,
+    'fornecedores': 6_000,
+    'produtos': 60_000,
+    'contratos': 2_500,
+    'produtos_por_contrato': 40,   # por subcontrato
+    'associados': 120,
+    'lojas_por_associado': 3,
+    'compra_agg': 1_500_000,
+    'apuracao_contrato': 600_000,
+    'venda_sumarizada': 800_000,
+}
+
+# Período coberto pelas tabelas de fatos.
+DIAS = 730
+
+SCHEMA = {
+    'gold': {
+        'dim_fornecedor': """
+            SEQREDE INTEGER, NOME_REDE TEXT, cnpj_completo TEXT,
+            NOMERAZAO TEXT, FANTASIA TEXT
+        """,
+        'dim_contrato': """
+            nrocontrato INTEGER, contrato INTEGER, subcontrato INTEGER,
+            nomecontrato TEXT, nomesubcontrato TEXT, seqrede INTEGER,
+            percdesconto REAL, vlrdescontofixo REAL,
+            dtainiciovalidade DATE, dtafimvalidade DATE
+        """,
+        'dim_produto': """
+            SEQPRODUTO INTEGER, DESCCOMPLETA TEXT
+        """,
+        'dim_produto_por_contrato': """
+            seqidentificador INTEGER, SEQPRODUTO INTEGER
+        """,
+        'obt_tb_compra_agg': """
+            data_emissao DATE, NomeAssociado TEXT, SeqProduto INTEGER,
+            CNPJ_fornecedor INTEGER, QtdCompra REAL, ValorCompraBruta REAL
+        """,
+        'obt_tb_apuracao_contrato': """
+            nomesubcontrato TEXT, data_emissao DATE, NomeAssociado TEXT,
+            Nome_Produto TEXT, Nome_Fornecedor TEXT, nro_nota_fiscal INTEGER,
+            tipo_nota_fiscal TEXT, QtdCompra REAL, valorbruto_comipi REAL
+        """,
+        'obt_tb_venda_sumarizada_prodcrm': """
+            dataVenda DATE, NomeAssociado TEXT, NomeLoja TEXT, Nome_Produto TEXT,
+            seqfamilia INTEGER, Nome_familia TEXT, Nome_Grupo TEXT, Nome_SubGrupo TEXT,
+            quantidadeItem REAL, valorAcrescimoItem REAL, valorDescontoItem REAL,
+            valorTotalItem REAL, qtdCupomDepartamento INTEGER
+        """,
+    },
+    'landing_saerj': {
+        'DIM_PRODUTOS': """
+            SEQPRODUTO INTEGER, DESCCOMPLETA TEXT, CODACESSO TEXT, MARCA TEXT
+        """,
+    },
+}
+
+# Índices equivalentes ao particionamento/clustering das tabelas no BigQuery.
+INDICES = {
+    'gold': [
+        'CREATE INDEX ix_compra_data ON obt_tb_compra_agg (data_emissao, SeqProduto)',
+        'CREATE INDEX ix_apuracao_contrato ON obt_tb_apuracao_contrato (nomesubcontrato, data_emissao)',
+        'CREATE INDEX ix_venda_data ON obt_tb_venda_sumarizada_prodcrm (dataVenda)',
+        'CREATE INDEX ix_fornecedor_rede ON dim_fornecedor (SEQREDE)',
+        'CREATE INDEX ix_contrato_sub ON dim_contrato (subcontrato)',
+        'CREATE INDEX ix_prod_contrato ON dim_produto_por_contrato (seqidentificador)',
+    ],
+    'landing_saerj': [],
+}
+
+_PALAVRAS_PRODUTO = (
+    'ARROZ', 'FEIJAO', 'ACUCAR', 'CAFE', 'LEITE', 'OLEO', 'MACARRAO', 'FARINHA',
+    'BISCOITO', 'SABAO', 'DETERGENTE', 'REFRIGERANTE', 'CERVEJA', 'SUCO', 'IOGURTE',
+    'QUEIJO', 'MANTEIGA', 'MARGARINA', 'SAL', 'MOLHO', 'ACHOCOLATADO', 'AMACIANTE',
+)
+_VARIANTES = ('TIPO 1', 'INTEGRAL', 'LIGHT', 'ZERO', 'TRADICIONAL', 'PREMIUM', 'NATURAL', 'ORIGINAL')
+_EMBALAGENS = ('1KG', '5KG', '500G', '1L', '2L', '350ML', '200G', '900ML', 'PCT 12UN')
+_MARCAS = ('UNIAO', 'CAMIL', 'PILAO', 'ITALAC', 'SADIA', 'NESTLE', 'YPE', 'OMO', 'COCA', 'AMBEV',
+           'PIRACANJUBA', 'VIGOR', 'LIZA', 'QUALY', 'TIO JOAO', 'KICALDO', 'DANONE', 'SEARA')
+_FAMILIAS = ('MERCEARIA', 'BEBIDAS', 'LATICINIOS', 'LIMPEZA', 'HIGIENE', 'FRIOS')
+
+
+def _cnpj(rng: random.Random) -> str:
+    # Sem zero à esquerda: CAST(CNPJ_fornecedor AS STRING) bate com cnpj_completo.
+    return str(rng.randint(10_000_000_000_000, 99_999_999_999_999))
+
+
+def _n(nome: str, escala: float) -> int:
+    return max(1, int(VOLUMES[nome] * escala))
+
+
+def _criar_tabelas(conn: sqlite3.Connection):
+    for dataset, tabelas in SCHEMA.items():
+        for tabela, colunas in tabelas.items():
+            conn.execute(f'DROP TABLE IF EXISTS {dataset}.{tabela}')
+            conn.execute(f'CREATE TABLE {dataset}.{tabela} ({colunas})')
+
+
+def _inserir(conn: sqlite3.Connection, tabela: str, linhas):
+    linhas = iter(linhas)
+    primeira = next(linhas, None)
+    if primeira is None:
+        return 0
+    marcadores = ', '.join('?' * len(primeira))
+    sql = f'INSERT INTO {tabela} VALUES ({marcadores})'
+    conn.execute(sql, primeira)
+    cursor = conn.executemany(sql, linhas)
+    return cursor.rowcount + 1
+
+
+def seed(escala: float = 1.0, semente: int = 42, log=print) -> dict:
+    """
+    Recria os bancos locais com dados sintéticos.
+
+    Args:
+        escala (float): Multiplicador dos volumes (1.0 ~ produção; 0.01 para testes rápidos).
+        semente (int): Semente do gerador aleatório (mesma semente, mesmos dados).
+        log (callable): Função para mensagens de progresso.
+
+    Returns:
+        Um dict tabela -> nº de linhas geradas.
+    """
+    rng = random.Random(semente)
+    local_backend.data_dir().mkdir(parents=True, exist_ok=True)
+    for dataset in local_backend.DATASETS:
+        local_backend.dataset_path(dataset).unlink(missing_ok=True)
+
+    conn = local_backend.connect(readonly=False)
+    for dataset in local_backend.DATASETS:
+        conn.execute(f'PRAGMA {dataset}.journal_mode = OFF')
+        conn.execute(f'PRAGMA {dataset}.synchronous = OFF')
+    _criar_tabelas(conn)
+
+    contagem = {}
+    hoje = date.today()
+    inicio_periodo = hoje - timedelta(days=DIAS)
+
+    def registrar(tabela, total):
+        contagem[tabela] = total
+        log(f"  {tabela}: {total} linhas")
+
+    # --- Fornecedores (redes com vários CNPJs) ---
+    n_redes = _n('redes', escala)
+    fornecedores = []
+    for i in range(_n('fornecedores', escala)):
+        rede = rng.randint(1, n_redes)
+        razao = f"{rng.choice(_MARCAS)} {rng.choice(('INDUSTRIA', 'COMERCIO', 'DISTRIBUIDORA'))} {i:05d} LTDA"
+        fornecedores.append((rede, f"REDE {rede:04d}", _cnpj(rng), razao, razao.split(' ')[0]))
+    registrar('dim_fornecedor', _inserir(conn, 'gold.dim_fornecedor', fornecedores))
+
+    # --- Produtos ---
+    produtos = []
+    for seq in range(1, _n('produtos', escala) + 1):
+        desc = f"{rng.choice(_PALAVRAS_PRODUTO)} {rng.choice(_MARCAS)} {rng.choice(_VARIANTES)} {rng.choice(_EMBALAGENS)}"
+        produtos.append((seq, desc, str(7890000000000 + seq), desc.split(' ')[1]))
+    registrar('DIM_PRODUTOS', _inserir(conn, 'landing_saerj.DIM_PRODUTOS', produtos))
+    registrar('dim_produto', _inserir(conn, 'gold.dim_produto', ((p[0], p[1]) for p in produtos)))
+
+    # --- Contratos ---
+    contratos = []
+    produtos_contrato = []
+    for sub in range(1, _n('contratos', escala) + 1):
+        nro = (sub - 1) // 5 + 1
+        ini = inicio_periodo + timedelta(days=rng.randint(0, DIAS - 90))
+        contratos.append((
+            nro, nro, sub, f"CONTRATO {nro:04d}", f"SUBCONTRATO {sub:05d}", rng.randint(1, n_redes),
+            rng.choice((2.0, 3.5, 5.0, 7.5, 10.0)), rng.choice((0.0, 0.0, 50.0, 100.0)),
+            ini.isoformat(), (ini + timedelta(days=rng.choice((90, 180, 365)))).isoformat(),
+        ))
+        for seq in rng.sample(range(1, len(produtos) + 1), min(len(produtos), VOLUMES['produtos_por_contrato'])):
+            produtos_contrato.append((sub, seq))
+    registrar('dim_contrato', _inserir(conn, 'gold.dim_contrato', contratos))
+    registrar('dim_produto_por_contrato', _inserir(conn, 'gold.dim_produto_por_contrato', produtos_contrato))
+
+    associados = [f"ASSOCIADO {i:03d}" for i in range(1, _n('associados', escala) + 1)]
+    # Poucos SKUs concentram a maior parte das compras, como na base real.
+    skus_populares = rng.sample(range(1, len(produtos) + 1), min(len(produtos), 2_000))
+    cnpjs = [int(f[2]) for f in fornecedores]
+
+    def dia():
+        return (inicio_periodo + timedelta(days=rng.randint(0, DIAS))).isoformat()
+
+    def sku():
+        return rng.choice(skus_populares) if rng.random() < 0.8 else rng.randint(1, len(produtos))
+
+    # --- Compras agregadas ---
+    def compras():
+        for _ in range(_n('compra_agg', escala)):
+            qtd = float(rng.randint(1, 200))
+            yield (dia(), rng.choice(associados), sku(), rng.choice(cnpjs), qtd, round(qtd * rng.uniform(2, 80), 2))
+    registrar('obt_tb_compra_agg', _inserir(conn, 'gold.obt_tb_compra_agg', compras()))
+
+    # --- Apuração de contrato (notas de entrada 'R' e devolução 'D') ---
+    def apuracoes():
+        for nota in range(_n('apuracao_contrato', escala)):
+            contrato = rng.choice(contratos)
+            produto = produtos[sku() - 1]
+            qtd = float(rng.randint(1, 100))
+            yield (
+                contrato[4], dia(), rng.choice(associados), produto[1], rng.choice(fornecedores)[3],
+                100_000 + nota // 4, 'R' if rng.random() < 0.93 else 'D', qtd, round(qtd * rng.uniform(2, 80), 2),
+            )
+    registrar('obt_tb_apuracao_contrato', _inserir(conn, 'gold.obt_tb_apuracao_contrato', apuracoes()))
+
+    # --- Venda sumarizada por produto/loja ---
+    def vendas():
+        for _ in range(_n('venda_sumarizada', escala)):
+            associado = rng.choice(associados)
+            produto = produtos[sku() - 1]
+            familia = rng.randrange(len(_FAMILIAS))
+            qtd = float(rng.randint(1, 500))
+            total = round(qtd * rng.uniform(2, 40), 2)
+            yield (
+                dia(), associado, f"{associado} LOJA {rng.randint(1, VOLUMES['lojas_por_associado'])}",
+                produto[1], familia + 1, _FAMILIAS[familia], _FAMILIAS[familia], produto[1].split(' ')[0],
+                qtd, round(total * rng.uniform(0, 0.02), 2), round(total * rng.uniform(0, 0.1), 2),
+                total, rng.randint(1, 300),
+            )
+    registrar('obt_tb_venda_sumarizada_prodcrm', _inserir(conn, 'gold.obt_tb_venda_sumarizada_prodcrm', vendas()))
+
+    inicio = time.monotonic()
+    for dataset, indices in INDICES.items():
+        for ddl in indices:
+            conn.execute(ddl.replace('CREATE INDEX ', f'CREATE INDEX {dataset}.', 1))
+    conn.commit()
+    for dataset in local_backend.DATASETS:
+        conn.execute(f'ANALYZE {dataset}')
+    conn.close()
+    log(f"  índices criados em {time.monotonic() - inicio:.1f}s")
+    return contagem
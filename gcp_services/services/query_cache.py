@@ -0,0 +1,153 @@
+# Documentação: Cache em memória (por processo) para resultados de consultas
+# do BigQuery. É opcional: só é usado quando quem chama o run_query informa
+# um cache_ttl. Cada entrada guarda as tabelas de origem da consulta para
+# permitir invalidação por nome de tabela.
+#
+# Uma entrada pode ter, além do TTL, uma janela "stale": depois de vencida
+# ela ainda pode ser servida (get_stale) enquanto uma atualização roda em
+# segundo plano (stale-while-revalidate).
+
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+FRESCO = 'fresco'
+VENCIDO = 'vencido'
+AUSENTE = 'ausente'
+
+# Captura o identificador logo após FROM/JOIN, com ou sem crases:
+#   `singular-ray-422121`.gold.dim_contrato
+#   `singular-ray-422121.gold.dim_fornecedor` f
+_TABLE_RE = re.compile(r'\b(?:FROM|JOIN)\s+([`\w.\-]+)', re.IGNORECASE)
+
+
+def normalize_sql(query: str) -> str:
+    """
+    Normaliza o SQL para uso como chave de cache: colapsa espaços em branco
+    e remove o ';' final. Não altera maiúsculas/minúsculas, pois literais
+    de texto são sensíveis a isso.
+    """
+    return ' '.join(query.split()).rstrip(';').strip()
+
+
+def extract_tables(query: str) -> set[str]:
+    """
+    Extrai os nomes das tabelas referenciadas em FROM/JOIN.
+
+    Retorna apenas o último segmento do nome, em minúsculas
+    (ex.: 'dim_contrato' para `singular-ray-422121`.gold.dim_contrato).
+    """
+    tables = set()
+    for match in _TABLE_RE.findall(query):
+        name = match.replace('`', '').strip('.')
+        if name:
+            tables.add(name.split('.')[-1].lower())
+    return tables
+
+
+def make_key(query: str, params=None) -> str:
+    """
+    Gera a chave de cache a partir do SQL normalizado e dos parâmetros.
+    """
+    raw = normalize_sql(query)
+    if params:
+        raw += '|' + repr(sorted(params.items()))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class QueryCache:
+    """
+    Cache LRU com TTL por entrada e índice reverso tabela -> chaves.
+
+    Thread-safe: as threads do gunicorn compartilham a mesma instância.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # chave -> (valor, expira_em, descartar_em, tabelas)
+        self._by_table = {}            # tabela -> set(chaves)
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        """
+        Retorna uma tupla (achou, valor). Entradas expiradas são descartadas.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            value, expires_at, discard_at, _ = entry
+            now = time.monotonic()
+            if expires_at <= now:
+                if discard_at <= now:
+                    self._remove(key)
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def get_stale(self, key: str):
+        """
+        Retorna uma tupla (estado, valor), com estado FRESCO, VENCIDO (passou
+        do TTL mas está dentro da janela stale) ou AUSENTE.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return AUSENTE, None
+            value, expires_at, discard_at, _ = entry
+            now = time.monotonic()
+            if discard_at <= now:
+                self._remove(key)
+                return AUSENTE, None
+            self._entries.move_to_end(key)
+            return (FRESCO if expires_at > now else VENCIDO), value
+
+    def set(self, key: str, value, ttl: float, tables=(), stale_ttl: float = 0):
+        """
+        Armazena um valor por 'ttl' segundos, associado às tabelas de origem.
+        Com 'stale_ttl', a entrada continua disponível para get_stale por
+        mais esse número de segundos depois de vencida.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            expires_at = time.monotonic() + ttl
+            self._entries[key] = (value, expires_at, expires_at + (stale_ttl or 0), frozenset(tables))
+            for table in tables:
+                self._by_table.setdefault(table, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+
+    def invalidate_tables(self, *tables: str) -> int:
+        """
+        Remove todas as entradas que leem qualquer uma das tabelas informadas.
+        Retorna o número de entradas removidas.
+        """
+        removed = 0
+        with self._lock:
+            for table in tables:
+                for key in list(self._by_table.get(table.lower(), ())):
+                    self._remove(key)
+                    removed += 1
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_table.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, key: str):
+        # Deve ser chamado com o lock adquirido.
+        _, _, _, tables = self._entries.pop(key)
+        for table in tables:
+            keys = self._by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[table]
@@ -0,0 +1,121 @@
+# Documentação: Consultas parametrizadas para o BigQuery.
+#
+# Em vez de montar o SQL com f-strings (o que muda o texto a cada chamada,
+# impede o cache de resultados do próprio BigQuery e abre espaço para SQL
+# injection), as views descrevem a consulta com marcadores @nome e passam
+# os valores separadamente:
+#
+#     Query(
+#         f"SELECT ... FROM {OBT_COMPRA_AGG} WHERE SeqProduto IN UNNEST(@skus)",
+#         {'skus': [123, 456]},
+#     )
+#
+# O tipo do parâmetro é inferido do valor Python. Quando não der para inferir
+# (ex.: lista vazia), use Typed('INT64', []).
+
+import re
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, NamedTuple
+
+from google.cloud import bigquery
+
+PROJETO = 'singular-ray-422121'
+
+# Tabelas usadas pela aplicação (já com crases, prontas para o FROM).
+DIM_CONTRATO = f'`{PROJETO}.gold.dim_contrato`'
+DIM_FORNECEDOR = f'`{PROJETO}.gold.dim_fornecedor`'
+DIM_PRODUTO = f'`{PROJETO}.gold.dim_produto`'
+DIM_PRODUTO_POR_CONTRATO = f'`{PROJETO}.gold.dim_produto_por_contrato`'
+DIM_PRODUTOS = f'`{PROJETO}.landing_saerj.DIM_PRODUTOS`'
+OBT_COMPRA_AGG = f'`{PROJETO}.gold.obt_tb_compra_agg`'
+OBT_APURACAO_CONTRATO = f'`{PROJETO}.gold.obt_tb_apuracao_contrato`'
+OBT_VENDA_SUMARIZADA = f'`{PROJETO}.gold.obt_tb_venda_sumarizada_prodcrm`'
+
+
+_PARAM_RE = re.compile(r'@(\w+)')
+
+
+class Typed(NamedTuple):
+    """
+    Valor com tipo BigQuery explícito. Se 'value' for uma lista, gera um
+    parâmetro de array com elementos do tipo informado.
+    """
+    type: str
+    value: Any
+
+
+def _infer_type(value) -> str:
+    # bool precisa vir antes de int (bool é subclasse de int em Python).
+    if isinstance(value, bool):
+        return 'BOOL'
+    if isinstance(value, int):
+        return 'INT64'
+    if isinstance(value, float):
+        return 'FLOAT64'
+    if isinstance(value, Decimal):
+        return 'NUMERIC'
+    if isinstance(value, datetime):
+        return 'TIMESTAMP' if value.tzinfo else 'DATETIME'
+    if isinstance(value, date):
+        return 'DATE'
+    if isinstance(value, str):
+        return 'STRING'
+    raise TypeError(f"Não foi possível inferir o tipo BigQuery de {value!r}. Use Typed(...).")
+
+
+def build_parameter(name: str, value):
+    """
+    Converte um valor Python em ScalarQueryParameter ou ArrayQueryParameter.
+    """
+    if isinstance(value, (bigquery.ScalarQueryParameter, bigquery.ArrayQueryParameter)):
+        return value
+
+    if isinstance(value, Typed):
+        if isinstance(value.value, (list, tuple, set)):
+            return bigquery.ArrayQueryParameter(name, value.type, list(value.value))
+        return bigquery.ScalarQueryParameter(name, value.type, value.value)
+
+    if isinstance(value, (list, tuple, set)):
+        values = list(value)
+        if not values:
+            raise ValueError(f"Lista vazia no parâmetro '{name}': informe o tipo com Typed(tipo, []).")
+        return bigquery.ArrayQueryParameter(name, _infer_type(values[0]), values)
+
+    if value is None:
+        raise ValueError(f"Parâmetro '{name}' é None: informe o tipo com Typed(tipo, None).")
+
+    return bigquery.ScalarQueryParameter(name, _infer_type(value), value)
+
+
+@dataclass(frozen=True)
+class Query:
+    """
+    Consulta parametrizada: o SQL (com marcadores @nome) e os valores.
+    """
+    sql: str
+    params: dict = field(default_factory=dict)
+
+    def query_parameters(self) -> list:
+        # Envia só os parâmetros que o SQL usa: assim um mesmo dict de
+        # parâmetros pode ser compartilhado por várias consultas.
+        used = set(_PARAM_RE.findall(self.sql))
+        return [build_parameter(name, value) for name, value in self.params.items() if name in used]
+
+    def job_config(self, **kwargs) -> bigquery.QueryJobConfig:
+        return bigquery.QueryJobConfig(query_parameters=self.query_parameters(), **kwargs)
+
+
+def split_query(query) -> tuple[str, dict]:
+    """
+    Aceita str ou Query e devolve (sql, params).
+    """
+    if isinstance(query, Query):
+        return query.sql, query.params
+    return query, {}
+
+
+def like(termo: str) -> str:
+    """Monta o padrão '%termo%' para LIKE, com o termo como parâmetro."""
+    return f'%{termo}%'
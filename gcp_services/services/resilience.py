@@ -0,0 +1,99 @@
+# Documentação: Circuit breaker para chamadas a serviços externos (BigQuery).
+#
+# Depois de 'failure_threshold' falhas seguidas, o circuito "abre" e as
+# chamadas seguintes falham na hora com CircuitOpenError, sem ocupar uma
+# thread do gunicorn esperando um serviço degradado. Passados 'reset_timeout'
+# segundos, uma única chamada de teste é liberada (meio-aberto): se der certo
+# o circuito fecha, se falhar ele abre de novo.
+
+import threading
+import time
+
+FECHADO = 'fechado'
+ABERTO = 'aberto'
+MEIO_ABERTO = 'meio_aberto'
+
+
+class CircuitOpenError(Exception):
+    """O circuito está aberto: a chamada nem foi tentada."""
+
+    def __init__(self, name: str, retry_in: float):
+        self.retry_in = retry_in
+        super().__init__(
+            f"Serviço '{name}' indisponível no momento (muitas falhas seguidas). "
+            f"Nova tentativa em {retry_in:.0f}s."
+        )
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker thread-safe.
+
+    Uso:
+        breaker.before_call()      # levanta CircuitOpenError se aberto
+        try:
+            ...
+        except Exception:
+            breaker.record_failure()
+            raise
+        breaker.record_success()
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = FECHADO
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        # Deve ser chamado com o lock adquirido.
+        if self._state == ABERTO and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = MEIO_ABERTO
+            self._probe_in_flight = False
+        return self._state
+
+    def before_call(self):
+        """
+        Levanta CircuitOpenError se a chamada não deve ser feita agora.
+        No estado meio-aberto, só uma chamada de teste passa por vez.
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == FECHADO:
+                return
+            if state == MEIO_ABERTO and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+        raise CircuitOpenError(self.name, retry_in)
+
+    def record_success(self):
+        with self._lock:
+            self._state = FECHADO
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            # Já aberto: falhas atrasadas de chamadas que estavam em andamento
+            # não adiam a chamada de teste (_opened_at só muda ao abrir).
+            if self._state == ABERTO:
+                return
+            if self._state == MEIO_ABERTO or self._failures >= self.failure_threshold:
+                print(f"Circuit breaker '{self.name}' aberto após {self._failures} falha(s).")
+                self._state = ABERTO
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def reset(self):
+        self.record_success()
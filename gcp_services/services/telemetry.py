@@ -0,0 +1,119 @@
+# Documentação: Telemetria em memória (por processo) das consultas.
+#
+# Cada consulta ao BigQuery, consulta ao Postgres e busca no cache de
+# resultados vira um evento num buffer circular (os mais antigos são
+# descartados). Os eventos são marcados com a view que os originou, que o
+# TelemetryMiddleware guarda num ContextVar no início de cada requisição.
+#
+# Os dados podem ser consultados por superusuários em /gcp/telemetria/.
+
+import re
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from django.conf import settings
+
+_current_view = ContextVar('telemetria_view', default=None)
+
+_events = deque(maxlen=getattr(settings, 'TELEMETRIA_MAX_EVENTOS', 5000))
+_lock = threading.Lock()
+
+# Labels de job do BigQuery: até 63 caracteres, minúsculas, dígitos, '_' e '-'.
+_LABEL_INVALIDO_RE = re.compile(r'[^a-z0-9_-]')
+
+
+def set_view(name: str):
+    """
+    Define a view corrente (para o contexto atual). Retorna o token para
+    reset_view.
+    """
+    return _current_view.set(name)
+
+
+def reset_view(token):
+    _current_view.reset(token)
+
+
+def current_view() -> str | None:
+    return _current_view.get()
+
+
+def job_labels() -> dict:
+    """
+    Labels para os jobs do BigQuery, com a view que disparou a consulta.
+    Assim o custo também aparece agrupado por view no INFORMATION_SCHEMA.JOBS.
+    """
+    view = current_view()
+    if not view:
+        return {}
+    return {'view': _LABEL_INVALIDO_RE.sub('_', view.lower())[:63]}
+
+
+def record(kind: str, **fields):
+    """
+    Registra um evento no buffer.
+
+    Args:
+        kind (str): Origem do evento: 'bigquery', 'postgres', 'cache' ou 'request'.
+        **fields: Dados do evento (elapsed_ms, bytes_processed, cache_hit, ...).
+    """
+    event = {'ts': time.time(), 'kind': kind, 'view': current_view(), **fields}
+    with _lock:
+        _events.append(event)
+
+
+def snapshot(kind: str | None = None, view: str | None = None) -> list[dict]:
+    """
+    Retorna uma cópia dos eventos do buffer, opcionalmente filtrados.
+    """
+    with _lock:
+        events = list(_events)
+    if kind:
+        events = [e for e in events if e['kind'] == kind]
+    if view:
+        events = [e for e in events if e['view'] == view]
+    return events
+
+
+def summary(events: list[dict] | None = None) -> list[dict]:
+    """
+    Agrega os eventos por (view, kind): quantidade, tempo total e máximo,
+    bytes processados/cobrados, acertos de cache e slot-ms.
+    Ordenado pelo tempo total, do maior para o menor.
+    """
+    if events is None:
+        events = snapshot()
+
+    totais = {}
+    for e in events:
+        chave = (e['view'], e['kind'])
+        t = totais.setdefault(chave, {
+            'view': e['view'],
+            'kind': e['kind'],
+            'count': 0,
+            'errors': 0,
+            'elapsed_ms_total': 0.0,
+            'elapsed_ms_max': 0.0,
+            'bytes_processed': 0,
+            'bytes_billed': 0,
+            'cache_hits': 0,
+            'slot_ms': 0,
+        })
+        elapsed = e.get('elapsed_ms') or 0.0
+        t['count'] += 1
+        t['errors'] += 1 if e.get('error') else 0
+        t['elapsed_ms_total'] += elapsed
+        t['elapsed_ms_max'] = max(t['elapsed_ms_max'], elapsed)
+        t['bytes_processed'] += e.get('bytes_processed') or 0
+        t['bytes_billed'] += e.get('bytes_billed') or 0
+        t['cache_hits'] += 1 if e.get('cache_hit') else 0
+        t['slot_ms'] += e.get('slot_ms') or 0
+
+    return sorted(totais.values(), key=lambda t: t['elapsed_ms_total'], reverse=True)
+
+
+def clear():
+    with _lock:
+        _events.clear()
@@ -1,3 +1,206 @@
-from django.test import TestCase
+import io
+from contextlib import redirect_stdout
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from .services import bigquery_client
+from .services.query_cache import AUSENTE, FRESCO, VENCIDO, QueryCache, extract_tables, make_key
+from .services.resilience import ABERTO, FECHADO, MEIO_ABERTO, CircuitBreaker, CircuitOpenError
+
+
+class Relogio:
+    """Substitui o módulo time de um serviço: o tempo só anda com avancar()."""
+
+    def __init__(self):
+        self.agora = 1000.0
+
+    def monotonic(self):
+        return self.agora
+
+    def avancar(self, segundos):
+        self.agora += segundos
+
+
+class QueryCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.relogio = Relogio()
+        patcher = mock.patch('gcp_services.services.query_cache.time', self.relogio)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = QueryCache(max_entries=2)
+
+    def test_entrada_vence_no_ttl(self):
+        self.cache.set('a', [1], ttl=60)
+        self.relogio.avancar(59)
+        self.assertEqual(self.cache.get('a'), (True, [1]))
+        self.relogio.avancar(1)
+        self.assertEqual(self.cache.get('a'), (False, None))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_descarta_a_menos_usada(self):
+        self.cache.set('a', 1, ttl=60)
+        self.cache.set('b', 2, ttl=60)
+        self.cache.get('a')
+        self.cache.set('c', 3, ttl=60)
+        self.assertEqual(self.cache.get('b'), (False, None))
+        self.assertEqual(self.cache.get('a'), (True, 1))
+
+    def test_invalida_por_tabela(self):
+        self.cache.set('a', 1, ttl=60, tables={'dim_contrato'})
+        self.cache.set('b', 2, ttl=60, tables={'dim_fornecedor'})
+        self.assertEqual(self.cache.invalidate_tables('DIM_CONTRATO'), 1)
+        self.assertEqual(self.cache.get('a'), (False, None))
+        self.assertEqual(self.cache.get('b'), (True, 2))
+
+    def test_chave_e_tabelas(self):
+        self.assertEqual(make_key('SELECT 1  ;'), make_key('SELECT   1'))
+        self.assertNotEqual(make_key('SELECT @a', {'a': 1}), make_key('SELECT @a', {'a': 2}))
+        self.assertEqual(
+            extract_tables('SELECT * FROM `p`.gold.dim_contrato c JOIN `p.gold.dim_fornecedor` f ON 1=1'),
+            {'dim_contrato', 'dim_fornecedor'},
+        )
+
+
+class RunQueryCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.relogio = Relogio()
+        self.execucoes = 0
+
+        def executar(query, **kwargs):
+            self.execucoes += 1
+            return bigquery_client.QueryResult(rows=[{'n': self.execucoes}])
+
+        for alvo, valor in (
+            ('gcp_services.services.query_cache.time', self.relogio),
+            ('gcp_services.services.bigquery_client._cache', QueryCache()),
+            ('gcp_services.services.bigquery_client._execute_coalesced', executar),
+            # Atualização em segundo plano na própria thread do teste.
+            ('gcp_services.services.bigquery_client._executor', SimpleNamespace(submit=lambda f, *a: f(*a))),
+        ):
+            patcher = mock.patch(alvo, valor)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_reaproveita_ate_vencer(self):
+        self.assertEqual(bigquery_client.execute('SELECT 1', cache_ttl=60), [{'n': 1}])
+        self.assertEqual(bigquery_client.execute('SELECT  1;', cache_ttl=60), [{'n': 1}])
+        self.relogio.avancar(60)
+        self.assertEqual(bigquery_client.execute('SELECT 1', cache_ttl=60), [{'n': 2}])
+
+    def test_sem_ttl_nao_usa_cache(self):
+        bigquery_client.execute('SELECT 1')
+        bigquery_client.execute('SELECT 1')
+        self.assertEqual(self.execucoes, 2)
+
+    def test_vencido_e_servido_enquanto_atualiza(self):
+        bigquery_client.execute('SELECT 1', cache_ttl=60, stale_ttl=300)
+        self.relogio.avancar(90)
+        # Devolve o valor antigo na hora; a atualização grava o novo.
+        self.assertEqual(bigquery_client.execute('SELECT 1', cache_ttl=60, stale_ttl=300), [{'n': 1}])
+        self.assertEqual(bigquery_client.execute('SELECT 1', cache_ttl=60, stale_ttl=300), [{'n': 2}])
+        self.assertEqual(self.execucoes, 2)
+
+    def test_fora_da_janela_stale_espera_a_consulta(self):
+        bigquery_client.execute('SELECT 1', cache_ttl=60, stale_ttl=300)
+        self.relogio.avancar(360)
+        self.assertEqual(bigquery_client.execute('SELECT 1', cache_ttl=60, stale_ttl=300), [{'n': 2}])
+
+    def test_falha_na_atualizacao_mantem_o_valor_antigo(self):
+        bigquery_client.execute('SELECT 1', cache_ttl=60, stale_ttl=300)
+        self.relogio.avancar(90)
+        with mock.patch('gcp_services.services.bigquery_client._execute_coalesced',
+                        side_effect=CircuitOpenError('bigquery', 30)):
+            self.assertEqual(bigquery_client.execute('SELECT 1', cache_ttl=60, stale_ttl=300), [{'n': 1}])
+            self.assertEqual(bigquery_client.execute('SELECT 1', cache_ttl=60, stale_ttl=300), [{'n': 1}])
+
+
+class QueryCacheStaleTests(SimpleTestCase):
+
+    def setUp(self):
+        self.relogio = Relogio()
+        patcher = mock.patch('gcp_services.services.query_cache.time', self.relogio)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = QueryCache()
+
+    def test_estados(self):
+        self.assertEqual(self.cache.get_stale('a'), (AUSENTE, None))
+        self.cache.set('a', 1, ttl=60, stale_ttl=120)
+        self.assertEqual(self.cache.get_stale('a'), (FRESCO, 1))
+        self.relogio.avancar(60)
+        self.assertEqual(self.cache.get_stale('a'), (VENCIDO, 1))
+        # Vencida, a entrada não sai no get() comum, mas continua guardada.
+        self.assertEqual(self.cache.get('a'), (False, None))
+        self.assertEqual(self.cache.get_stale('a'), (VENCIDO, 1))
+        self.relogio.avancar(120)
+        self.assertEqual(self.cache.get_stale('a'), (AUSENTE, None))
+        self.assertEqual(len(self.cache), 0)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+
+    def setUp(self):
+        self.relogio = Relogio()
+        patcher = mock.patch('gcp_services.services.resilience.time', self.relogio)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker('teste', failure_threshold=3, reset_timeout=30)
+
+    def falhar(self, vezes=1):
+        for _ in range(vezes):
+            self.breaker.before_call()
+            self.breaker.record_failure()
+
+    def abrir(self):
+        with redirect_stdout(io.StringIO()):
+            self.falhar(3)
+
+    def test_abre_depois_de_falhas_seguidas(self):
+        self.falhar(2)
+        self.assertEqual(self.breaker.state, FECHADO)
+        with redirect_stdout(io.StringIO()):
+            self.falhar()
+        self.assertEqual(self.breaker.state, ABERTO)
+        with self.assertRaises(CircuitOpenError) as erro:
+            self.breaker.before_call()
+        self.assertEqual(erro.exception.retry_in, 30)
+
+    def test_sucesso_zera_as_falhas(self):
+        self.falhar(2)
+        self.breaker.record_success()
+        self.falhar(2)
+        self.assertEqual(self.breaker.state, FECHADO)
+
+    def test_meio_aberto_libera_uma_chamada_de_teste(self):
+        self.abrir()
+        self.relogio.avancar(30)
+        self.assertEqual(self.breaker.state, MEIO_ABERTO)
+        self.breaker.before_call()
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, FECHADO)
+        self.breaker.before_call()
+
+    def test_chamada_de_teste_com_falha_reabre(self):
+        self.abrir()
+        self.relogio.avancar(30)
+        with redirect_stdout(io.StringIO()):
+            self.falhar()
+        self.assertEqual(self.breaker.state, ABERTO)
+        self.relogio.avancar(29)
+        self.assertEqual(self.breaker.state, ABERTO)
+        self.relogio.avancar(1)
+        self.assertEqual(self.breaker.state, MEIO_ABERTO)
+
+    def test_falha_atrasada_nao_adia_a_chamada_de_teste(self):
+        self.abrir()
+        self.relogio.avancar(20)
+        # Chamada que começou antes de abrir e falhou depois.
+        self.breaker.record_failure()
+        self.relogio.avancar(10)
+        self.assertEqual(self.breaker.state, MEIO_ABERTO)
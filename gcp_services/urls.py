@@ -0,0 +1,9 @@
+from django.urls import path
+from . import views
+
+app_name = 'gcp_services'
+
+urlpatterns = [
+    path('telemetria/', views.telemetria, name='telemetria'),
+    path('telemetria/limpar/', views.limpar_telemetria, name='telemetria-limpar'),
+]
@@ -1,3 +1,41 @@
-from django.shortcuts import render
+from django.http import JsonResponse
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_GET, require_POST
 
-# Create your views here.
+from gcp_services.services import bigquery_client, telemetry
+
+
+@gzip_page
+@require_GET
+def telemetria(request):
+    """
+    Exporta a telemetria das consultas (BigQuery, Postgres e cache) deste
+    processo: o resumo por view e os eventos brutos do buffer.
+
+    Filtros opcionais via GET: ?kind=bigquery, ?view=apuracao_grade:api-dashboard.
+    Para esvaziar o buffer, ver limpar_telemetria.
+    """
+    if not request.user.is_superuser:
+        return JsonResponse({'status': 'erro', 'msg': 'Apenas admin pode fazer isso.'}, status=403)
+
+    eventos = telemetry.snapshot(kind=request.GET.get('kind'), view=request.GET.get('view'))
+    resposta = {
+        'status': 'ok',
+        'circuito_bigquery': bigquery_client.circuit_state(),
+        'resumo': telemetry.summary(eventos),
+        'eventos': eventos,
+    }
+    return JsonResponse(resposta)
+
+
+@require_POST
+def limpar_telemetria(request):
+    """
+    Esvazia o buffer de telemetria deste processo. Só via POST (com CSRF):
+    um GET repetido ou pré-carregado pelo navegador não apaga nada.
+    """
+    if not request.user.is_superuser:
+        return JsonResponse({'status': 'erro', 'msg': 'Apenas admin pode fazer isso.'}, status=403)
+
+    telemetry.clear()
+    return JsonResponse({'status': 'ok'})
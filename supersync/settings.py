@@ -40,6 +40,73 @@ else:
     GOOGLE_APPLICATION_CREDENTIALS = None 
     print("☁️ Modo Nuvem: Usando autenticação nativa do Google Cloud (ADC).")
 
+# --- BIGQUERY ---
+# Tamanho do pool de conexões HTTP (keep-alive) do cliente BigQuery compartilhado.
+# Deve ser >= número de threads do gunicorn (ver Dockerfile).
+BIGQUERY_HTTP_POOL_SIZE = int(os.getenv('BIGQUERY_HTTP_POOL_SIZE', '16'))
+
+# Nº de consultas simultâneas que o run_queries pode esperar ao mesmo tempo.
+BIGQUERY_MAX_WORKERS = int(os.getenv('BIGQUERY_MAX_WORKERS', '8'))
+
+# 'bigquery' (padrão) ou 'local': SQLite embutido com dados sintéticos, para
+# benchmarks e testes offline. Gere os dados com 'manage.py popular_bigquery_local'.
+BIGQUERY_BACKEND = os.getenv('BIGQUERY_BACKEND', 'bigquery')
+BIGQUERY_LOCAL_DIR = os.getenv('BIGQUERY_LOCAL_DIR', os.path.join(BASE_DIR, 'bigquery_local'))
+
+# Timeouts das consultas (segundos): telas interativas e padrão das demais.
+BIGQUERY_TIMEOUT_INTERATIVO = int(os.getenv('BIGQUERY_TIMEOUT_INTERATIVO', '20'))
+BIGQUERY_TIMEOUT_PADRAO = int(os.getenv('BIGQUERY_TIMEOUT_PADRAO', '120'))
+
+# Circuit breaker: nº de falhas seguidas para abrir e segundos até tentar de novo.
+BIGQUERY_CIRCUITO_FALHAS = int(os.getenv('BIGQUERY_CIRCUITO_FALHAS', '5'))
+BIGQUERY_CIRCUITO_ESPERA = int(os.getenv('BIGQUERY_CIRCUITO_ESPERA', '30'))
+
+# Orçamento de bytes por consulta (maximum_bytes_billed). Vazio = sem limite global.
+# BIGQUERY_MAX_BYTES_INTERATIVO é o limite usado pelas telas interativas
+# (apuração de contrato, dashboard da grade), checado via dry-run antes de rodar.
+BIGQUERY_MAX_BYTES_BILLED = int(os.getenv('BIGQUERY_MAX_BYTES_BILLED', '0')) or None
+BIGQUERY_MAX_BYTES_INTERATIVO = int(os.getenv('BIGQUERY_MAX_BYTES_INTERATIVO', str(20 * 1024 ** 3)))
+
+# Snapshot da apuração da grade (Postgres): intervalo mínimo entre atualizações
+# de uma grade em andamento (segundos) e dias de carência após o fim do evento
+# até a grade ser considerada encerrada (sem novas consultas ao BigQuery).
+APURACAO_SNAPSHOT_INTERVALO = int(os.getenv('APURACAO_SNAPSHOT_INTERVALO', str(15 * 60)))
+APURACAO_SNAPSHOT_DIAS_CARENCIA = int(os.getenv('APURACAO_SNAPSHOT_DIAS_CARENCIA', '7'))
+
+# Threads do comando 'aquecer_dashboards' (snapshots atualizados em paralelo).
+# Cada uma ocupa uma conexão com o banco e um job no BigQuery.
+APURACAO_AQUECIMENTO_WORKERS = int(os.getenv('APURACAO_AQUECIMENTO_WORKERS', '4'))
+
+# Espelho local de gold.dim_fornecedor (comando 'sincronizar_fornecedores'):
+# intervalo, em segundos, para cada processo conferir se houve nova
+# sincronização e recarregar o índice em memória.
+FORNECEDOR_INDICE_VERIFICAR = int(os.getenv('FORNECEDOR_INDICE_VERIFICAR', '60'))
+
+# Idem para o espelho de landing_saerj.DIM_PRODUTOS (comando 'sincronizar_produtos').
+PRODUTO_INDICE_VERIFICAR = int(os.getenv('PRODUTO_INDICE_VERIFICAR', '60'))
+
+# Tempo (segundos) em que o navegador reaproveita uma resposta do autocomplete
+# de produtos/fornecedores servida pelos espelhos, antes de revalidar pelo ETag.
+AUTOCOMPLETE_MAX_AGE = int(os.getenv('AUTOCOMPLETE_MAX_AGE', '300'))
+
+# Atualização da distribuição em segundo plano: uma execução ativa sem
+# atualização há mais que isso (segundos) é dada como interrompida.
+DISTRIBUICAO_JOB_EXPIRA = int(os.getenv('DISTRIBUICAO_JOB_EXPIRA', str(60 * 60)))
+# Sugestão de distribuição: média da participação nos últimos N trimestres
+# apurados (1 = só o trimestre vigente).
+DISTRIBUICAO_TRIMESTRES_SUGESTAO = int(os.getenv('DISTRIBUICAO_TRIMESTRES_SUGESTAO', '1'))
+
+# Telemetria das consultas (buffer circular em memória, por processo).
+TELEMETRIA_MAX_EVENTOS = int(os.getenv('TELEMETRIA_MAX_EVENTOS', '5000'))
+
+# Cache de resultados do run_query (opcional, por chamada): nº máximo de
+# entradas (LRU) e TTL padrão para tabelas de dimensão.
+BIGQUERY_CACHE_MAX_ENTRIES = int(os.getenv('BIGQUERY_CACHE_MAX_ENTRIES', '256'))
+BIGQUERY_CACHE_TTL_DIMENSAO = int(os.getenv('BIGQUERY_CACHE_TTL_DIMENSAO', str(6 * 60 * 60)))
+# Janela stale-while-revalidate: depois do TTL, o resultado antigo ainda é
+# servido por até esse tempo enquanto uma atualização roda em segundo plano.
+BIGQUERY_CACHE_STALE_DIMENSAO = int(os.getenv('BIGQUERY_CACHE_STALE_DIMENSAO', str(24 * 60 * 60)))
+
 
 
 # Quick-start development settings - unsuitable for production
@@ -89,6 +156,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'gcp_services.middleware.TelemetryMiddleware',
 ]
 
 ROOT_URLCONF = 'supersync.urls'
@@ -150,6 +218,11 @@ else:
             }
         }
 
+# Banco de testes criado direto dos models, sem rodar as migrações: a cadeia
+# de 'usuarios' pressupõe a tabela sync_usuario já existente (criada fora das
+# migrações), e não roda num banco vazio.
+DATABASES['default']['TEST'] = {'MIGRATE': False}
+
 
 IS_CLOUD_RUN = os.getenv('K_SERVICE') is not None
 
@@ -28,4 +28,5 @@ urlpatterns = [
     # Redireciona a URL raiz para a página de login
     path('', RedirectView.as_view(url='/accounts/login/', permanent=False)),
     path('usuarios/', include('usuarios.urls')),
+    path('gcp/', include('gcp_services.urls')),
 ]
@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'supersync.settings')
 
 application = get_wsgi_application()
+
+# Índices de busca dos espelhos (fornecedores e produtos): construídos em
+# segundo plano na subida, e não na primeira busca de cada processo.
+from contratos import fornecedor_service, produto_service  # noqa: E402
+
+fornecedor_service.aquecer()
+produto_service.aquecer()
@@ -0,0 +1,123 @@
+"""
+Carga em lote de DataFrames em tabelas do Postgres, trocando o conteúdo de
+forma atômica.
+
+Em vez de DataFrame.to_sql(if_exists='replace') (DROP + CREATE + INSERTs um a
+um, com a tabela ausente ou vazia no meio do caminho), substituir_tabelas():
+  1. cria uma tabela de staging com o esquema do DataFrame (o mesmo que o
+     to_sql criaria);
+  2. envia as linhas com COPY ... FROM STDIN, em blocos de CSV;
+  3. recria na staging os índices que a tabela atual tem;
+  4. troca os nomes (atual -> antiga, staging -> atual), descarta a antiga e
+     roda ANALYZE.
+
+Tudo numa transação só: quem lê a tabela durante a carga vê o conteúdo
+anterior até o COMMIT, e depois o novo. Nunca uma tabela vazia ou ausente.
+Em outros bancos (ex.: SQLite no desenvolvimento), cai no to_sql de antes.
+"""
+import io
+import re
+from typing import Dict
+
+import pandas as pd
+
+# Linhas por bloco de CSV enviado no COPY.
+LINHAS_POR_BLOCO = 50_000
+
+_SUFIXO_STAGING = '__nova'
+_SUFIXO_ANTIGA = '__antiga'
+
+# Nome com ou sem aspas (com aspas pode ter espaços e "" escapado).
+_NOME = r'("(?:[^"]|"")+"|\S+)'
+_INDICE_RE = re.compile(rf'^(CREATE (?:UNIQUE )?INDEX ){_NOME}( ON (?:ONLY )?){_NOME}( .*)$', re.DOTALL)
+
+
+def _ident(nome: str) -> str:
+    return '"' + nome.replace('"', '""') + '"'
+
+
+def indice_para_staging(indexdef: str, staging: str) -> tuple[str, str]:
+    """
+    Reescreve a definição de um índice (pg_indexes.indexdef) para a tabela de
+    staging, com o nome do índice + '__nova' (nomes de índice são únicos no
+    schema).
+
+    Returns:
+        Uma tupla (sql, nome do índice novo).
+    """
+    m = _INDICE_RE.match(indexdef)
+    if m is None:
+        raise ValueError(f"Definição de índice não reconhecida: {indexdef}")
+    criar, nome, on, _, resto = m.groups()
+    if nome.startswith('"'):
+        nome = nome[1:-1].replace('""', '"')
+    novo = nome + _SUFIXO_STAGING
+    return f"{criar}{_ident(novo)}{on}{_ident(staging)}{resto}", novo
+
+
+def _copiar(cursor, df: pd.DataFrame, tabela: str):
+    colunas = ', '.join(_ident(str(c)) for c in df.columns)
+    # NaN/None saem como \N (NULL, como no to_sql); campo vazio é texto vazio.
+    sql = f"COPY {_ident(tabela)} ({colunas}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+    for inicio in range(0, len(df), LINHAS_POR_BLOCO):
+        buf = io.StringIO()
+        df.iloc[inicio:inicio + LINHAS_POR_BLOCO].to_csv(buf, index=False, header=False, na_rep='\\N')
+        buf.seek(0)
+        cursor.copy_expert(sql, buf)
+
+
+def substituir_tabelas(engine, tabelas: Dict[str, pd.DataFrame]) -> None:
+    """
+    Substitui o conteúdo das tabelas pelos DataFrames, numa única transação.
+
+    Args:
+        engine: Engine SQLAlchemy do banco de destino.
+        tabelas (dict): Nome da tabela -> DataFrame (colunas já com os nomes
+            finais). O esquema da tabela segue o DataFrame, como no to_sql.
+    """
+    if engine.dialect.name != 'postgresql':
+        for tabela, df in tabelas.items():
+            df.to_sql(tabela, con=engine, index=False, if_exists='replace')
+        return
+
+    conexao = engine.raw_connection()
+    try:
+        cursor = conexao.cursor()
+        trocas = []
+        for tabela, df in tabelas.items():
+            staging = tabela + _SUFIXO_STAGING
+            cursor.execute(f"DROP TABLE IF EXISTS {_ident(staging)}")
+            cursor.execute(pd.io.sql.get_schema(df, staging, con=engine))
+            _copiar(cursor, df, staging)
+
+            # Índices da tabela atual, criados depois da carga (mais rápido
+            # que manter o índice durante o COPY).
+            cursor.execute(
+                "SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s",
+                (tabela,),
+            )
+            indices = []
+            for (indexdef,) in cursor.fetchall():
+                sql, novo = indice_para_staging(indexdef, staging)
+                cursor.execute(sql)
+                indices.append(novo)
+            trocas.append((tabela, staging, indices))
+
+        # Troca: os bloqueios das tabelas atuais só duram daqui até o COMMIT.
+        for tabela, staging, indices in trocas:
+            antiga = tabela + _SUFIXO_ANTIGA
+            cursor.execute(f"DROP TABLE IF EXISTS {_ident(antiga)}")
+            cursor.execute(f"ALTER TABLE IF EXISTS {_ident(tabela)} RENAME TO {_ident(antiga)}")
+            cursor.execute(f"ALTER TABLE {_ident(staging)} RENAME TO {_ident(tabela)}")
+            cursor.execute(f"DROP TABLE IF EXISTS {_ident(antiga)}")
+            for novo in indices:
+                cursor.execute(
+                    f"ALTER INDEX {_ident(novo)} RENAME TO {_ident(novo[:-len(_SUFIXO_STAGING)])}"
+                )
+            cursor.execute(f"ANALYZE {_ident(tabela)}")
+        conexao.commit()
+    except Exception:
+        conexao.rollback()
+        raise
+    finally:
+        conexao.close()
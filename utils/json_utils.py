@@ -0,0 +1,61 @@
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+
+try:
+    # O orjson (requirements.txt) serializa listas grandes bem mais rápido que o
+    # json; o fallback só protege um ambiente instalado sem ele.
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+    import json
+
+FORMATO_COLUNAR = 'colunar'
+
+
+def quer_colunar(request) -> bool:
+    """
+    True se o cliente pediu o formato colunar (?formato=colunar).
+    """
+    return request.GET.get('formato') == FORMATO_COLUNAR
+
+
+def colunar(registros: List[Dict[str, Any]], colunas: List[str]) -> Dict[str, List[Any]]:
+    """
+    Converte uma lista de dicionários em colunas: {'coluna': [valores]}.
+    Os nomes das colunas aparecem uma vez no JSON, e não em cada linha.
+
+    Args:
+        registros (list[dict]): Linhas no formato de registros.
+        colunas (list[str]): Colunas da saída (mantidas mesmo sem linhas).
+    """
+    return {col: [row.get(col) for row in registros] for col in colunas}
+
+
+def _default(obj):
+    # Tipos que o orjson não serializa sozinho.
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f"Tipo não serializável em JSON: {type(obj).__name__}")
+
+
+def dumps(data: Any) -> bytes:
+    """
+    Serializa em JSON (bytes) com o orjson, se instalado; senão com o json
+    da biblioteca padrão e o encoder do Django (datas, Decimal).
+    """
+    if orjson is not None:
+        return orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':')).encode('utf-8')
+
+
+class JsonResponseRapida(HttpResponse):
+    """
+    Equivalente ao JsonResponse (com safe=False), usando dumps() acima.
+    """
+
+    def __init__(self, data: Any, status: Optional[int] = None, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data), status=status, **kwargs)
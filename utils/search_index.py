@@ -0,0 +1,419 @@
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Palavras só de dígitos maiores que isso são códigos: ficam fora do
+# vocabulário da busca aproximada.
+_MAX_DIGITOS_VOCABULARIO = 6
+
+# Distância "infinita" nos arrays de distância por documento.
+_SEM_MATCH = 1000
+
+
+def dobrar(texto: str) -> str:
+    """
+    Texto em maiúsculas e sem acentos ('Açúcar' -> 'ACUCAR'): a forma em que
+    textos e termos são comparados nos índices de busca.
+    """
+    if texto.isascii():
+        return texto.upper()
+    decomposto = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in decomposto if not unicodedata.combining(c)).upper()
+
+
+def normalizar(termo: str) -> str:
+    """
+    Termo de busca dobrado (ver dobrar()) e com espaços repetidos reduzidos:
+    termos que só diferem nisso têm o mesmo resultado (e a mesma chave de
+    cache).
+    """
+    return ' '.join(dobrar(termo).split())
+
+
+def distancia(a: str, b: str, maximo: int) -> int:
+    """
+    Distância de edição entre 'a' e 'b' (inserção, remoção, troca e
+    transposição de letras vizinhas), limitada: qualquer valor acima de
+    'maximo' é devolvido como maximo + 1.
+    """
+    if abs(len(a) - len(b)) > maximo:
+        return maximo + 1
+    anterior2 = None
+    anterior = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        atual = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            custo = 0 if ca == cb else 1
+            valor = min(anterior[j] + 1, atual[j - 1] + 1, anterior[j - 1] + custo)
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                valor = min(valor, anterior2[j - 2] + 1)
+            atual[j] = valor
+        if min(atual) > maximo:
+            return maximo + 1
+        anterior2, anterior = anterior, atual
+    return min(anterior[-1], maximo + 1)
+
+
+def _tolerancia(token: str) -> int:
+    # Erros aceitos por palavra do termo: nenhum em palavras curtas e números.
+    if len(token) < 4 or token.isdigit():
+        return 0
+    return 1 if len(token) < 8 else 2
+
+
+def _listas_invertidas(chaves: np.ndarray, itens: np.ndarray, total: int) -> Tuple[np.ndarray, Dict[int, np.ndarray]]:
+    """
+    Agrupa pares (chave, item) em listas invertidas: um array int32 com os
+    itens ordenados por chave e depois por item, sem repetições, e um dict
+    chave -> fatia desse array.
+    """
+    # Chave única chave * total + item: ordena e descarta repetições de uma vez.
+    base = max(total, 1)
+    pares = chaves.astype(np.int64) * base + itens
+    pares.sort()
+    if not len(pares):
+        return np.empty(0, dtype=np.int32), {}
+    pares = pares[np.concatenate(([True], np.diff(pares) != 0))]
+    ids = pares // base
+    ordenados = (pares % base).astype(np.int32)
+    cortes = np.flatnonzero(np.diff(ids)) + 1
+    inicios = np.concatenate(([0], cortes)).tolist()
+    fins = np.concatenate((cortes, [len(pares)])).tolist()
+    return ordenados, {
+        chave: ordenados[inicio:fim] for chave, inicio, fim in zip(ids[inicios].tolist(), inicios, fins)
+    }
+
+
+def trigramas(palavra: str) -> set:
+    """
+    Trigramas de uma palavra (sem espaços). Palavras com menos de 3
+    caracteres não geram trigramas.
+    """
+    return {palavra[i:i + 3] for i in range(len(palavra) - 2)}
+
+
+def ngramas(palavra: str) -> set:
+    """
+    Trigramas e bigramas de uma palavra: o que o índice guarda, para que
+    palavras de 2 caracteres do termo (ex.: '1L', 'KG') também filtrem.
+    """
+    return trigramas(palavra) | {palavra[i:i + 2] for i in range(len(palavra) - 1)}
+
+
+def _ngramas_busca(token: str) -> set:
+    # Na busca, bastam os trigramas (ou o próprio token, se tiver 2 caracteres).
+    return trigramas(token) if len(token) >= 3 else ({token} if len(token) == 2 else set())
+
+
+class IndiceNgramas:
+    """
+    Índice invertido de n-gramas (trigramas e bigramas) sobre textos curtos
+    (descrições, códigos).
+
+    Cada documento é identificado pela sua posição na lista recebida. As listas
+    de ocorrências são fatias de um único array numpy ordenado (int32), bem
+    mais compacto que conjuntos do Python. Os n-gramas são gerados por palavra,
+    então um termo sem espaços que esteja contido no texto tem todos os seus
+    n-gramas no índice.
+
+    O índice só filtra candidatos: quem chama confere a regra de busca exata
+    nos documentos devolvidos por candidatos(). Para termos digitados sem
+    acento ou com erro, aproximados() casa cada palavra do termo com palavras
+    do vocabulário (contida nelas ou a poucas edições de distância). Os
+    textos já devem vir dobrados (ver dobrar()).
+    """
+
+    def __init__(self, textos: Iterable[str]):
+        # Pares (trigrama, documento) em arrays planos; a ordenação e o corte
+        # por trigrama ficam com o numpy. Os trigramas de cada palavra são
+        # calculados uma vez só (o vocabulário repete muito entre produtos).
+        ids = {}
+        por_palavra = {}
+        palavra_ids = {}
+        grams = array('i')
+        contagens = array('i')
+        palavras = array('i')
+        contagens_palavras = array('i')
+        self.total = 0
+        for texto in textos:
+            self.total += 1
+            antes = len(grams)
+            unicas = set(texto.split())
+            for palavra in unicas:
+                ids_palavra = por_palavra.get(palavra)
+                if ids_palavra is None:
+                    ids_palavra = por_palavra[palavra] = array(
+                        'i', [ids.setdefault(gram, len(ids)) for gram in ngramas(palavra)]
+                    )
+                    palavra_ids[palavra] = len(palavra_ids)
+                grams.extend(ids_palavra)
+                palavras.append(palavra_ids[palavra])
+            contagens.append(len(grams) - antes)
+            contagens_palavras.append(len(unicas))
+
+        nomes = {gram_id: gram for gram, gram_id in ids.items()}
+        docs = np.repeat(np.arange(self.total, dtype=np.int64), np.frombuffer(contagens, dtype=np.int32))
+        self._docs, listas = _listas_invertidas(np.frombuffer(grams, dtype=np.int32), docs, self.total)
+        self._ocorrencias = {nomes[gram_id]: fatia for gram_id, fatia in listas.items()}
+
+        # Para a busca aproximada: palavra -> documentos, e um segundo índice
+        # de n-gramas sobre o próprio vocabulário (palavra como documento).
+        # Códigos longos (SEQPRODUTO, EAN, CNPJ) ficam fora do vocabulário:
+        # só a busca exata os procura.
+        self.vocabulario = list(palavra_ids)
+        docs = np.repeat(np.arange(self.total, dtype=np.int64), np.frombuffer(contagens_palavras, dtype=np.int32))
+        self._docs_palavras, self._por_palavra = _listas_invertidas(
+            np.frombuffer(palavras, dtype=np.int32), docs, self.total
+        )
+        vocab_grams = array('i')
+        vocab_contagens = array('i')
+        for palavra, palavra_id in palavra_ids.items():
+            if palavra.isdigit() and len(palavra) > _MAX_DIGITOS_VOCABULARIO:
+                vocab_contagens.append(0)
+                continue
+            ids_palavra = por_palavra[palavra]
+            vocab_grams.extend(ids_palavra)
+            vocab_contagens.append(len(ids_palavra))
+        docs = np.repeat(np.arange(len(palavra_ids), dtype=np.int64), np.frombuffer(vocab_contagens, dtype=np.int32))
+        self._palavras, listas = _listas_invertidas(
+            np.frombuffer(vocab_grams, dtype=np.int32), docs, len(palavra_ids)
+        )
+        self._ocorrencias_vocabulario = {nomes[gram_id]: fatia for gram_id, fatia in listas.items()}
+
+    def candidatos(self, tokens: List[str]) -> Optional[np.ndarray]:
+        """
+        Documentos que contêm todos os n-gramas dos tokens.
+
+        Returns:
+            Array ordenado de posições, ou None se nenhum token tiver 2+
+            caracteres (o índice não ajuda; quem chama percorre tudo).
+        """
+        grams = set()
+        for token in tokens:
+            grams |= _ngramas_busca(token)
+        if not grams:
+            return None
+
+        listas = []
+        for gram in grams:
+            docs = self._ocorrencias.get(gram)
+            if docs is None:
+                return np.empty(0, dtype=np.int32)
+            listas.append(docs)
+
+        # Interseção começando pela lista mais curta; cada passo é uma busca
+        # binária dos candidatos restantes na próxima lista.
+        listas.sort(key=len)
+        resultado = listas[0]
+        for docs in listas[1:]:
+            if not len(resultado):
+                break
+            pos = np.searchsorted(docs, resultado)
+            pos[pos == len(docs)] = 0
+            resultado = resultado[docs[pos] == resultado]
+        return resultado
+
+    def _palavras_parecidas(self, token: str, maximo: int) -> Dict[int, int]:
+        # Palavras do vocabulário que contêm o token (distância 0) ou que, por
+        # inteiro ou no prefixo do tamanho do token (termo ainda sendo
+        # digitado), ficam a até 'maximo' edições dele.
+        grams = _ngramas_busca(token)
+        listas = [self._ocorrencias_vocabulario[g] for g in grams if g in self._ocorrencias_vocabulario]
+        if not listas:
+            return {}
+        # Cada edição estraga no máximo 3 trigramas do token.
+        minimo = max(1, len(grams) - 3 * maximo)
+        contagem = np.bincount(np.concatenate(listas), minlength=len(self.vocabulario))
+        parecidas = {}
+        for palavra_id in np.flatnonzero(contagem >= minimo).tolist():
+            palavra = self.vocabulario[palavra_id]
+            if token in palavra:
+                parecidas[palavra_id] = 0
+            elif maximo:
+                d = distancia(token, palavra, maximo)
+                if d > maximo and len(palavra) > len(token):
+                    d = distancia(token, palavra[:len(token)], maximo)
+                if d <= maximo:
+                    parecidas[palavra_id] = d
+        return parecidas
+
+    def aproximados(self, tokens: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Documentos em que cada token (2+ caracteres) casa com alguma palavra,
+        em qualquer ordem: contido nela ou, em tokens de 4+ letras, a até 1
+        edição (2 a partir de 8 letras).
+
+        Returns:
+            Uma tupla (documentos, distancias): posições em ordem crescente e,
+            para cada uma, a soma das menores distâncias de cada token
+            (0 = todas as palavras do termo aparecem, só fora de ordem).
+        """
+        tokens = [t for t in tokens if len(t) >= 2]
+        if not tokens or not self.total:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+
+        soma = np.zeros(self.total, dtype=np.int32)
+        for token in tokens:
+            parecidas = self._palavras_parecidas(token, _tolerancia(token))
+            if not parecidas:
+                return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+            # Menor distância do token em cada documento: grava da maior para
+            # a menor, de modo que a menor prevalece.
+            melhor = np.full(self.total, _SEM_MATCH, dtype=np.int32)
+            for d in sorted(set(parecidas.values()), reverse=True):
+                docs = [self._por_palavra[p] for p, dp in parecidas.items() if dp == d]
+                melhor[np.concatenate(docs)] = d
+            soma += melhor
+
+        documentos = np.flatnonzero(soma < _SEM_MATCH).astype(np.int32)
+        return documentos, soma[documentos]
+
+
+class CachePrefixos:
+    """
+    Resultado completo (não truncado) da busca exata por termo normalizado,
+    com descarte LRU. A regra de busca exata é monotônica: um termo que
+    estende outro ('NESTL' -> 'NESTLE') só acha documentos que o termo mais
+    curto já achava. Então, se um prefixo do termo já está no cache, basta
+    conferir os documentos dele em vez de consultar o índice de n-gramas.
+
+    Resultados com mais de 'max_itens' documentos não são guardados.
+    Thread-safe; como o índice é imutável, as entradas não vencem.
+    """
+
+    def __init__(self, max_entradas: int = 1024, max_itens: int = 5000, minimo: int = 3):
+        self.max_entradas = max_entradas
+        self.max_itens = max_itens
+        self.minimo = minimo
+        self._entradas = OrderedDict()  # termo -> array('i') de posições
+        self._lock = threading.Lock()
+
+    def obter(self, termo: str) -> Optional[array]:
+        """
+        Posições achadas pelo próprio termo ou pelo seu maior prefixo em
+        cache (com pelo menos 'minimo' caracteres). None se não houver.
+        """
+        with self._lock:
+            for tamanho in range(len(termo), self.minimo - 1, -1):
+                itens = self._entradas.get(termo[:tamanho])
+                if itens is not None:
+                    self._entradas.move_to_end(termo[:tamanho])
+                    return itens
+        return None
+
+    def guardar(self, termo: str, posicoes: List[int]):
+        if len(posicoes) > self.max_itens or len(termo) < self.minimo:
+            return
+        with self._lock:
+            self._entradas[termo] = array('i', posicoes)
+            self._entradas.move_to_end(termo)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+
+class IndiceDoProcesso:
+    """
+    Mantém um índice em memória por processo, reconstruído quando a versão
+    dos dados de origem muda (ex.: nova sincronização de um espelho local).
+    A versão é conferida no máximo a cada 'verificar' segundos.
+
+    A primeira construção (e a que substitui um índice de versão None, isto é,
+    sem dados) acontece na própria chamada, a menos que aquecer() já a tenha
+    feito na subida do processo. As seguintes rodam numa thread em
+    segundo plano e, enquanto isso, o índice anterior continua
+    sendo servido (mesma ideia do stale-while-revalidate do QueryCache).
+
+    Args:
+        nome (str): Nome para os logs.
+        versao (callable): Devolve a versão atual dos dados (ex.: a data da
+            última sincronização).
+        construir (callable): Recebe a versão e devolve o índice.
+        verificar (float): Intervalo entre conferências da versão (segundos).
+    """
+
+    def __init__(self, nome: str, versao: Callable[[], Any], construir: Callable[[Any], Any],
+                 verificar: float):
+        self.nome = nome
+        self._versao = versao
+        self._construir = construir
+        self.verificar = verificar
+        self._indice = None
+        self._indice_versao = None
+        self._verificado_em = 0.0
+        self._reconstruindo = False
+        self._lock = threading.Lock()
+
+    @property
+    def versao(self):
+        """Versão dos dados do índice servido no momento (None se não há)."""
+        return self._indice_versao
+
+    def invalidar(self):
+        """Força a conferência da versão na próxima chamada de obter()."""
+        self._verificado_em = 0.0
+
+    def aquecer(self):
+        """
+        Constrói o índice numa thread em segundo plano, para a primeira busca
+        não pagar a construção. Uma busca que chegar antes do fim espera por
+        ela em obter(), sem construir de novo.
+        """
+        def carregar():
+            try:
+                self.obter()
+            finally:
+                from django.db import connections
+                connections.close_all()
+
+        threading.Thread(target=carregar, name=f'aquecer-{self.nome}', daemon=True).start()
+
+    def _carregar(self, versao):
+        inicio = time.monotonic()
+        indice = self._construir(versao)
+        self._indice, self._indice_versao = indice, versao
+        print(f"Índice '{self.nome}' carregado em {time.monotonic() - inicio:.2f}s.")
+
+    def _reconstruir(self, versao):
+        try:
+            self._carregar(versao)
+        except Exception as e:
+            print(f"Erro ao recarregar o índice '{self.nome}': {e}")
+        finally:
+            self._reconstruindo = False
+            # Thread própria: devolve a conexão com o banco.
+            from django.db import connections
+            connections.close_all()
+
+    def obter(self):
+        """
+        Devolve o índice, reconstruindo-o se a versão mudou.
+        None se os dados de origem estiverem indisponíveis.
+        """
+        indice = self._indice
+        if indice is not None and time.monotonic() - self._verificado_em < self.verificar:
+            return indice
+
+        with self._lock:
+            if self._indice is not None and time.monotonic() - self._verificado_em < self.verificar:
+                return self._indice
+            try:
+                versao = self._versao()
+                if self._indice is None or self._indice_versao is None:
+                    # Primeira carga (ou dados que estavam vazios): na hora.
+                    self._carregar(versao)
+                elif self._indice_versao != versao and not self._reconstruindo:
+                    self._reconstruindo = True
+                    threading.Thread(
+                        target=self._reconstruir, args=(versao,),
+                        name=f'indice-{self.nome}', daemon=True,
+                    ).start()
+            except Exception as e:
+                print(f"Índice '{self.nome}' indisponível: {e}")
+                return self._indice
+            self._verificado_em = time.monotonic()
+            return self._indice